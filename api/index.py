@@ -1,11 +1,298 @@
-import sys
+"""
+工资表生成 HTTP 接口（Vercel 入口）
+
+POST /api/generate  以 multipart/form-data 上传 template（可选，默认使用项目中的工资表模板）、leave、overtime，
+                    format=xlsx（默认）返回生成的工资表文件，format=json 返回每名员工的汇总结果；
+                    month=YYYY-MM（可选）时休假按起止时间只计入该月的工作日天数
+GET  /api/health    返回服务状态、正在处理的任务数和冷启动各步骤的耗时
+
+生成在有界的线程池中执行，同时处理（含排队）的任务数超过上限时直接返回 503；
+单个任务超过 API_JOB_TIMEOUT 秒返回 504，默认值低于 vercel.json 中函数的 60 秒 maxDuration。
+
+为缩短冷启动，本模块只导入 starlette，处理核心（salary_core.py，不依赖 Streamlit）和 pandas 在预热时才导入；
+默认模板从构建时生成的快照（见 template_snapshot.py）加载，没有快照时读取 Excel。应用启动时在线程池中预热，
+运行环境不支持 ASGI lifespan 时由第一个请求预热。
+
+本地运行：uvicorn api.index:app --port 8000 或 python api/index.py
+"""
+import time
+
+# 模块开始导入的时间，用于统计冷启动耗时
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import io
+import logging
+import math
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from urllib.parse import quote
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
 
 # 添加项目根目录到 Python 路径
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+logger = logging.getLogger(__name__)
+
+# 线程池大小、同时处理（含排队）的任务上限、单个任务的超时秒数和上传文件的大小上限，可以用环境变量修改
+API_WORKERS = int(os.environ.get('API_WORKERS', 2))
+API_MAX_JOBS = int(os.environ.get('API_MAX_JOBS', 4))
+API_JOB_TIMEOUT = float(os.environ.get('API_JOB_TIMEOUT', 50))
+API_MAX_UPLOAD_MB = float(os.environ.get('API_MAX_UPLOAD_MB', 20))
+
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+class RequestError(Exception):
+    """请求内容有误，返回 400 及错误说明"""
+
+class JobLimiter:
+    """
+    限制同时处理的任务数，任务在线程池中真正结束时才释放名额
+    请求超时返回后，仍在执行的任务继续占用名额，避免超时请求不断堆积到线程池中
+    """
+
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.active >= self.max_jobs:
+                return False
+            self.active += 1
+            return True
+
+    def release(self, _future=None):
+        with self._lock:
+            self.active -= 1
+
+class Warmup:
+    """
+    导入处理核心并加载默认工资表模板，每个进程只执行一次，记录冷启动各步骤的耗时（秒）
+    并发调用时后来的调用等待第一次执行完成
+    """
+
+    def __init__(self):
+        self.timings = {'app_import': None, 'core_import': None, 'template_load': None}
+        self.template_source = None
+        self.template_bytes = None
+        self.salary_df = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            if self.salary_df is not None:
+                return self
+            started = time.perf_counter()
+            import salary_core
+            from template_snapshot import load_snapshot
+
+            self.timings['core_import'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            template_path = os.path.join(PROJECT_DIR, salary_core.TEMPLATE_PATH)
+            with open(template_path, 'rb') as f:
+                template_bytes = f.read()
+            snapshot = load_snapshot(template_path)
+            if snapshot is not None:
+                salary_df, self.template_source = snapshot.salary, 'snapshot'
+            else:
+                salary_df, self.template_source = salary_core.read_salary_template(io.BytesIO(template_bytes)), 'excel'
+            self.timings['template_load'] = time.perf_counter() - started
+            self.template_bytes, self.salary_df = template_bytes, salary_df
+            logger.info(
+                "冷启动：导入处理核心 %.3fs，加载模板（%s）%.3fs",
+                self.timings['core_import'], self.template_source, self.timings['template_load']
+            )
+        return self
 
-# 导入主应用
-from salary_generator import main
+    def report(self):
+        timings = {name: None if seconds is None else round(seconds, 4) for name, seconds in self.timings.items()}
+        return dict(timings, template_source=self.template_source)
+
+executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix='salary-api')
+limiter = JobLimiter(API_MAX_JOBS)
+warmup = Warmup()
+
+def to_json_value(value):
+    """DataFrame 中的值转换为可序列化为 JSON 的值，空值为 None"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+def summarize_result(result_df, leave_df, overtime_df, diagnostics):
+    """返回 format=json 时的汇总结果：记录数、每名员工的考勤和加班结果、按问题类型统计的处理信息"""
+    from salary_core import OVERTIME_HOUR_COLUMNS
+
+    # 返回的列，模板中没有的列不返回
+    summary_columns = ['姓名', '考勤情况', '全勤'] + list(OVERTIME_HOUR_COLUMNS) + ['备注']
+    columns = [column for column in summary_columns if column in result_df.columns]
+    employees = [
+        {column: to_json_value(value) for column, value in zip(columns, row)}
+        for row in result_df[columns].itertuples(index=False, name=None)
+    ]
+    issues = diagnostics.counts_by_issue().to_dict('records') if len(diagnostics) else []
+    return {
+        'employee_count': len(result_df),
+        'leave_records': 0 if leave_df is None else len(leave_df),
+        'overtime_records': 0 if overtime_df is None else len(overtime_df),
+        'employees': employees,
+        'issues': [{key: to_json_value(value) for key, value in issue.items()} for issue in issues],
+    }
+
+def run_generation(template_bytes, leave_bytes, overtime_bytes, output_format, payroll_month=None):
+    """
+    在线程池中执行的生成任务，返回工资表文件内容（xlsx）或汇总结果（json）
+    template_bytes 为 None 时使用项目中的默认模板
+    """
+    from diagnostics import DiagnosticsCollector
+    from result_cache import cache_key, open_result_cache
+    from salary_core import (
+        load_leave_data, load_overtime_data, merge_to_salary_sheet, read_salary_template, save_salary_sheet_with_format
+    )
+
+    salary_df = None
+    if template_bytes is None:
+        default = warmup.run()
+        template_bytes, salary_df = default.template_bytes, default.salary_df
+
+    result_cache = open_result_cache() if output_format == 'xlsx' else None
+    if result_cache is not None:
+        result_key = cache_key(template_bytes, leave_bytes, overtime_bytes, payroll_month)
+        excel_data = result_cache.get(result_key)
+        if excel_data is not None:
+            return excel_data
+
+    if salary_df is None:
+        try:
+            salary_df = read_salary_template(io.BytesIO(template_bytes))
+        except Exception as e:
+            raise RequestError(f"无法读取工资表模板: {str(e)}")
+    leave_df = load_leave_data(io.BytesIO(leave_bytes)) if leave_bytes is not None else None
+    overtime_df = load_overtime_data(io.BytesIO(overtime_bytes)) if overtime_bytes is not None else None
+    if leave_bytes is not None and leave_df is None:
+        raise RequestError("无法读取休假表，请确认包含 创建人、请假类型、时长 等列")
+    if overtime_bytes is not None and overtime_df is None:
+        raise RequestError("无法读取加班表，请确认包含 创建人、时长 等列")
+
+    diagnostics = DiagnosticsCollector()
+    result_df = merge_to_salary_sheet(salary_df, leave_df, overtime_df, diagnostics=diagnostics, payroll_month=payroll_month)
+    if output_format == 'json':
+        return summarize_result(result_df, leave_df, overtime_df, diagnostics)
+
+    excel_data = save_salary_sheet_with_format(result_df, io.BytesIO(template_bytes))
+    if excel_data is None:
+        raise RequestError("生成Excel文件失败，请检查模板格式")
+    if result_cache is not None:
+        try:
+            result_cache.put(result_key, excel_data)
+        except OSError as e:
+            logger.warning("保存结果缓存失败: %s", e)
+    return excel_data
+
+async def read_upload(form, name):
+    """读取上传的文件，没有上传时返回 None"""
+    upload = form.get(name)
+    if upload is None or isinstance(upload, str):
+        return None
+    data = await upload.read()
+    if len(data) > API_MAX_UPLOAD_MB * 1024 * 1024:
+        raise RequestError(f"文件 {name} 超过 {API_MAX_UPLOAD_MB:g}MB")
+    return data or None
+
+async def generate(request):
+    content_length = int(request.headers.get('content-length') or 0)
+    if content_length > 3 * API_MAX_UPLOAD_MB * 1024 * 1024:
+        return JSONResponse({'error': f"上传内容超过 {3 * API_MAX_UPLOAD_MB:g}MB"}, status_code=413)
+
+    try:
+        form = await request.form()
+        output_format = (form.get('format') or request.query_params.get('format') or 'xlsx').lower()
+        if output_format not in ('xlsx', 'json'):
+            raise RequestError(f"不支持的返回格式: {output_format}，可选 xlsx 或 json")
+        payroll_month = form.get('month') or request.query_params.get('month')
+        if payroll_month:
+            from leave_calendar import normalize_month
+
+            try:
+                payroll_month = normalize_month(payroll_month)
+            except ValueError:
+                raise RequestError(f"无法识别的工资月份: {payroll_month}，请使用 YYYY-MM 格式")
+        else:
+            payroll_month = None
+        template_bytes = await read_upload(form, 'template')
+        leave_bytes = await read_upload(form, 'leave')
+        overtime_bytes = await read_upload(form, 'overtime')
+    except RequestError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    if not limiter.try_acquire():
+        return JSONResponse(
+            {'error': f"同时处理的任务已达上限（{API_MAX_JOBS} 个），请稍后重试"},
+            status_code=503, headers={'Retry-After': '10'}
+        )
+    future = executor.submit(run_generation, template_bytes, leave_bytes, overtime_bytes, output_format, payroll_month)
+    future.add_done_callback(limiter.release)
+
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=API_JOB_TIMEOUT)
+    except asyncio.TimeoutError:
+        return JSONResponse({'error': f"生成超过 {API_JOB_TIMEOUT:g} 秒，请减少记录数或分批生成"}, status_code=504)
+    except RequestError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.exception("生成工资表时出错")
+        return JSONResponse({'error': f"生成过程中出现错误: {str(e)}"}, status_code=500)
+
+    if output_format == 'json':
+        return JSONResponse(result)
+    file_name = f"工资表_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return Response(
+        result, media_type=XLSX_MEDIA_TYPE,
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(file_name)}"}
+    )
+
+async def health(request):
+    return JSONResponse({
+        'status': 'ok', 'active_jobs': limiter.active, 'max_jobs': API_MAX_JOBS, 'workers': API_WORKERS,
+        'cold_start': warmup.report(),
+    })
+
+async def index(request):
+    return JSONResponse({
+        'endpoints': {
+            'POST /api/generate': "multipart/form-data：template（可选）、leave、overtime、format=xlsx|json、month=YYYY-MM（可选）",
+            'GET /api/health': "服务状态",
+        }
+    })
+
+@asynccontextmanager
+async def lifespan(app):
+    """应用启动时在线程池中预热，不等待预热完成"""
+    executor.submit(warmup.run)
+    yield
 
 # Vercel 入口点
-app = main
\ No newline at end of file
+app = Starlette(routes=[
+    Route('/', index),
+    Route('/api/generate', generate, methods=['POST']),
+    Route('/api/health', health),
+], lifespan=lifespan)
+warmup.timings['app_import'] = time.perf_counter() - IMPORT_STARTED
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='127.0.0.1', port=int(os.environ.get('PORT', 8000)))
@@ -0,0 +1,115 @@
+"""
+在工作线程中执行工资表生成，界面轮询进度并可以取消
+
+处理函数通过 report_progress 报告各阶段已处理的员工数、已写入的单元格数，
+界面在取消任务后，处理函数下一次报告进度时抛出 JobCancelled 结束任务。
+工作线程中没有 Streamlit 的脚本运行环境，处理函数的提示信息（notify）记录在任务进度中，任务结束后由界面显示。
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 当前线程正在执行的后台任务的进度
+_current_job = threading.local()
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+class JobProgress:
+    """
+    后台任务的进度，由工作线程更新，界面所在的脚本线程读取
+    按阶段记录 (已完成数量, 总数, 单位)，阶段按开始的先后排列
+    messages 按先后记录处理过程中的提示信息 (级别, 内容)
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.messages = []
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, stage, done, total, unit):
+        """更新一个阶段的进度，任务已被取消时抛出 JobCancelled"""
+        with self._lock:
+            self.stages[stage] = (done, total, unit)
+        self.check_cancelled()
+
+    def add_message(self, level, message):
+        """记录一条提示信息，级别与 notify 相同"""
+        with self._lock:
+            self.messages.append((level, message))
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def snapshot(self):
+        """返回各阶段进度的列表 [(阶段, 已完成数量, 总数, 单位)]"""
+        with self._lock:
+            return [(stage, done, total, unit) for stage, (done, total, unit) in self.stages.items()]
+
+def current_progress():
+    """返回当前线程正在执行的后台任务的进度，不在后台任务中时返回 None"""
+    return getattr(_current_job, 'progress', None)
+
+def report_progress(progress, stage, done, total, unit):
+    """progress 为 None 时不做任何记录"""
+    if progress is not None:
+        progress.update(stage, done, total, unit)
+
+class BackgroundJob:
+    """
+    在守护线程中执行 target(progress, *args)，任务状态为 running、done、failed、cancelled
+    执行结果保存在 result 中，出错时异常保存在 error 中
+    """
+
+    def __init__(self, target, *args):
+        self.progress = JobProgress()
+        self.status = 'running'
+        self.result = None
+        self.error = None
+        self.started = time.time()
+        self.finished_at = None
+        self._thread = threading.Thread(target=self._run, args=(target, args), daemon=True)
+        self._thread.start()
+
+    def _run(self, target, args):
+        _current_job.progress = self.progress
+        try:
+            self.result = target(self.progress, *args)
+            self.status = 'done'
+        except JobCancelled:
+            self.status = 'cancelled'
+        except Exception as e:
+            logger.exception("后台任务出错")
+            self.error = e
+            self.status = 'failed'
+        finally:
+            _current_job.progress = None
+            self.finished_at = time.time()
+
+    @property
+    def finished(self):
+        return self.status != 'running'
+
+    def elapsed(self):
+        """任务已运行（或运行完成用时）的秒数"""
+        return (self.finished_at or time.time()) - self.started
+
+    def cancel(self):
+        """请求取消任务，任务在下一次报告进度时结束"""
+        self.progress.cancel()
+
+    def wait(self, timeout=None):
+        """等待任务结束，返回是否已结束"""
+        self._thread.join(timeout)
+        return self.finished
@@ -0,0 +1,230 @@
+"""
+批量生成工资表（命令行入口，不依赖 Streamlit 界面）
+
+用法：
+    python batch_generate.py jobs.json --workers 4 --summary summary.json
+    python batch_generate.py jobs.json --stream --max-rows 500000 --max-memory-mb 512
+    python batch_generate.py jobs.json --staging
+    python batch_generate.py jobs.json --payroll-month 2025-07
+
+任务清单可以是 JSON（对象列表）或 CSV（带标题行），每个任务包含以下字段：
+    template   工资表模板路径
+    leave      休假表路径（可选）
+    overtime   加班表路径（可选）
+    output     生成的工资表保存路径
+    name       任务名称（可选，默认使用输出文件名）
+相对路径按任务清单所在目录解析。
+
+加上 --stream 后休假表、加班表按块流式读取汇总（仅支持 .xlsx），适合行数很多的文件；
+--max-rows、--max-memory-mb 限制每个文件的记录行数和估算内存，超过时该任务失败。
+
+加上 --staging 后每个文件的解析结果暂存为列式文件（见 staging.py），同一文件再次生成时不再重新读取 Excel，
+适合反复生成同一批文件；与 --stream 一起使用时只暂存工资表模板。
+
+加上 --payroll-month 后休假天数按开始、结束时间计算该月内的工作日，跨月的请假只计入该月的部分（不支持 --stream）。
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+JOB_FIELDS = ['template', 'leave', 'overtime', 'output']
+
+def load_manifest(manifest_path):
+    """读取任务清单，返回任务列表，路径统一转换为绝对路径"""
+    with open(manifest_path, encoding='utf-8-sig') as f:
+        if manifest_path.lower().endswith('.csv'):
+            jobs = list(csv.DictReader(f))
+        else:
+            jobs = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    resolved_jobs = []
+    for i, job in enumerate(jobs, 1):
+        missing = [field for field in ('template', 'output') if not job.get(field)]
+        if missing:
+            raise ValueError(f"第{i}个任务缺少字段: {', '.join(missing)}")
+
+        resolved = {'name': job.get('name') or os.path.splitext(os.path.basename(job['output']))[0]}
+        for field in JOB_FIELDS:
+            path = (job.get(field) or '').strip()
+            resolved[field] = os.path.join(base_dir, path) if path else None
+        resolved_jobs.append(resolved)
+    return resolved_jobs
+
+def merge_streamed(job, salary_template, stream_options):
+    """流式读取休假表、加班表并合并，返回 (工资表, 休假记录数, 加班记录数)"""
+    from streaming_loader import stream_to_salary_sheet
+
+    return stream_to_salary_sheet(salary_template, job['leave'], job['overtime'], **stream_options)
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def load_staged(job):
+    """通过暂存区读取模板、休假表和加班表，返回 (工资表模板, 休假数据, 加班数据)"""
+    from salary_core import load_staged_leave_data, load_staged_overtime_data, load_staged_salary_template
+
+    salary_template = load_staged_salary_template(read_bytes(job['template']))
+    leave_data = load_staged_leave_data(read_bytes(job['leave'])) if job['leave'] else None
+    overtime_data = load_staged_overtime_data(read_bytes(job['overtime'])) if job['overtime'] else None
+    return salary_template, leave_data, overtime_data
+
+def run_job(job, stream_options=None, staging=False, payroll_month=None):
+    """
+    执行单个生成任务：加载模板和数据 → 合并 → 按模板格式保存
+    stream_options 不为 None 时流式读取休假表和加班表，内容为 stream_to_salary_sheet 的限制参数
+    staging 为 True 时通过暂存区读取文件
+    payroll_month 为工资月份（'YYYY-MM'）时休假只计入该月的工作日天数
+    返回包含各阶段耗时和结果状态的字典，任务失败时不抛出异常
+    """
+    from salary_core import (
+        load_salary_template, load_leave_data, load_overtime_data, load_staged_salary_template,
+        merge_to_salary_sheet, save_salary_sheet_with_format
+    )
+
+    result = {'name': job['name'], 'output': job['output'], 'status': 'ok', 'error': None, 'timings': {}}
+    started = time.perf_counter()
+    try:
+        stage_started = time.perf_counter()
+        if staging and stream_options is not None:
+            salary_template, template_path = load_staged_salary_template(read_bytes(job['template'])), job['template']
+        elif staging:
+            salary_template, leave_data, overtime_data = load_staged(job)
+            template_path = job['template']
+        else:
+            salary_template, template_path = load_salary_template(job['template'])
+        if salary_template is None:
+            raise RuntimeError(f"无法加载工资表模板: {job['template']}")
+
+        if stream_options is not None:
+            # 流式读取时加载和合并在同一遍中完成，耗时计入合并阶段
+            result['timings']['load'] = time.perf_counter() - stage_started
+            stage_started = time.perf_counter()
+            final_salary_sheet, leave_count, overtime_count = merge_streamed(job, salary_template, stream_options)
+            result['timings']['merge'] = time.perf_counter() - stage_started
+        else:
+            if not staging:
+                leave_data = load_leave_data(job['leave']) if job['leave'] else None
+                overtime_data = load_overtime_data(job['overtime']) if job['overtime'] else None
+            if job['leave'] and leave_data is None:
+                raise RuntimeError(f"无法读取休假表: {job['leave']}")
+            if job['overtime'] and overtime_data is None:
+                raise RuntimeError(f"无法读取加班表: {job['overtime']}")
+            result['timings']['load'] = time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            final_salary_sheet = merge_to_salary_sheet(salary_template, leave_data, overtime_data, payroll_month=payroll_month)
+            result['timings']['merge'] = time.perf_counter() - stage_started
+            leave_count = 0 if leave_data is None else len(leave_data)
+            overtime_count = 0 if overtime_data is None else len(overtime_data)
+
+        stage_started = time.perf_counter()
+        excel_data = save_salary_sheet_with_format(final_salary_sheet, template_path)
+        if excel_data is None:
+            raise RuntimeError("生成Excel文件失败，请检查模板格式")
+        output_dir = os.path.dirname(job['output'])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(job['output'], 'wb') as f:
+            f.write(excel_data)
+        result['timings']['save'] = time.perf_counter() - stage_started
+
+        result['employees'] = len(final_salary_sheet)
+        result['leave_records'] = leave_count
+        result['overtime_records'] = overtime_count
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['timings']['total'] = time.perf_counter() - started
+    return result
+
+def configure_logging(level):
+    """配置日志输出，主进程和每个工作进程启动时调用"""
+    logging.basicConfig(level=level, format='%(message)s')
+
+def run_batch(jobs, workers=None, log_level=logging.WARNING, stream_options=None, staging=False, payroll_month=None):
+    """用进程池并行执行所有任务，按任务清单顺序返回结果"""
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_logging, initargs=(log_level,)) as executor:
+        futures = {executor.submit(run_job, job, stream_options, staging, payroll_month): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # 子进程异常退出等情况
+                results[i] = {
+                    'name': jobs[i]['name'], 'output': jobs[i]['output'],
+                    'status': 'failed', 'error': str(e), 'timings': {}
+                }
+            result = results[i]
+            logging.info(
+                "[%s] %s %.2fs%s", result['status'], result['name'],
+                result['timings'].get('total', 0), f" - {result['error']}" if result['error'] else ''
+            )
+    return results
+
+def format_summary(results, elapsed):
+    """生成便于阅读的汇总文本"""
+    lines = [f"{'任务':<24}{'状态':<8}{'加载':>8}{'合并':>8}{'保存':>8}{'合计':>8}"]
+    for result in results:
+        timings = result['timings']
+        lines.append(
+            f"{result['name']:<24}{result['status']:<8}"
+            + ''.join(f"{timings[stage]:>8.2f}" if stage in timings else f"{'-':>8}"
+                      for stage in ('load', 'merge', 'save', 'total'))
+        )
+        if result['error']:
+            lines.append(f"    错误: {result['error']}")
+    failed = sum(result['status'] != 'ok' for result in results)
+    lines.append(f"共 {len(results)} 个任务，成功 {len(results) - failed} 个，失败 {failed} 个，总耗时 {elapsed:.2f}s")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按任务清单批量生成工资表")
+    parser.add_argument('manifest', help="任务清单文件（.json 或 .csv）")
+    parser.add_argument('--workers', type=int, default=None, help="并行进程数，默认等于CPU核数")
+    parser.add_argument('--summary', help="将各任务耗时和失败信息写入该JSON文件")
+    parser.add_argument('--stream', action='store_true', help="流式读取休假表和加班表（仅支持 .xlsx）")
+    parser.add_argument('--max-rows', type=int, default=None, help="流式读取时每个文件允许的最大记录行数")
+    parser.add_argument('--max-memory-mb', type=float, default=None, help="流式读取时每个文件允许的估算内存上限（MB）")
+    parser.add_argument('--staging', action='store_true', help="暂存每个文件的解析结果，再次生成时不重新读取 Excel")
+    parser.add_argument('--payroll-month', help="工资月份（YYYY-MM），休假按起止时间只计入该月的工作日天数")
+    parser.add_argument('-v', '--verbose', action='store_true', help="输出处理过程中的详细信息")
+    args = parser.parse_args(argv)
+    if not args.stream and (args.max_rows is not None or args.max_memory_mb is not None):
+        parser.error("--max-rows 和 --max-memory-mb 需要与 --stream 一起使用")
+    if args.payroll_month is not None:
+        from leave_calendar import normalize_month
+
+        if args.stream:
+            parser.error("--payroll-month 不能与 --stream 一起使用")
+        try:
+            args.payroll_month = normalize_month(args.payroll_month)
+        except ValueError:
+            parser.error(f"无法识别的工资月份: {args.payroll_month}，请使用 YYYY-MM 格式")
+
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    configure_logging(log_level)
+
+    jobs = load_manifest(args.manifest)
+    started = time.perf_counter()
+    stream_options = {'max_rows': args.max_rows, 'max_memory_mb': args.max_memory_mb} if args.stream else None
+    results = run_batch(jobs, args.workers, log_level, stream_options, args.staging, args.payroll_month)
+    elapsed = time.perf_counter() - started
+
+    print(format_summary(results, elapsed))
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed': elapsed, 'jobs': results}, f, ensure_ascii=False, indent=2)
+
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,446 @@
+"""
+工资表生成流程的性能基准测试
+
+用法：
+    python benchmark.py --size small medium --output results.json
+    python benchmark.py --employees 5000 --records 200000 --output results.json
+    python benchmark.py --size small --baseline results.json --max-regression 0.2
+    python benchmark.py --size small --cold-start
+
+按指定规模生成合成的工资表模板、请假表和加班表（日期格式、时长写法混合），
+依次测量 load_leave_data、load_overtime_data、process_leave_data、process_overtime_data、
+save_salary_sheet_with_format 的耗时和峰值内存，结果写入JSON文件便于不同版本对比。
+指定 --baseline 时与之前的结果比较，任一阶段耗时增长超过 --max-regression 时返回非零退出码。
+指定 --cold-start 时另外在新的 Python 进程中测量 HTTP 接口（api/index.py）的冷启动耗时：
+导入接口模块、导入处理核心、加载默认模板（有快照时从快照加载，见 template_snapshot.py）。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from copy import copy
+from datetime import datetime, timedelta
+
+# 预设规模：(员工数, 请假表和加班表各自的记录数)
+SIZES = {
+    'small': (100, 1000),
+    'medium': (2000, 50000),
+    'large': (20000, 1000000),
+}
+
+# 测量的处理阶段，按执行顺序排列
+STAGES = ['load_leave_data', 'load_overtime_data', 'process_leave_data', 'process_overtime_data',
+          'save_salary_sheet_with_format']
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹'
+GIVEN_NAME_CHARS = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉萍红梅鑫波斌宇浩凯健俊帆'
+
+LEAVE_HEADER = [
+    '序号', '数据id', '请假类型', '开始时间', '结束时间', '时长', '请假事由', '休假地点', '图片', '电话',
+    '特殊情况说明（非必填）', '手写签名', '审批编号', '创建时间', '创建人', '当前负责人', '审批结果', '审批状态',
+    '更新时间', '创建人部门', '审批单标题', '历史审批人', '耗时(时:分:秒)', '审批记录'
+]
+OVERTIME_HEADER_ROWS = [
+    ['序号', '数据id', '加班类型', '加班人', '开始时间', '结束时间', '明细', '明细', '时长', '加班补偿', '加班原因',
+     '手写签名', '加班原因', '审批编号', '创建时间', '创建人', '当前负责人', '审批结果', '审批状态', '更新时间',
+     '创建人部门', '审批单标题', '历史审批人', '耗时(时:分:秒)', '审批记录'],
+    ['序号', '数据id', '加班类型', '加班人', '开始时间', '结束时间', '加班时间', None, '时长', '加班补偿', '加班原因',
+     '手写签名', '加班原因', '审批编号', '创建时间', '创建人', '当前负责人', '审批结果', '审批状态', '更新时间',
+     '创建人部门', '审批单标题', '历史审批人', '耗时(时:分:秒)', '审批记录'],
+]
+
+LEAVE_TYPES = ['年假', '年假', '调休', '事假', '病假', '婚假', '丧假']
+OVERTIME_REASONS = ['开展风险监测', '应急值守', '航班保障', '节假日值班', None]
+DEPARTMENTS = ['协管员交流,办公室', '协管员交流,旅检一科', '协管员交流,旅检二科', '协管员交流,综合科']
+
+# 请假表、加班表中常见的日期写法
+LEAVE_DATE_WRITERS = [
+    lambda d, half: f"{d:%Y-%m-%d} {half}",
+    lambda d, half: f"{d:%Y/%m/%d}",
+    lambda d, half: f"{d.year}年{d.month}月{d.day}日",
+    lambda d, half: d,
+    lambda d, half: f"{d:%m/%d/%Y}",
+]
+OVERTIME_TIME_WRITERS = [
+    lambda t: f"{t:%Y-%m-%d %H:%M}",
+    lambda t: t,
+    lambda t: f"{t.year}/{t.month}/{t.day} {t.hour}:{t.minute:02d}",
+    lambda t: f"{t.year}年{t.month}月{t.day}日",
+]
+
+def employee_name(i):
+    """按序号生成不重复的员工姓名"""
+    surname = SURNAMES[i % len(SURNAMES)]
+    i //= len(SURNAMES)
+    first = GIVEN_NAME_CHARS[i % len(GIVEN_NAME_CHARS)]
+    i //= len(GIVEN_NAME_CHARS)
+    second = GIVEN_NAME_CHARS[i % len(GIVEN_NAME_CHARS)]
+    i //= len(GIVEN_NAME_CHARS)
+    return f"{surname}{first}{second}{i or ''}"
+
+def leave_duration_text(rng, days):
+    """按常见写法生成请假时长"""
+    style = rng.randrange(5)
+    if style == 0:
+        return f"{days}天"
+    if style == 1:
+        return f"{days} 天"
+    if style == 2:
+        return f"{days * 8:g}小时"
+    if style == 3:
+        return f"{days * 8:g}h"
+    return days
+
+def overtime_duration_text(rng, hours):
+    """按常见写法生成加班时长"""
+    style = rng.randrange(4)
+    if style == 0:
+        return f"{hours:g}小时"
+    if style == 1:
+        return f"{hours:g}h"
+    if style == 2 and hours % 4 == 0:
+        return f"{hours / 8:g}天"
+    return hours
+
+def generate_salary_template(path, employees, source_path):
+    """以现有工资表模板为样式来源，生成指定员工数的工资表模板，公式和合计行按新行号调整"""
+    from openpyxl import load_workbook
+    from openpyxl.formula.translate import Translator
+
+    wb = load_workbook(source_path)
+    ws = wb.active
+    # 工资表模板第五行为标题，第六行起为员工数据，最后两行为合计行和签字行
+    prototype = [(cell.value, cell._style) for cell in ws[6]]
+    footer_rows = [[(cell.value, cell._style) for cell in ws[row]] for row in (ws.max_row - 1, ws.max_row)]
+    ws.delete_rows(6, ws.max_row - 5)
+
+    last_row = 5 + employees
+    for i in range(employees):
+        row = 6 + i
+        for column, (value, style) in enumerate(prototype, 1):
+            if isinstance(value, str) and value.startswith('='):
+                value = Translator(value, origin="A6").translate_formula(f"A{row}")
+            elif column == 1:
+                value = i + 1
+            elif column == 2:
+                value = employee_name(i)
+            cell = ws.cell(row=row, column=column, value=value)
+            cell._style = copy(style)
+
+    for offset, footer in enumerate(footer_rows, 1):
+        for column, (value, style) in enumerate(footer, 1):
+            if isinstance(value, str) and value.startswith('=SUM('):
+                letter = value[5]
+                value = f"=SUM({letter}6:{letter}{last_row})"
+            cell = ws.cell(row=last_row + offset, column=column, value=value)
+            cell._style = copy(style)
+    wb.save(path)
+    return [employee_name(i) for i in range(employees)]
+
+def pick_creator(rng, names):
+    """随机选取创建人，少量记录的创建人不在工资表中"""
+    if rng.random() < 0.02:
+        return f"外部人员{rng.randrange(100)}"
+    return rng.choice(names)
+
+def generate_leave_file(path, names, records, seed=0):
+    """生成请假表，日期和时长使用混合写法"""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(LEAVE_HEADER)
+    year_start = datetime(2025, 1, 1)
+    for i in range(records):
+        start = year_start + timedelta(days=rng.randrange(365))
+        days = rng.choice([0.5, 1, 1, 2, 3, 5])
+        end = start + timedelta(days=max(int(days) - 1, 0))
+        start_half, end_half = ('上午', '上午') if days == 0.5 else ('上午', '下午')
+        write_date = rng.choice(LEAVE_DATE_WRITERS)
+        creator = pick_creator(rng, names)
+        row = [None] * len(LEAVE_HEADER)
+        row[0] = i + 1
+        row[1] = f"{rng.getrandbits(64):016x}"
+        row[2] = rng.choice(LEAVE_TYPES)
+        row[3] = write_date(start, start_half)
+        row[4] = write_date(end, end_half)
+        row[5] = leave_duration_text(rng, days)
+        row[6] = '家中有事'
+        row[14] = creator
+        row[16] = '审批通过'
+        row[17] = '已结束'
+        row[19] = rng.choice(DEPARTMENTS)
+        row[20] = f"{creator}提交的请假"
+        ws.append(row)
+    wb.save(path)
+
+def generate_overtime_file(path, names, records, seed=1):
+    """生成加班表（前两行为标题），日期和时长使用混合写法"""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for header in OVERTIME_HEADER_ROWS:
+        ws.append(header)
+    year_start = datetime(2025, 1, 1)
+    for i in range(records):
+        start = year_start + timedelta(days=rng.randrange(365), hours=rng.choice([9, 14, 18, 19]))
+        hours = rng.choice([1, 2, 2.5, 3, 4, 8])
+        end = start + timedelta(hours=hours)
+        write_time = rng.choice(OVERTIME_TIME_WRITERS)
+        creator = pick_creator(rng, names)
+        row = [None] * len(OVERTIME_HEADER_ROWS[0])
+        row[0] = i + 1
+        row[1] = f"{rng.getrandbits(64):016x}"
+        row[3] = creator
+        row[4] = write_time(start)
+        row[5] = write_time(end)
+        row[8] = overtime_duration_text(rng, hours)
+        row[11] = '已签名'
+        row[12] = rng.choice(OVERTIME_REASONS)
+        row[15] = creator
+        row[17] = '审批通过'
+        row[18] = '已结束'
+        row[20] = rng.choice(DEPARTMENTS)
+        row[21] = f"{creator}提交的加班"
+        ws.append(row)
+    wb.save(path)
+
+def generate_dataset(data_dir, employees, records, source_template):
+    """生成一组测试数据，已存在的文件直接复用，返回 (模板路径, 请假表路径, 加班表路径)"""
+    os.makedirs(data_dir, exist_ok=True)
+    template_path = os.path.join(data_dir, f"salary_{employees}.xlsx")
+    leave_path = os.path.join(data_dir, f"leave_{employees}_{records}.xlsx")
+    overtime_path = os.path.join(data_dir, f"overtime_{employees}_{records}.xlsx")
+    names = [employee_name(i) for i in range(employees)]
+    if not os.path.exists(template_path):
+        generate_salary_template(template_path, employees, source_template)
+    if not os.path.exists(leave_path):
+        generate_leave_file(leave_path, names, records)
+    if not os.path.exists(overtime_path):
+        generate_overtime_file(overtime_path, names, records)
+    return template_path, leave_path, overtime_path
+
+def measure(func, make_args, repeat=1, trace_memory=True):
+    """
+    测量函数的耗时和峰值内存
+    make_args 每次调用前生成新的参数（不计入耗时），耗时取 repeat 次中的最小值，峰值内存另外单独运行一次测量
+    返回 (最后一次的返回值, 测量结果字典)
+    """
+    timings = []
+    for _ in range(repeat):
+        args = make_args()
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+
+    stats = {'seconds': min(timings), 'runs': timings}
+    if trace_memory:
+        args = make_args()
+        tracemalloc.start()
+        try:
+            func(*args)
+            stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+def run_case(employees, records, data_dir, source_template, repeat=1, trace_memory=True):
+    """生成（或复用）一组测试数据并依次测量各阶段"""
+    from salary_core import (
+        read_salary_template, load_leave_data, load_overtime_data,
+        process_leave_data, process_overtime_data, save_salary_sheet_with_format
+    )
+
+    generate_started = time.perf_counter()
+    template_path, leave_path, overtime_path = generate_dataset(data_dir, employees, records, source_template)
+    case = {
+        'employees': employees, 'leave_records': records, 'overtime_records': records,
+        'generate_seconds': time.perf_counter() - generate_started, 'stages': {}
+    }
+    salary_df = read_salary_template(template_path)
+
+    leave_data, case['stages']['load_leave_data'] = measure(
+        load_leave_data, lambda: (leave_path,), repeat, trace_memory)
+    overtime_data, case['stages']['load_overtime_data'] = measure(
+        load_overtime_data, lambda: (overtime_path,), repeat, trace_memory)
+    # 处理函数会修改传入的数据，每次调用都使用新的副本
+    leave_result, case['stages']['process_leave_data'] = measure(
+        process_leave_data, lambda: (salary_df.copy(), leave_data.copy()), repeat, trace_memory)
+    overtime_result, case['stages']['process_overtime_data'] = measure(
+        process_overtime_data, lambda: (leave_result.copy(), overtime_data.copy()), repeat, trace_memory)
+    _, case['stages']['save_salary_sheet_with_format'] = measure(
+        save_salary_sheet_with_format, lambda: (overtime_result, template_path), repeat, trace_memory)
+    return case
+
+# 在新的 Python 进程中导入 HTTP 接口并完成预热，输出各步骤耗时
+COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from api.index import warmup
+warmup.run()
+print(json.dumps(dict(warmup.report(), total=time.perf_counter() - started)))
+"""
+
+COLD_START_STEPS = ['app_import', 'core_import', 'template_load', 'total', 'process']
+
+def measure_cold_start(repeat=1):
+    """多次启动新的 Python 进程测量冷启动耗时，各步骤取最小值；process 为包含解释器启动在内的进程总耗时"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START_SCRIPT, base_dir], capture_output=True, text=True, check=True
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run['process'] = time.perf_counter() - started
+        runs.append(run)
+    cold_start = {step: min(run[step] for run in runs) for step in COLD_START_STEPS}
+    cold_start['template_source'] = runs[0]['template_source']
+    cold_start['runs'] = runs
+    return cold_start
+
+def environment_info():
+    """记录运行环境，便于比较不同版本的结果"""
+    import numpy
+    import openpyxl
+    import pandas
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'openpyxl': openpyxl.__version__,
+    }
+
+def case_key(case):
+    return (case['employees'], case['leave_records'], case['overtime_records'])
+
+def compare_results(results, baseline, max_regression):
+    """
+    与基准结果逐阶段比较耗时
+    返回 (比较文本行列表, 是否存在超过 max_regression 的耗时增长)
+    """
+    baseline_cases = {case_key(case): case for case in baseline['cases']}
+    lines = []
+    regressed = False
+    for case in results['cases']:
+        old_case = baseline_cases.get(case_key(case))
+        if old_case is None:
+            lines.append(f"{case_key(case)}: 基准结果中没有相同规模的测试")
+            continue
+        for stage in STAGES:
+            new, old = case['stages'].get(stage), old_case['stages'].get(stage)
+            if new is None or old is None or not old['seconds']:
+                continue
+            ratio = new['seconds'] / old['seconds']
+            flag = ''
+            if ratio > 1 + max_regression:
+                flag = '  <-- 变慢'
+                regressed = True
+            lines.append(f"{case_key(case)} {stage:<32}{old['seconds']:>9.3f}s ->{new['seconds']:>9.3f}s  x{ratio:.2f}{flag}")
+
+    new, old = results.get('cold_start'), baseline.get('cold_start')
+    if new is not None and old is not None and old['process']:
+        ratio = new['process'] / old['process']
+        flag = ''
+        if ratio > 1 + max_regression:
+            flag = '  <-- 变慢'
+            regressed = True
+        lines.append(f"{'冷启动':<32}{old['process']:>9.3f}s ->{new['process']:>9.3f}s  x{ratio:.2f}{flag}")
+    return lines, regressed
+
+def format_results(results):
+    """生成便于阅读的结果表格"""
+    lines = [f"{'员工数':>8}{'记录数':>10}  {'阶段':<32}{'耗时(s)':>10}{'峰值内存(MB)':>14}"]
+    for case in results['cases']:
+        for stage in STAGES:
+            stats = case['stages'][stage]
+            peak = f"{stats['peak_mb']:>14.1f}" if 'peak_mb' in stats else f"{'-':>14}"
+            lines.append(f"{case['employees']:>8}{case['leave_records']:>10}  {stage:<32}{stats['seconds']:>10.3f}{peak}")
+
+    cold_start = results.get('cold_start')
+    if cold_start is not None:
+        lines.append(f"冷启动（模板来源：{cold_start['template_source']}）")
+        lines.extend(f"  {step:<32}{cold_start[step]:>10.3f}" for step in COLD_START_STEPS)
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="工资表生成流程的性能基准测试")
+    parser.add_argument('--size', nargs='+', choices=sorted(SIZES), help="预设规模，可指定多个（默认 small）")
+    parser.add_argument('--employees', type=int, help="自定义员工数，需与 --records 一起使用")
+    parser.add_argument('--records', type=int, help="自定义请假表、加班表各自的记录数")
+    parser.add_argument('--repeat', type=int, default=1, help="每个阶段重复测量的次数，耗时取最小值")
+    parser.add_argument('--no-memory', action='store_true', help="不测量峰值内存（测量内存需要额外运行一次）")
+    parser.add_argument('--data-dir', help="测试数据保存目录，已生成的文件会被复用（默认使用临时目录）")
+    parser.add_argument('--template', default=None, help="作为样式来源的工资表模板，默认使用项目中的模板")
+    parser.add_argument('--output', help="将结果写入该JSON文件")
+    parser.add_argument('--baseline', help="与之前保存的JSON结果比较")
+    parser.add_argument('--max-regression', type=float, default=0.2, help="允许的耗时增长比例，默认0.2")
+    parser.add_argument('--cold-start', action='store_true', help="另外测量 HTTP 接口的冷启动耗时（每次使用新的进程）")
+    args = parser.parse_args(argv)
+    if (args.employees is None) != (args.records is None):
+        parser.error("--employees 和 --records 需要一起使用")
+
+    # 处理过程中的逐条提示不输出，避免终端输出影响测量结果
+    logging.basicConfig(level=logging.ERROR, format='%(message)s')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from salary_core import TEMPLATE_PATH
+    source_template = args.template or os.path.join(os.path.dirname(os.path.abspath(__file__)), TEMPLATE_PATH)
+
+    sizes = [SIZES[name] for name in args.size or []]
+    if args.employees is not None:
+        sizes.append((args.employees, args.records))
+    if not sizes:
+        sizes.append(SIZES['small'])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        results = {'environment': environment_info(), 'cases': []}
+        for employees, records in sizes:
+            print(f"测试规模：{employees} 名员工，请假、加班记录各 {records} 条", file=sys.stderr)
+            results['cases'].append(run_case(
+                employees, records, data_dir, source_template, args.repeat, not args.no_memory
+            ))
+        if args.cold_start:
+            print("测试冷启动", file=sys.stderr)
+            results['cold_start'] = measure_cold_start(args.repeat)
+
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines, regressed = compare_results(results, baseline, args.max_regression)
+        print('\n'.join(lines))
+        if regressed:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
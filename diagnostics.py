@@ -0,0 +1,51 @@
+import pandas as pd
+
+# 诊断信息级别及显示名称，按严重程度排序
+LEVEL_LABELS = {'error': '错误', 'warning': '警告', 'info': '提示'}
+
+DIAGNOSTIC_COLUMNS = ['级别', '问题类型', '员工', '说明']
+
+class DiagnosticsCollector:
+    """
+    在处理过程中收集逐条记录的提示信息，处理结束后统一汇总显示
+    记录时只在内存中追加元组，不会像逐条调用 st.info/st.warning 那样向页面推送元素
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, level, issue, message, employee=None):
+        """记录一条信息，issue 为问题类型，用于分类统计和筛选"""
+        self.events.append((level, issue, employee, message))
+
+    def extend(self, level, issue, employees, messages):
+        """批量记录同一类型的信息，employees 与 messages 一一对应"""
+        self.events.extend((level, issue, employee, message) for employee, message in zip(employees, messages))
+
+    def to_frame(self):
+        """返回所有信息组成的DataFrame，按记录顺序排列"""
+        events = pd.DataFrame(self.events, columns=DIAGNOSTIC_COLUMNS)
+        events['级别'] = events['级别'].map(LEVEL_LABELS).fillna(events['级别'])
+        return events
+
+    def counts_by_issue(self):
+        """按级别和问题类型统计条数，严重的排在前面"""
+        events = self.to_frame()
+        counts = events.groupby(['级别', '问题类型'], sort=False).size().rename('条数').reset_index()
+        level_order = {label: i for i, label in enumerate(LEVEL_LABELS.values())}
+        counts['_order'] = counts['级别'].map(level_order).fillna(len(level_order))
+        return counts.sort_values(['_order', '条数'], ascending=[True, False]).drop(columns='_order').reset_index(drop=True)
+
+    def counts_by_employee(self):
+        """按员工统计各问题类型的条数，条数多的排在前面"""
+        events = self.to_frame().dropna(subset=['员工'])
+        if events.empty:
+            return pd.DataFrame(columns=['员工', '合计'])
+        counts = pd.crosstab(events['员工'], events['问题类型'])
+        counts['合计'] = counts.sum(axis=1)
+        counts = counts.sort_values('合计', ascending=False)
+        counts.columns.name = None
+        return counts.reset_index()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# 按8小时工作日换算天数和小时数
+HOURS_PER_DAY = 8
+
+# 各单位对应的小时数，没有单位时按调用方指定的默认单位计算
+UNIT_HOURS = {
+    '天': HOURS_PER_DAY, '日': HOURS_PER_DAY, 'd': HOURS_PER_DAY, 'day': HOURS_PER_DAY, 'days': HOURS_PER_DAY,
+    '小时': 1, '时': 1, 'h': 1, 'hr': 1, 'hrs': 1, 'hour': 1, 'hours': 1,
+    '分钟': 1 / 60, '分': 1 / 60, 'min': 1 / 60, 'mins': 1 / 60,
+}
+
+# 一段"数值+单位"，单位按长度从长到短排列，避免'hours'被识别为'h'
+DURATION_UNIT_PATTERN = '|'.join(sorted(map(str.lower, UNIT_HOURS), key=len, reverse=True))
+DURATION_TOKEN_PATTERN = rf'(\d+(?:\.\d+)?|\.\d+)\s*({DURATION_UNIT_PATTERN})?'
+# 整个时长由一段或多段组成，例如'1天4小时'
+DURATION_PATTERN = rf'(?:\s*{DURATION_TOKEN_PATTERN}\s*)+'
+
+# 全角数字、小数点和字母转为半角
+FULL_WIDTH_TABLE = str.maketrans(
+    '０１２３４５６７８９．ＨＤｈｄ',
+    '0123456789.HDhd'
+)
+
+def normalize_duration_text(values):
+    """统一时长文本：去掉首尾空白、全角转半角、字母转小写"""
+    return values.astype(str).str.translate(FULL_WIDTH_TABLE).str.strip().str.lower()
+
+def parse_duration_column(values, unit='hours'):
+    """
+    将整列时长统一换算为小时数（unit='hours'）或天数（unit='days'）
+    支持数值、'3'、'3小时'、'2.5h'、'0.5天'、'1天4小时' 等写法，没有单位的按 unit 计算
+    返回 (换算结果, 无法解析的记录掩码)，空值和无法解析的值都记为0，空值和空白文本不算无法解析
+    """
+    if unit not in ('hours', 'days'):
+        raise ValueError(f"不支持的时长单位: {unit}")
+    default_hours = HOURS_PER_DAY if unit == 'days' else 1
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+
+    hours = pd.Series(0.0, index=values.index)
+    invalid = pd.Series(False, index=values.index)
+
+    # 数值单元格直接按默认单位计算
+    is_number = values.map(lambda value: isinstance(value, (int, float, np.number)) and not isinstance(value, bool))
+    numbers = values[is_number & values.notna()].astype(float)
+    hours[numbers.index] = numbers * default_hours
+
+    # 文本只对不同的取值解析一次
+    texts = values[~is_number & values.notna()]
+    if texts.empty:
+        return (hours if unit == 'hours' else hours / HOURS_PER_DAY), invalid
+
+    unique_texts = pd.Series(pd.unique(texts.astype(str)))
+    normalized = normalize_duration_text(unique_texts)
+    valid = normalized.str.fullmatch(DURATION_PATTERN)
+
+    tokens = normalized[valid].str.extractall(DURATION_TOKEN_PATTERN)
+    token_hours = tokens[1].map(UNIT_HOURS).fillna(default_hours)
+    text_hours = (tokens[0].astype(float) * token_hours).groupby(level=0).sum()
+
+    parsed = pd.Series(np.nan, index=unique_texts.index)
+    parsed[text_hours.index] = text_hours
+    # 只有空白的文本与空值相同
+    parsed[normalized == ''] = 0.0
+    text_values = texts.astype(str).map(pd.Series(parsed.to_numpy(), index=unique_texts))
+
+    hours[texts.index] = text_values.fillna(0.0)
+    invalid[texts.index] = text_values.isna()
+    return (hours if unit == 'hours' else hours / HOURS_PER_DAY), invalid
@@ -0,0 +1,128 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+try:
+    # 安装了 opencc 时用它做完整的繁简转换，否则使用下面的常用字对照表
+    import opencc
+    TRADITIONAL_CONVERTER = opencc.OpenCC('t2s')
+except ImportError:
+    TRADITIONAL_CONVERTER = None
+
+# 姓名中常见的繁体字及对应的简体字，每两个字符为一组
+TRADITIONAL_PAIRS = (
+    '陳陈張张劉刘黃黄趙赵吳吴孫孙馬马鄭郑謝谢許许韓韩馮冯鄧邓羅罗葉叶蕭萧楊杨蔣蒋盧卢錢钱湯汤陸陆顧顾'
+    '龍龙萬万譚谭鍾钟賴赖閻阎鄒邹華华賈贾紀纪歐欧蘇苏嚴严饒饶鄔邬龔龚範范東东聶聂閔闵喬乔單单齊齐鄺邝'
+    '溫温寧宁廣广週周魯鲁顏颜韋韦畢毕莊庄衛卫簡简繆缪餘余鬱郁黨党麥麦'
+    '偉伟麗丽強强軍军傑杰濤涛國国紅红靜静艷艳豔艳鳳凤蘭兰瑩莹潔洁輝辉鵬鹏飛飞剛刚慶庆嬌娇興兴寶宝貴贵'
+    '長长維维勝胜儀仪義义順顺達达榮荣煒炜瑋玮詩诗夢梦雲云愛爱歡欢鳴鸣聰聪懷怀瀾澜嶺岭鐵铁銀银錦锦鋒锋'
+    '銘铭鈞钧釗钊鎮镇軒轩賢贤豐丰穎颖綺绮綠绿嘯啸權权樂乐樺桦楨桢傳传倫伦億亿鷹鹰鶴鹤齡龄峯峰濱滨漢汉'
+    '滿满澤泽瀟潇煥焕燁烨爾尔璽玺環环碩硕禮礼禎祯積积紹绍經经絲丝綱纲緯纬聖圣聲声肅肃藝艺蓮莲薈荟蘊蕴'
+    '誠诚語语諾诺謙谦譽誉讓让貞贞賓宾贊赞躍跃輪轮遠远遙遥邁迈釋释鑒鉴閃闪開开閩闽陽阳雙双靈灵頌颂風风'
+    '飄飘駿骏騰腾驥骥鳥鸟鴻鸿'
+)
+TRADITIONAL_TABLE = str.maketrans(TRADITIONAL_PAIRS[0::2], TRADITIONAL_PAIRS[1::2])
+
+# 少数民族姓名中的间隔号有多种写法，统一为'·'
+NAME_SEPARATOR_PATTERN = re.compile(r'[·•・‧∙.．]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# 工资表模板和请假、加班记录中可能出现的工号列
+TEMPLATE_ID_COLUMNS = ['工号', '员工编号', '员工工号']
+RECORD_ID_COLUMNS = ['工号', '创建人工号', '员工工号', '员工编号']
+
+# resolve 返回的位置：找不到对应员工、同名员工无法区分
+UNMATCHED = -1
+AMBIGUOUS = -2
+UNRESOLVED_REASONS = {UNMATCHED: '未匹配到员工', AMBIGUOUS: '同名员工无法区分'}
+
+def normalize_name(name):
+    """统一姓名写法：全角转半角、去掉所有空白、统一间隔号、繁体转简体"""
+    name = unicodedata.normalize('NFKC', str(name))
+    name = WHITESPACE_PATTERN.sub('', name)
+    name = NAME_SEPARATOR_PATTERN.sub('·', name)
+    if TRADITIONAL_CONVERTER is not None:
+        return TRADITIONAL_CONVERTER.convert(name)
+    return name.translate(TRADITIONAL_TABLE)
+
+def normalize_names(values):
+    """整列统一姓名写法，每个不同的取值只处理一次，空值保持为空"""
+    values = values.astype(object) if isinstance(values.dtype, pd.CategoricalDtype) else values
+    present = values.dropna()
+    unique_values = pd.unique(present)
+    keys = pd.Series([normalize_name(value) for value in unique_values], index=unique_values, dtype=object)
+    return values.map(keys)
+
+def normalize_ids(values):
+    """统一工号写法：数值工号去掉'.0'，去掉首尾空白，空值和空文本保持为空"""
+    def to_text(value):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        text = unicodedata.normalize('NFKC', str(value)).strip()
+        return text or None
+
+    values = values.astype(object) if isinstance(values.dtype, pd.CategoricalDtype) else values
+    present = values.dropna()
+    unique_values = pd.unique(present)
+    keys = pd.Series([to_text(value) for value in unique_values], index=unique_values, dtype=object)
+    return values.map(keys)
+
+def find_column(df, candidates):
+    """返回第一个存在的候选列名，都不存在时返回 None"""
+    return next((column for column in candidates if column in df.columns), None)
+
+class EmployeeIndex:
+    """
+    由工资表模板一次性建立的员工索引，将请假、加班记录的创建人对应到工资表中的行
+    姓名按 normalize_name 统一写法后匹配；模板和记录中都有工号时优先按工号匹配，用于区分同名员工
+    """
+
+    def __init__(self, salary_df):
+        self.size = len(salary_df)
+        self.name_keys = normalize_names(salary_df['姓名'])
+
+        # 姓名对应的行位置，同名员工标记为无法区分
+        self.name_positions = {}
+        for position, key in enumerate(self.name_keys):
+            if pd.isna(key):
+                continue
+            self.name_positions[key] = AMBIGUOUS if key in self.name_positions else position
+        self.duplicate_names = sorted(key for key, position in self.name_positions.items() if position == AMBIGUOUS)
+
+        self.id_column = find_column(salary_df, TEMPLATE_ID_COLUMNS)
+        self.id_positions = {}
+        if self.id_column is not None:
+            for position, key in enumerate(normalize_ids(salary_df[self.id_column])):
+                if key is not None and not pd.isna(key):
+                    self.id_positions.setdefault(key, position)
+
+    def resolve(self, records):
+        """
+        一次性将所有记录对应到工资表中的行位置
+        返回整数数组：找不到对应员工的为 UNMATCHED，同名员工无法区分的为 AMBIGUOUS
+        """
+        name_keys = normalize_names(records['创建人'])
+        positions = name_keys.map(self.name_positions).fillna(UNMATCHED).to_numpy(dtype=np.int64)
+
+        record_id_column = find_column(records, RECORD_ID_COLUMNS)
+        if self.id_positions and record_id_column is not None:
+            id_positions = normalize_ids(records[record_id_column]).map(self.id_positions)
+            has_id = id_positions.notna().to_numpy()
+            positions[has_id] = id_positions[has_id].to_numpy(dtype=np.int64)
+        return positions
+
+    def unresolved_summary(self, records, positions):
+        """
+        按创建人统计没有对应到员工的记录
+        返回 DataFrame，列为 创建人、原因（UNRESOLVED_REASONS 中的值）、记录数
+        """
+        unresolved = positions < 0
+        if not unresolved.any():
+            return pd.DataFrame(columns=['创建人', '原因', '记录数'])
+        summary = pd.DataFrame({
+            '创建人': records['创建人'].to_numpy()[unresolved],
+            '原因': pd.Series(positions[unresolved]).map(UNRESOLVED_REASONS).to_numpy(),
+        })
+        return summary.groupby(['创建人', '原因'], sort=False).size().rename('记录数').reset_index()
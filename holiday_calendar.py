@@ -0,0 +1,100 @@
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+# 节假日数据文件，按年份记录法定节假日放假区间和调休上班日
+HOLIDAY_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'holidays_cn.json')
+
+# 日期类型编码，DAY_TYPE_LABELS 按编码取对应的中文名称
+WORKDAY, WEEKEND, HOLIDAY = 0, 1, 2
+DAY_TYPE_LABELS = np.array(['工作日', '休息日', '法定节假日'], dtype=object)
+
+# 日历表中的标记：0 表示按周末规则判断，HOLIDAY 表示放假，MAKEUP_WORKDAY 表示调休上班
+MAKEUP_WORKDAY = 3
+
+# 1970-01-01 是星期四，用于由天数直接计算星期
+EPOCH_WEEKDAY = 3
+
+class HolidayCalendar:
+    """
+    中国法定节假日日历
+    加载时将所有年份的放假日和调休上班日展开为按天编号的查找表，单个日期和整列日期的查询都是O(1)
+    """
+
+    def __init__(self, data):
+        days = {}
+        for year_data in data.values():
+            for holiday in year_data.get('holidays', []):
+                start = np.datetime64(holiday['start'], 'D')
+                end = np.datetime64(holiday['end'], 'D')
+                for day in np.arange(start, end + 1):
+                    days[int(day.astype(np.int64))] = HOLIDAY
+            for workday in year_data.get('workdays', []):
+                days[int(np.datetime64(workday, 'D').astype(np.int64))] = MAKEUP_WORKDAY
+
+        self.years = frozenset(int(year) for year in data)
+        if days:
+            self._first_day = min(days)
+            self._marks = np.zeros(max(days) - self._first_day + 1, dtype=np.int8)
+            offsets = np.fromiter(days.keys(), dtype=np.int64) - self._first_day
+            self._marks[offsets] = np.fromiter(days.values(), dtype=np.int8)
+        else:
+            self._first_day = 0
+            self._marks = np.zeros(0, dtype=np.int8)
+
+    @classmethod
+    def from_file(cls, path=HOLIDAY_DATA_PATH):
+        """从节假日数据文件加载日历"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def covers(self, year):
+        """判断某一年份是否有节假日数据"""
+        return int(year) in self.years
+
+    def classify_codes(self, dates):
+        """
+        批量判断日期类型，返回日期类型编码数组
+        dates 可以是日期列表、numpy datetime64 数组或 pandas 日期列，无法识别的日期（NaT）按工作日处理
+        """
+        days = np.asarray(dates, dtype='datetime64[D]')
+        valid = ~np.isnat(days)
+        day_numbers = days.astype(np.int64)
+
+        weekday = (day_numbers + EPOCH_WEEKDAY) % 7
+        codes = np.where(weekday >= 5, WEEKEND, WORKDAY).astype(np.int8)
+
+        offsets = day_numbers - self._first_day
+        in_table = valid & (offsets >= 0) & (offsets < len(self._marks))
+        marks = np.zeros(days.shape, dtype=np.int8)
+        marks[in_table] = self._marks[offsets[in_table]]
+
+        codes[marks == HOLIDAY] = HOLIDAY
+        codes[marks == MAKEUP_WORKDAY] = WORKDAY
+        codes[~valid] = WORKDAY
+        return codes
+
+    def classify(self, dates):
+        """批量判断日期类型，返回'工作日'、'休息日'、'法定节假日'组成的数组"""
+        return DAY_TYPE_LABELS[self.classify_codes(dates)]
+
+    def day_type(self, date_obj):
+        """判断单个日期的类型"""
+        if isinstance(date_obj, datetime):
+            date_obj = date_obj.date()
+        return DAY_TYPE_LABELS[self.classify_codes([date_obj])[0]]
+
+    def uncovered_years(self, dates):
+        """返回日期中没有节假日数据的年份（这些年份只能按周末判断）"""
+        days = np.asarray(dates, dtype='datetime64[D]')
+        days = days[~np.isnat(days)]
+        years = np.unique(days.astype('datetime64[Y]').astype(np.int64) + 1970)
+        return [int(year) for year in years if not self.covers(year)]
+
+@lru_cache(maxsize=None)
+def get_holiday_calendar(path=HOLIDAY_DATA_PATH):
+    """获取节假日日历，同一数据文件只加载和索引一次"""
+    return HolidayCalendar.from_file(path)
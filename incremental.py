@@ -0,0 +1,95 @@
+"""
+增量生成工资表时记录上一次生成的状态
+
+每条休假、加班记录按参与合并的列计算指纹，再按员工（工资表中的行位置）把其全部记录的指纹
+依次组合为签名。重新上传的文件与上一次相比，只有签名变化的员工需要重新计算，
+其余员工的行直接沿用上一次的结果。
+"""
+import numpy as np
+import pandas as pd
+
+def record_fingerprints(records, columns):
+    """按参与合并的列计算每条记录的指纹，返回 uint64 数组"""
+    used_columns = [column for column in columns if column in records.columns]
+    return pd.util.hash_pandas_object(records[used_columns], index=False).to_numpy()
+
+def employee_signatures(positions, fingerprints):
+    """
+    按员工组合其全部记录的指纹，记录顺序会影响备注的先后，顺序不同也视为不同
+    返回 {工资表行位置: 签名}，没有对应到员工的记录不参与
+    """
+    matched = positions >= 0
+    if not matched.any():
+        return {}
+    grouped = pd.Series(fingerprints[matched]).groupby(positions[matched], sort=False).agg(tuple)
+    return {int(position): hash(values) for position, values in grouped.items()}
+
+class RecordSignatures:
+    """一份休假表或加班表的员工签名，records 为 None 或缺少创建人列时无法比较"""
+
+    def __init__(self, records, columns, employee_index):
+        self.columns = None
+        self.positions = None
+        self.signatures = None
+        if records is None:
+            self.columns = ()
+            self.signatures = {}
+        elif '创建人' in records.columns:
+            self.columns = tuple(column for column in columns if column in records.columns)
+            self.positions = employee_index.resolve(records)
+            self.signatures = employee_signatures(self.positions, record_fingerprints(records, columns))
+
+    def comparable(self, previous):
+        """两次的记录都能比较，且参与合并的列相同"""
+        return self.signatures is not None and previous.signatures is not None and self.columns == previous.columns
+
+    def changed(self, previous):
+        """返回签名与上一次不同的工资表行位置集合，包括新增和不再有记录的员工"""
+        return {
+            position for position in self.signatures.keys() | previous.signatures.keys()
+            if self.signatures.get(position) != previous.signatures.get(position)
+        }
+
+    def select(self, records, positions):
+        """取出属于指定员工的记录，以及没有对应到员工的记录（用于提示）"""
+        keep = np.isin(self.positions, positions) | (self.positions < 0)
+        return records[keep].copy()
+
+class MergeState:
+    """
+    一次生成的状态：模板内容的哈希、休假和加班记录的员工签名、工资月份、整列推断出的日期格式、
+    生成的工资表及其文件内容
+    positions 只在本次比较时使用，保存前由 release 释放
+    """
+
+    def __init__(self, template_digest, leave, overtime, payroll_month=None, date_formats=None):
+        self.template_digest = template_digest
+        self.leave = leave
+        self.overtime = overtime
+        self.payroll_month = payroll_month
+        self.date_formats = date_formats
+        self.result_df = None
+        self.excel_data = None
+
+    def changed_positions(self, previous):
+        """
+        返回与上一次相比需要重新计算的工资表行位置（升序数组）
+        没有上一次的结果、模板或工资月份变化、记录包含的列变化、推断出的日期格式变化时返回 None，需要完整生成
+        （沿用的行是按上一次推断出的格式解析日期的）
+        """
+        if previous is None or previous.excel_data is None or previous.template_digest != self.template_digest:
+            return None
+        if previous.payroll_month != self.payroll_month or previous.date_formats != self.date_formats:
+            return None
+        if not (self.leave.comparable(previous.leave) and self.overtime.comparable(previous.overtime)):
+            return None
+        changed = self.leave.changed(previous.leave) | self.overtime.changed(previous.overtime)
+        return np.array(sorted(changed), dtype=np.int64)
+
+    def release(self, result_df, excel_data):
+        """记录本次生成的结果，释放比较时使用的记录行位置"""
+        self.result_df = result_df
+        self.excel_data = excel_data
+        self.leave.positions = None
+        self.overtime.positions = None
+        return self
@@ -0,0 +1,127 @@
+"""
+按开始时间、结束时间计算请假的工作日天数
+
+开始时间、结束时间带有"上午"、"下午"标记时按半天计算：从下午开始的第一天、到上午结束的最后一天各只记半天。
+只统计工作日（按节假日日历，法定节假日和周末不计入，调休上班日计入），所有记录按数组一次性计算，
+区间内的工作日数由工作日前缀和两次查表相减得到。跨月的请假可以按自然月拆分，使每个月的天数计入对应月份的工资表。
+"""
+import numpy as np
+import pandas as pd
+
+from holiday_calendar import WORKDAY, get_holiday_calendar
+
+# 开始时间、结束时间中的半天标记编码
+FULL_DAY, MORNING, AFTERNOON = 0, 1, 2
+
+HALF_DAY = 0.5
+
+def normalize_month(value):
+    """工资月份统一为 'YYYY-MM'，也可以写作 '2025-7'、'2025/07'、'2025年7月'，无法识别时抛出 ValueError"""
+    text = str(value).strip().replace('年', '-').replace('月', '').replace('/', '-')
+    month = pd.Period(text, freq='M')
+    if pd.isna(month):
+        raise ValueError(f"无法识别的月份: {value}")
+    return str(month)
+
+def half_day_marks(values):
+    """返回开始时间或结束时间列中的半天标记编码数组，没有标记或不是文本时为 FULL_DAY"""
+    texts = values.astype(str)
+    marks = np.full(len(values), FULL_DAY, dtype=np.int8)
+    marks[texts.str.contains('上午', regex=False).to_numpy(dtype=bool)] = MORNING
+    marks[texts.str.contains('下午', regex=False).to_numpy(dtype=bool)] = AFTERNOON
+    return marks
+
+def day_numbers(dates):
+    """日期转换为自 1970-01-01 起的天编号，无法识别的日期（NaT）对应的掩码为 False"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    return days.astype(np.int64), ~np.isnat(days)
+
+class WorkdayCounter:
+    """
+    一段日期范围内工作日数的前缀和
+    prefix[i] 为范围内前 i 天中的工作日数，闭区间 [start, end] 内的工作日数为 prefix[end + 1] - prefix[start]
+    """
+
+    def __init__(self, first_day, last_day, calendar=None):
+        calendar = calendar or get_holiday_calendar()
+        self.first_day = first_day
+        days = np.arange(first_day, last_day + 1).astype('datetime64[D]')
+        self.workdays = calendar.classify_codes(days) == WORKDAY
+        self.prefix = np.concatenate([[0], np.cumsum(self.workdays)])
+
+    @classmethod
+    def covering(cls, start_days, end_days, calendar=None):
+        """覆盖所有区间的计数器，没有区间时覆盖空范围"""
+        if len(start_days) == 0:
+            return cls(0, -1, calendar)
+        return cls(int(start_days.min()), int(end_days.max()), calendar)
+
+    def count(self, start_days, end_days):
+        """每个闭区间 [start, end] 内的工作日数"""
+        return self.prefix[end_days - self.first_day + 1] - self.prefix[start_days - self.first_day]
+
+    def is_workday(self, days):
+        return self.workdays[days - self.first_day]
+
+def valid_intervals(start_days, end_days, start_marks, end_marks, start_valid, end_valid):
+    """起止日期都能识别、结束不早于开始，且不是同一天下午开始上午结束的区间"""
+    valid = start_valid & end_valid & (end_days >= start_days)
+    same_day = start_days == end_days
+    return valid & ~(same_day & (start_marks == AFTERNOON) & (end_marks == MORNING))
+
+def segment_days(counter, start_days, end_days, halve_start, halve_end):
+    """区间内的工作日天数，halve_start、halve_end 为首日、末日只记半天的掩码（首末日不是工作日时不扣减）"""
+    days = counter.count(start_days, end_days).astype(float)
+    days -= HALF_DAY * (halve_start & counter.is_workday(start_days))
+    days -= HALF_DAY * (halve_end & counter.is_workday(end_days))
+    return days
+
+def leave_workdays(start_dates, end_dates, start_marks, end_marks, calendar=None):
+    """
+    批量计算每条请假的工作日天数，返回 float 数组
+    起止日期无法识别、结束早于开始的记录为 NaN
+    """
+    start_days, start_valid = day_numbers(start_dates)
+    end_days, end_valid = day_numbers(end_dates)
+    valid = valid_intervals(start_days, end_days, start_marks, end_marks, start_valid, end_valid)
+
+    workdays = np.full(len(start_days), np.nan)
+    if valid.any():
+        start_days, end_days = start_days[valid], end_days[valid]
+        counter = WorkdayCounter.covering(start_days, end_days, calendar)
+        workdays[valid] = segment_days(
+            counter, start_days, end_days, start_marks[valid] == AFTERNOON, end_marks[valid] == MORNING
+        )
+    return workdays
+
+def split_by_month(start_dates, end_dates, start_marks, end_marks, calendar=None):
+    """
+    把每条请假按自然月拆分，返回 DataFrame：记录（在输入中的位置）、月份（该月第一天的日期）、天数
+    每条记录在其跨越的每个月各占一行，起止日期无效的记录不出现在结果中
+    """
+    start_days, start_valid = day_numbers(start_dates)
+    end_days, end_valid = day_numbers(end_dates)
+    valid = valid_intervals(start_days, end_days, start_marks, end_marks, start_valid, end_valid)
+    records = np.flatnonzero(valid)
+    start_days, end_days = start_days[valid], end_days[valid]
+
+    # 每条记录按跨越的月数重复，再依次取各月与区间的交集
+    start_months = start_days.astype('datetime64[D]').astype('datetime64[M]')
+    end_months = end_days.astype('datetime64[D]').astype('datetime64[M]')
+    spans = (end_months - start_months).astype(np.int64) + 1
+    repeated = np.repeat(np.arange(len(records)), spans)
+    offsets = np.arange(len(repeated)) - np.repeat(np.cumsum(spans) - spans, spans)
+    months = start_months[repeated] + offsets
+
+    month_first = months.astype('datetime64[D]').astype(np.int64)
+    month_last = (months + 1).astype('datetime64[D]').astype(np.int64) - 1
+    segment_start = np.maximum(start_days[repeated], month_first)
+    segment_end = np.minimum(end_days[repeated], month_last)
+
+    counter = WorkdayCounter.covering(start_days, end_days, calendar)
+    days = segment_days(
+        counter, segment_start, segment_end,
+        (segment_start == start_days[repeated]) & (start_marks[records][repeated] == AFTERNOON),
+        (segment_end == end_days[repeated]) & (end_marks[records][repeated] == MORNING),
+    )
+    return pd.DataFrame({'记录': records[repeated], '月份': months, '天数': days})
@@ -0,0 +1,81 @@
+import cProfile
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# cProfile 结果中保留的函数数量（按累计耗时排序）
+PROFILE_TOP_FUNCTIONS = 30
+
+class PipelineProfiler:
+    """
+    记录工资表生成流程中各阶段的耗时、处理行数和峰值内存
+    trace_memory 为 True 时用 tracemalloc 统计每个阶段新增的峰值内存，
+    use_cprofile 为 True 时对各阶段的代码进行 cProfile 采样，两者都会使处理变慢，默认只记录耗时
+    """
+
+    def __init__(self, trace_memory=False, use_cprofile=False):
+        self.trace_memory = trace_memory
+        self.use_cprofile = use_cprofile
+        self.stages = []
+        self._profile = cProfile.Profile() if use_cprofile else None
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        记录一个阶段，rows 为该阶段处理的行数
+        返回该阶段的记录字典，处理行数在阶段开始时未知的，可以在阶段内设置 record['rows']
+        """
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        if self._profile is not None:
+            self._profile.enable()
+        record = {'name': name, 'seconds': None, 'rows': rows}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            if self._profile is not None:
+                self._profile.disable()
+            if self.trace_memory:
+                record['peak_mb'] = (tracemalloc.get_traced_memory()[1] - start_memory) / 1024 / 1024
+            if started_tracing:
+                tracemalloc.stop()
+            self.stages.append(record)
+
+    def profile_summary(self, limit=PROFILE_TOP_FUNCTIONS):
+        """返回按累计耗时排序的热点函数列表"""
+        if self._profile is None:
+            return []
+        stats = pstats.Stats(self._profile).stats
+        functions = []
+        for (filename, line, function), (_, calls, own_seconds, cumulative_seconds, _) in stats.items():
+            functions.append({
+                'function': function,
+                'location': f"{filename}:{line}",
+                'calls': calls,
+                'own_seconds': own_seconds,
+                'cumulative_seconds': cumulative_seconds,
+            })
+        functions.sort(key=lambda item: item['cumulative_seconds'], reverse=True)
+        return functions[:limit]
+
+    def report(self):
+        """返回可序列化为JSON的诊断结果"""
+        return {
+            'total_seconds': sum(stage['seconds'] for stage in self.stages),
+            'trace_memory': self.trace_memory,
+            'stages': list(self.stages),
+            'profile': self.profile_summary(),
+        }
+
+def profile_stage(profiler, name, rows=None):
+    """profiler 为 None 时不做任何记录"""
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(name, rows)
@@ -0,0 +1,140 @@
+"""
+按内容寻址的工资表结果缓存
+
+以工资表模板、休假表、加班表三个文件的内容和处理代码的版本计算键，生成的 .xlsx 文件内容保存在磁盘上。
+完全相同的输入再次生成时直接返回保存的文件，多个用户、多个进程可以共用同一个缓存目录。
+缓存总大小超过上限时，按最近使用时间淘汰最久未使用的文件。
+"""
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from importlib.metadata import version
+
+import pandas as pd
+
+# 默认的缓存目录和大小上限，可以用环境变量修改
+CACHE_DIR = os.environ.get('SALARY_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'salary_sheet_cache'))
+CACHE_MAX_MB = float(os.environ.get('SALARY_CACHE_MAX_MB', 512))
+
+# 影响生成结果的代码和数据文件，任何一个改动都会使已有的缓存失效
+VERSIONED_FILES = [
+    'salary_core.py', 'streaming_writer.py', 'duration_parser.py', 'employee_index.py', 'holiday_calendar.py',
+    'leave_calendar.py', 'holidays_cn.json'
+]
+
+CACHE_SUFFIX = '.xlsx'
+
+@lru_cache(maxsize=1)
+def code_version():
+    """根据处理代码、节假日数据和 pandas、openpyxl 的版本计算代码版本（openpyxl 的版本从安装信息读取，不导入）"""
+    digest = hashlib.sha256()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in VERSIONED_FILES:
+        digest.update(name.encode())
+        with open(os.path.join(base_dir, name), 'rb') as f:
+            digest.update(f.read())
+    digest.update(f"pandas {pd.__version__} openpyxl {version('openpyxl')}".encode())
+    return digest.hexdigest()
+
+def cache_key(template_bytes, leave_bytes=None, overtime_bytes=None, payroll_month=None):
+    """
+    计算三个输入文件、工资月份和代码版本对应的缓存键，没有上传的文件与空文件区分开
+    只有月日的日期按当前年份补全，所以键中也包含当前年份；
+    员工数达到 STREAMING_WRITE_ROWS 时改用流式写出，键中也包含该阈值
+    """
+    from salary_core import STREAMING_WRITE_ROWS
+
+    digest = hashlib.sha256()
+    digest.update(code_version().encode())
+    digest.update(str(datetime.now().year).encode())
+    digest.update(f"streaming:{STREAMING_WRITE_ROWS}".encode())
+    for file_bytes in (template_bytes, leave_bytes, overtime_bytes):
+        if file_bytes is None:
+            digest.update(b'-')
+        else:
+            digest.update(b'+' + hashlib.sha256(file_bytes).digest())
+    # 不指定工资月份时键与之前相同
+    if payroll_month is not None:
+        digest.update(f"month:{payroll_month}".encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    磁盘上的工资表结果缓存，每个结果保存为一个以缓存键命名的文件
+    读取时更新文件的修改时间，作为最近使用时间；写入使用临时文件再替换，避免其他进程读到不完整的文件
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        """缓存键对应的文件路径"""
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """返回缓存的文件内容，没有缓存时返回 None"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """保存生成结果，超过大小上限的结果不保存"""
+        if len(data) > self.max_bytes:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """返回所有缓存文件的 (最近使用时间, 大小, 路径)，按最近使用时间从早到晚排列"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的文件开始删除"""
+        entries = self.entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def size(self):
+        """缓存文件的总字节数"""
+        return sum(size for _, size, _ in self.entries())
+
+def open_result_cache(directory=CACHE_DIR, max_mb=CACHE_MAX_MB):
+    """打开缓存目录，目录无法创建（例如只读文件系统）时返回 None，不使用缓存"""
+    try:
+        return ResultCache(directory, max_mb)
+    except OSError:
+        return None
@@ -0,0 +1,1337 @@
+"""
+工资表生成的处理核心：读取模板和休假、加班数据，合并为工资表并按模板格式保存
+
+不依赖 Streamlit，命令行批处理（batch_generate.py）和 HTTP 接口（api/index.py）直接导入本模块，
+页面（salary_generator.py）只负责上传、预览和显示结果。openpyxl 只在保存工资表时才导入；
+在 Streamlit 页面中运行时提示信息显示在页面上，否则写入日志。
+"""
+import hashlib
+import io
+import logging
+import os
+import sys
+from datetime import datetime, date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from holiday_calendar import get_holiday_calendar
+from leave_calendar import FULL_DAY, half_day_marks, leave_workdays, split_by_month
+from pipeline_profiler import profile_stage
+from duration_parser import parse_duration_column
+from employee_index import EmployeeIndex, RECORD_ID_COLUMNS
+from incremental import MergeState, RecordSignatures
+from background_job import JobCancelled, current_progress, report_progress
+from template_snapshot import load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# 提示信息级别对应的日志级别
+NOTIFY_LOG_LEVELS = {
+    'info': logging.INFO,
+    'success': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+def in_streamlit():
+    """判断当前是否在 Streamlit 页面的脚本运行中（批处理和子进程中为False），没有导入 Streamlit 时不导入"""
+    if 'streamlit' not in sys.modules:
+        return False
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+def notify(level, message):
+    """
+    输出提示信息：在 Streamlit 页面中显示，否则写入日志
+    在后台任务的工作线程中同时记录到任务进度中，任务结束后由页面显示（见 background_job.py）
+    """
+    if in_streamlit():
+        import streamlit as st
+        
+        getattr(st, level)(message)
+    else:
+        logger.log(NOTIFY_LOG_LEVELS[level], message)
+        progress = current_progress()
+        if progress is not None:
+            progress.add_message(level, message)
+
+def record_issue(diagnostics, level, issue, message, employee=None):
+    """有诊断收集器时记录到收集器中，否则直接提示"""
+    if diagnostics is not None:
+        diagnostics.add(level, issue, message, employee)
+    else:
+        notify(level, message)
+
+def record_issues(diagnostics, level, issue, employees, messages):
+    """批量记录同一类型的逐条信息，没有诊断收集器时逐条提示"""
+    if diagnostics is not None:
+        diagnostics.extend(level, issue, employees, messages)
+    else:
+        for message in messages:
+            notify(level, message)
+
+def is_holiday_or_weekend(date_obj):
+    """判断日期是否为法定节假日或周末（调休上班日按工作日处理）"""
+    if not isinstance(date_obj, date):
+        return False, "工作日"
+    
+    date_type = get_holiday_calendar().day_type(date_obj)
+    return date_type != "工作日", date_type
+
+# 支持的日期格式，按顺序尝试
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%Y年%m月%d日',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d %H:%M',
+    '%m-%d',
+    '%m/%d'
+]
+
+# 只有月日的格式，解析后需要补充当前年份
+PARTIAL_DATE_FORMATS = ['%m-%d', '%m/%d']
+
+# 推断整列日期格式时抽样的取值个数
+DATE_FORMAT_SAMPLE_SIZE = 20
+
+# 逐个解析日期字符串时的缓存容量
+DATE_PARSE_CACHE_SIZE = 4096
+
+# 提取加班开始、结束时分时的缓存容量
+CLOCK_FORMAT_CACHE_SIZE = 65536
+
+def normalize_date_text(date_str):
+    """清理日期字符串，移除"上午"、"下午"等时间段标识，只保留日期部分"""
+    date_str = str(date_str).strip()
+    if '上午' in date_str or '下午' in date_str:
+        date_str = date_str.replace('上午', '').replace('下午', '').strip()
+    return date_str
+
+@lru_cache(maxsize=DATE_PARSE_CACHE_SIZE)
+def parse_date_text(date_str):
+    """按预定义格式逐个尝试解析已清理的日期字符串，结果会被缓存"""
+    # 尝试使用预定义格式解析
+    for fmt in DATE_FORMATS:
+        try:
+            parsed_date = datetime.strptime(date_str, fmt)
+            # 如果只有月日，补充当前年份
+            if fmt in PARTIAL_DATE_FORMATS:
+                current_year = datetime.now().year
+                parsed_date = parsed_date.replace(year=current_year)
+            return parsed_date
+        except ValueError:
+            continue
+    
+    # 尝试使用 pandas 的更灵活的解析
+    try:
+        return pd.to_datetime(date_str, errors='raise')
+    except:
+        return None
+
+def parse_date_from_string(date_str):
+    """
+    从字符串中解析日期
+    """
+    if pd.isna(date_str) or date_str == '':
+        return None
+    
+    # 如果已经是 pandas.Timestamp 或 datetime 对象，直接返回
+    if isinstance(date_str, (pd.Timestamp, datetime)):
+        return date_str
+    
+    return parse_date_text(normalize_date_text(date_str))
+
+def infer_date_format(date_texts, sample_size=DATE_FORMAT_SAMPLE_SIZE):
+    """
+    从已清理的日期字符串中抽样，推断整列统一使用的日期格式
+    返回能解析全部样本的第一个格式，找不到时返回None
+    """
+    samples = pd.unique(date_texts[date_texts != ''])[:sample_size]
+    if len(samples) == 0:
+        return None
+    
+    for fmt in DATE_FORMATS:
+        try:
+            for sample in samples:
+                datetime.strptime(sample, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+def parse_date_column(values, date_formats=None):
+    """
+    整列解析日期
+    先抽样推断该列的日期格式并按该格式整列解析，剩余不符合该格式的取值再逐个解析（带缓存）
+    无法解析的为NaT
+    date_formats 为列表时追加 (列名, 推断出的日期格式)，没有文本日期时格式为 None
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if date_formats is not None:
+            date_formats.append((values.name, None))
+        return values
+    values = object_values(values)
+    
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    is_text = values.map(lambda value: isinstance(value, str)).astype(bool)
+    
+    # 按推断出的格式整列解析，只有月日的格式补充当前年份
+    date_format = None
+    if is_text.any():
+        date_texts = values[is_text].astype(str).str.strip()
+        date_texts = date_texts.str.replace('上午', '', regex=False).str.replace('下午', '', regex=False).str.strip()
+        date_format = infer_date_format(date_texts)
+        if date_format in PARTIAL_DATE_FORMATS:
+            current_year = datetime.now().year
+            parsed[is_text] = pd.to_datetime(f"{current_year}-" + date_texts, format=f"%Y-{date_format}", errors='coerce').to_numpy()
+        elif date_format is not None:
+            parsed[is_text] = pd.to_datetime(date_texts, format=date_format, errors='coerce').to_numpy()
+    
+    # 其余取值（格式不一致的字符串、数字等）逐个解析，相同取值只解析一次
+    leftover = parsed.isna() & values.notna()
+    if leftover.any():
+        leftover_values = values[leftover]
+        parsed_values = {value: parse_date_from_string(value) for value in leftover_values.unique()}
+        parsed[leftover] = pd.to_datetime(leftover_values.map(parsed_values), errors='coerce').to_numpy()
+    
+    if date_formats is not None:
+        date_formats.append((values.name, date_format))
+    return parsed
+
+# 默认的工资表模板文件
+TEMPLATE_PATH = "工资表模板.xlsx"
+
+def read_salary_template(template_path):
+    """读取工资表模板中的员工数据"""
+    # 工资表模板第五行为标题，数据从第六行开始，所以使用header=4
+    df = pd.read_excel(template_path, header=4)
+    
+    # 过滤掉空行和无用列
+    df = df.dropna(subset=['姓名'])
+    
+    # 清理列名，移除无用的Unnamed列
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    return df
+
+def read_template_data(template_path):
+    """读取工资表模板中的员工数据，有与模板内容一致的快照（见 template_snapshot.py）时直接使用快照"""
+    snapshot = load_snapshot(template_path)
+    if snapshot is not None:
+        return snapshot.salary
+    return read_salary_template(template_path)
+
+def load_salary_template(template_path=TEMPLATE_PATH, read_template=read_template_data):
+    """加载工资表模板，read_template 为读取员工数据的函数"""
+    try:
+        if os.path.exists(template_path):
+            df = read_template(template_path)
+            notify('success', f"成功加载工资表模板，找到 {len(df)} 名员工")
+            return df, template_path
+        else:
+            notify('error', f"找不到工资表模板文件: {template_path}")
+            return None, None
+    except Exception as e:
+        notify('error', f"加载工资表模板时出错: {str(e)}")
+        return None, None
+
+# 查找标题行时预读的行数
+HEADER_SNIFF_ROWS = 50
+
+def find_header_row(rows, candidate_rows, is_header):
+    """
+    在预读的行中查找标题行
+    先按顺序检查候选行，都不符合时查找第一个包含'创建人'的行
+    返回 (行号, 是否为候选行)，找不到时返回 (None, False)
+    """
+    for header_row in candidate_rows:
+        if header_row < len(rows) and is_header(rows[header_row]):
+            return header_row, True
+    
+    for i, row in enumerate(rows):
+        if '创建人' in row:
+            return i, False
+    
+    return None, False
+
+def read_excel_with_header(uploaded_file, candidate_rows, is_header, columns=None):
+    """
+    先只读取表格前若干行找到标题行，再按该标题行完整读取一次
+    columns 指定只读取的列名，默认读取全部列
+    返回 (DataFrame, 标题行号, 是否为候选行)，找不到'创建人'列时返回 (None, None, False)
+    """
+    preview = pd.read_excel(uploaded_file, header=None, nrows=HEADER_SNIFF_ROWS)
+    rows = [list(row) for row in preview.itertuples(index=False, name=None)]
+    header_row, is_candidate = find_header_row(rows, candidate_rows, is_header)
+    
+    if is_candidate:
+        usecols = (lambda name: name in columns) if columns is not None else None
+        df = pd.read_excel(uploaded_file, header=header_row, usecols=usecols)
+        return df, header_row, True
+    
+    # 候选行都不符合时，按无标题完整读取并手动设置标题行；预读范围内没找到时在完整数据中继续查找
+    df = pd.read_excel(uploaded_file, header=None)
+    if header_row is None:
+        header_row, _ = find_header_row(
+            [list(row) for row in df.iloc[len(preview):].itertuples(index=False, name=None)], [], is_header
+        )
+        if header_row is None:
+            return None, None, False
+        header_row += len(preview)
+    
+    # 使用这一行作为列名
+    df.columns = df.iloc[header_row]
+    df = df.iloc[header_row+1:].reset_index(drop=True)
+    if columns is not None:
+        df = df.loc[:, df.columns.isin(columns)]
+    return df, header_row, False
+
+# 休假、加班数据中参与合并的列
+LEAVE_COLUMNS = ['创建人', '请假类型', '开始时间', '结束时间', '时长'] + RECORD_ID_COLUMNS
+OVERTIME_DATE_COLUMNS = ['开始时间', '日期', '加班日期', '申请日期']
+OVERTIME_CONTENT_COLUMNS = ['加班原因.1', '工作内容', '加班内容', '事由', '备注', '说明', '加班原因', '原因']
+OVERTIME_COLUMNS = ['创建人', '时长', '结束时间'] + OVERTIME_DATE_COLUMNS + OVERTIME_CONTENT_COLUMNS + RECORD_ID_COLUMNS
+
+# 始终按分类编码保存的列；其他文本列中不同取值的个数不超过行数的该比例时也按分类编码保存
+CATEGORY_COLUMNS = ['创建人', '请假类型']
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+def frame_memory_mb(df):
+    """DataFrame 占用的内存（MB），包括 object 列中的字符串本身"""
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+def is_category_column(values, name):
+    """只有文本（和空值）的列，创建人、请假类型或重复取值多的列按分类编码保存"""
+    if values.dtype != object:
+        return False
+    present = values.dropna()
+    if present.empty or not present.map(lambda value: isinstance(value, str)).all():
+        return False
+    return name in CATEGORY_COLUMNS or present.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values)
+
+def compact_records(df, columns, kind):
+    """
+    只保留合并用到的列（columns 为 None 时保留全部列），文本列按 is_category_column 转为分类编码，并提示前后的内存占用
+    开始时间、时长等列的原始文本会写入备注，日期格式也按原始文本整列推断，所以只做分类编码，取值保持不变
+    """
+    before = frame_memory_mb(df)
+    if columns is not None:
+        df = df.loc[:, df.columns.isin(columns)]
+    df = df.copy()
+    for position, name in enumerate(df.columns):
+        values = df.iloc[:, position]
+        if is_category_column(values, name):
+            df.isetitem(position, values.astype('category'))
+    notify('info', f"{kind}表保留合并用到的 {df.shape[1]} 列，内存占用 {before:.1f}MB → {frame_memory_mb(df):.1f}MB")
+    return df
+
+def object_values(values):
+    """分类编码的列转换为 object 列，按取值逐个处理时与加载时的原始列相同"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(object)
+    return values
+
+def is_leave_header(row):
+    """判断是否为休假表的标题行"""
+    return '创建人' in row and ('请假类型' in row or '时长' in row)
+
+def is_overtime_header(row):
+    """判断是否为加班表的标题行"""
+    return '创建人' in row and '时长' in row
+
+def load_leave_data(uploaded_file, columns=LEAVE_COLUMNS):
+    """加载休假数据，只保留 columns 中的列（为 None 时保留全部列），见 compact_records"""
+    if uploaded_file is not None:
+        try:
+            # 在前几行中查找正确的标题行，只完整读取一次
+            df, header_row, is_candidate = read_excel_with_header(
+                uploaded_file, [0, 1, 2, 3, 4], is_leave_header
+            )
+            if df is None:
+                notify('error', "无法在休假表中找到'创建人'列，请检查文件格式")
+                return None
+            
+            # 过滤掉空行
+            df = compact_records(df.dropna(subset=['创建人']), columns, '休假')
+            if is_candidate:
+                notify('info', f"成功读取休假数据，找到 {len(df)} 条记录")
+            else:
+                notify('info', f"成功解析休假数据，找到 {len(df)} 条记录")
+            return df
+        except Exception as e:
+            notify('error', f"读取休假数据时出错: {str(e)}")
+            return None
+
+def load_overtime_data(uploaded_file, columns=OVERTIME_COLUMNS):
+    """加载加班数据，只保留 columns 中的列（为 None 时保留全部列），见 compact_records"""
+    if uploaded_file is not None:
+        try:
+            # 加班表模板的数据从第三行开始，第二行是列标题，其次再尝试其他行
+            df, header_row, is_candidate = read_excel_with_header(
+                uploaded_file, [1, 0, 2, 3, 4], is_overtime_header
+            )
+            if df is None:
+                notify('error', "无法在加班表中找到'创建人'列，请检查文件格式")
+                return None
+            
+            # 过滤掉空行和标题行（创建人列包含"创建人"文字的行）
+            df = df.dropna(subset=['创建人'])
+            df = compact_records(df[df['创建人'] != '创建人'], columns, '加班')
+            if not is_candidate:
+                notify('info', f"成功解析加班数据，找到 {len(df)} 条记录")
+            elif header_row == 1:
+                notify('info', f"成功读取加班数据，找到 {len(df)} 条记录")
+            else:
+                notify('info', f"成功读取加班数据（header={header_row}），找到 {len(df)} 条记录")
+            return df
+        except Exception as e:
+            notify('error', f"读取加班数据时出错: {str(e)}")
+            return None
+
+def load_staged_file(kind, file_bytes, parse, typed_columns=None):
+    """
+    按文件内容读取暂存的解析结果（见 staging.py），没有暂存时用 parse 解析后暂存
+    没有安装 pyarrow 或暂存目录不可用时直接解析
+    """
+    from staging import open_staging_area
+    
+    staging_area = open_staging_area()
+    if staging_area is None:
+        return parse(io.BytesIO(file_bytes))
+    return staging_area.load(kind, file_bytes, parse, typed_columns)
+
+def leave_typed_columns(leave_data):
+    """休假表的类型化预览列：分类编码的创建人和请假类型、解析后的起止日期和休假天数"""
+    typed = pd.DataFrame({'创建人': pd.Categorical(text_column(leave_data, '创建人'))})
+    typed['请假类型'] = pd.Categorical(text_column(leave_data, '请假类型'))
+    for column, label in (('开始时间', '开始日期'), ('结束时间', '结束日期')):
+        if column in leave_data.columns:
+            typed[label] = parse_date_column(leave_data[column]).to_numpy()
+    if '时长' in leave_data.columns:
+        typed['休假天数'] = parse_duration_column(leave_data['时长'], unit='days')[0].to_numpy()
+    return typed
+
+def overtime_typed_columns(overtime_data):
+    """加班表的类型化预览列：分类编码的创建人、解析后的加班日期、日期类型和加班小时数"""
+    typed = pd.DataFrame({'创建人': pd.Categorical(text_column(overtime_data, '创建人'))})
+    overtime_dates = parse_overtime_dates(overtime_data)['加班日期']
+    typed['加班日期'] = overtime_dates.to_numpy()
+    typed['日期类型'] = pd.Categorical(classify_day_types(overtime_dates))
+    if '时长' in overtime_data.columns:
+        typed['加班小时'] = parse_duration_column(overtime_data['时长'], unit='hours')[0].to_numpy()
+    return typed
+
+def load_staged_leave_data(file_bytes):
+    """读取休假表，每个文件只解析一次，之后读取暂存的列式文件"""
+    return load_staged_file('leave', file_bytes, load_leave_data, leave_typed_columns)
+
+def load_staged_overtime_data(file_bytes):
+    """读取加班表，每个文件只解析一次，之后读取暂存的列式文件"""
+    return load_staged_file('overtime', file_bytes, load_overtime_data, overtime_typed_columns)
+
+def load_staged_salary_template(file_bytes):
+    """读取工资表模板中的员工数据，每个模板文件只解析一次，之后读取暂存的列式文件"""
+    return load_staged_file('template', file_bytes, read_salary_template)
+
+def file_digest(file_bytes):
+    """计算上传文件内容的哈希值，作为解析结果缓存的键"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def text_column(df, column):
+    """
+    取出文本列，空值或缺失列统一为空字符串
+    每个值按 str() 转换，日期时间列与逐行处理时相同（如 2025-07-23 00:00:00）
+    """
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return object_values(df[column]).astype(object).map(str, na_action='ignore').fillna('').astype(object)
+
+def append_notes(result_df, mask, notes):
+    """将新的备注文本追加到指定行的备注列，已有备注保留在前面"""
+    if '备注' not in result_df.columns:
+        return
+    current_notes = result_df.loc[mask, '备注'].tolist()
+    merged_notes = []
+    for current_note, note in zip(current_notes, notes):
+        current_note = str(current_note) if pd.notna(current_note) else ''
+        if current_note and current_note != 'nan':
+            merged_notes.append(f"{current_note}\n{note}")
+        else:
+            merged_notes.append(note)
+    result_df['备注'] = result_df['备注'].astype(object)
+    result_df.loc[mask, '备注'] = pd.Series(merged_notes, index=result_df.index[mask], dtype=object)
+
+def encode_employees(positions, names):
+    """将创建人映射为累计结果中的位置，新出现的创建人按出现顺序追加到 positions"""
+    for name in pd.unique(names):
+        if name not in positions:
+            positions[name] = len(positions)
+    return names.map(positions).to_numpy(dtype=np.int64)
+
+# 合并时每块汇总的员工数，每块汇总后报告一次已处理的员工数
+MERGE_CHUNK_EMPLOYEES = 200
+
+def employee_chunks(positions):
+    """
+    按工资表行位置把记录分块，每块包含一批员工的全部记录，块内保持记录原有的先后顺序
+    依次返回 (该块记录的位置数组, 截至该块已处理的员工数)，没有记录时返回一个空块
+    """
+    blocks = positions // MERGE_CHUNK_EMPLOYEES
+    order = np.argsort(blocks, kind='stable')
+    employees_done = 0
+    for rows in np.split(order, np.flatnonzero(np.diff(blocks[order])) + 1):
+        employees_done += len(np.unique(positions[rows]))
+        yield rows, employees_done
+
+def grow_array(values, size):
+    """将累计数组扩展到指定长度，新位置填0"""
+    if len(values) >= size:
+        return values
+    return np.concatenate([values, np.zeros(size - len(values), dtype=values.dtype)])
+
+class LeaveAggregator:
+    """
+    按员工累计休假记录，记录可以分批加入
+    员工默认为创建人，也可以传入工资表中的行位置等其他标识
+    汇总结果包含总天数、是否含事假/病假以及备注文本
+    """
+    
+    def __init__(self):
+        self.positions = {}
+        self.total_days = np.zeros(0, dtype=float)
+        self.has_unpaid_leave = np.zeros(0, dtype=bool)
+        self.detail_lines = []
+        self.detail_bytes = 0
+        self.record_count = 0
+    
+    def add(self, leave_data, employees=None):
+        """加入一批休假记录，记录需已包含'休假天数'列，employees 为每条记录对应的员工标识"""
+        leave_types = object_values(leave_data['请假类型'])
+        leave_types = leave_types.astype(object).map(str, na_action='ignore').fillna('未知类型').astype(object)
+        
+        # 构建每条记录的详细说明，只包含必要信息；按工资月份计算时注明计入本月的天数
+        details = leave_types
+        for label, column in (('开始', '开始时间'), ('结束', '结束时间'), ('时长', '时长'), ('计入本月', '本月天数')):
+            values = text_column(leave_data, column)
+            has_value = (values != '') & (values != 'nan')
+            details = details.where(~has_value, details + f" {label}:" + values)
+        
+        codes = encode_employees(self.positions, leave_data['创建人'] if employees is None else employees)
+        self.total_days = grow_array(self.total_days, len(self.positions))
+        self.has_unpaid_leave = grow_array(self.has_unpaid_leave, len(self.positions))
+        self.detail_lines.extend([] for _ in range(len(self.positions) - len(self.detail_lines)))
+        
+        np.add.at(self.total_days, codes, leave_data['休假天数'].to_numpy(dtype=float))
+        
+        # 检查是否有影响全勤的休假类型
+        unpaid_flags = leave_types.str.contains('事假|病假', regex=True).to_numpy(dtype=bool)
+        np.logical_or.at(self.has_unpaid_leave, codes, unpaid_flags)
+        
+        # 将每条记录作为单独的行
+        chunk_lines = ('• ' + details).groupby(codes, sort=False).agg('\n'.join)
+        for code, lines in chunk_lines.items():
+            self.detail_lines[code].append(lines)
+            self.detail_bytes += sys.getsizeof(lines)
+        
+        self.record_count += len(leave_data)
+    
+    def memory_usage(self):
+        """估算累计结果占用的内存字节数"""
+        return self.total_days.nbytes + self.has_unpaid_leave.nbytes + self.detail_bytes
+    
+    def summary(self):
+        """返回以员工标识为索引的汇总结果"""
+        notes = [
+            f"休假共{days}天:\n" + "\n".join(lines)
+            for days, lines in zip(self.total_days.tolist(), self.detail_lines)
+        ]
+        return pd.DataFrame(
+            {'总天数': self.total_days, '含事病假': self.has_unpaid_leave, '备注': notes},
+            index=pd.Index(list(self.positions), name='员工', dtype=object)
+        )
+
+def add_leave_days(leave_data):
+    """根据时长列计算每条休假记录的天数，返回时长无法解析的记录掩码"""
+    leave_data['休假天数'], invalid = parse_duration_column(leave_data['时长'], unit='days')
+    return invalid
+
+# 声明的时长与起止时间内的工作日天数相差超过该值时提示
+LEAVE_DAYS_TOLERANCE = 0.01
+
+def parse_leave_intervals(leave_data, date_formats=None):
+    """
+    解析每条休假记录的起止日期和上午、下午标记，并计算起止时间内的工作日天数（见 leave_calendar.py）
+    返回以记录索引为索引的 DataFrame：开始日期、结束日期、开始半天、结束半天、工作日天数（无法计算时为 NaN）
+    date_formats 为列表时追加各列推断出的日期格式（见 parse_date_column）
+    """
+    intervals = pd.DataFrame(index=leave_data.index)
+    for label, column in (('开始', '开始时间'), ('结束', '结束时间')):
+        if column in leave_data.columns:
+            intervals[f'{label}日期'] = parse_date_column(leave_data[column], date_formats).to_numpy()
+            intervals[f'{label}半天'] = half_day_marks(leave_data[column])
+        else:
+            intervals[f'{label}日期'] = pd.Series(pd.NaT, index=leave_data.index, dtype='datetime64[ns]')
+            intervals[f'{label}半天'] = np.int8(FULL_DAY)
+    intervals['工作日天数'] = leave_workdays(
+        intervals['开始日期'], intervals['结束日期'], intervals['开始半天'].to_numpy(), intervals['结束半天'].to_numpy()
+    )
+    return intervals
+
+def report_duration_mismatches(diagnostics, leave_data, intervals, invalid_durations):
+    """提示声明的时长与起止时间内的工作日天数不符的记录，时长为空或无法解析的记录不比较"""
+    declared = leave_data['休假天数'].to_numpy(dtype=float)
+    workdays = intervals['工作日天数'].to_numpy()
+    has_duration = text_column(leave_data, '时长').str.strip().to_numpy() != ''
+    mismatched = (
+        has_duration & ~invalid_durations.to_numpy(dtype=bool) & ~np.isnan(workdays)
+        & (np.abs(declared - workdays) > LEAVE_DAYS_TOLERANCE)
+    )
+    records = leave_data[mismatched]
+    record_issues(
+        diagnostics, 'info', '时长与起止时间不符', records['创建人'].tolist(),
+        [
+            f"员工{name}的休假时长'{duration}'与起止时间（{start} 至 {end}）内的 {days:g} 个工作日不符"
+            for name, duration, start, end, days in zip(
+                records['创建人'], records['时长'], text_column(records, '开始时间'), text_column(records, '结束时间'),
+                workdays[mismatched].tolist()
+            )
+        ]
+    )
+
+def payroll_month_days(leave_data, intervals, payroll_month):
+    """
+    按工资月份（'YYYY-MM'）计算每条休假记录计入该月的天数
+    起止时间有效的记录按拆分到该月的工作日天数计算，没有日期落在该月的记录不计入；
+    起止时间无法计算的记录仍按时长计算，开始（没有时为结束）日期不在该月时不计入
+    返回 (计入该月的记录掩码, 计入该月的天数)
+    """
+    month = np.datetime64(payroll_month, 'M')
+    segments = split_by_month(
+        intervals['开始日期'], intervals['结束日期'], intervals['开始半天'].to_numpy(), intervals['结束半天'].to_numpy()
+    )
+    segments = segments[segments['月份'].to_numpy() == month]
+    
+    days = leave_data['休假天数'].to_numpy(dtype=float).copy()
+    computed = ~np.isnan(intervals['工作日天数'].to_numpy())
+    in_month = np.zeros(len(leave_data), dtype=bool)
+    in_month[segments['记录'].to_numpy()] = True
+    days[computed] = 0.0
+    days[segments['记录'].to_numpy()] = segments['天数'].to_numpy()
+    
+    anchor = intervals['开始日期'].fillna(intervals['结束日期']).to_numpy().astype('datetime64[M]')
+    counted = np.where(computed, in_month, np.isnat(anchor) | (anchor == month))
+    return counted, days
+
+def select_payroll_month(leave_data, intervals, payroll_month):
+    """只保留计入工资月份的休假记录，休假天数改为计入该月的天数，与时长不同时记录在'本月天数'列中"""
+    counted, days = payroll_month_days(leave_data, intervals, payroll_month)
+    if not counted.all():
+        notify('info', f"有 {int((~counted).sum())} 条休假记录不在 {payroll_month}，未计入本月工资表")
+    
+    selected = leave_data[counted].copy()
+    month_days = days[counted]
+    changed = np.abs(month_days - selected['休假天数'].to_numpy(dtype=float)) > LEAVE_DAYS_TOLERANCE
+    selected['休假天数'] = month_days
+    selected['本月天数'] = np.where(changed, [f"{value:g}天" for value in month_days.tolist()], '').astype(object)
+    return selected
+
+def report_invalid_durations(diagnostics, records, invalid, kind):
+    """提示时长无法解析（已按0计算）的记录"""
+    invalid_records = records[invalid.to_numpy()]
+    record_issues(
+        diagnostics, 'warning', '时长无法解析', invalid_records['创建人'].tolist(),
+        [f"员工{name}的{kind}时长'{duration}'无法解析，已按0计算" for name, duration in zip(invalid_records['创建人'], invalid_records['时长'])]
+    )
+
+def summary_rows(result_df, summary):
+    """
+    汇总结果以工资表中的行位置为索引，返回 (有汇总结果的行掩码, 按行顺序排列的汇总结果)
+    """
+    matched = np.zeros(len(result_df), dtype=bool)
+    matched[summary.index.to_numpy(dtype=np.int64)] = True
+    return matched, summary.sort_index()
+
+def apply_leave_summary(result_df, leave_summary):
+    """将按工资表行位置汇总的休假结果整体回填到工资表"""
+    matched, employee_summary = summary_rows(result_df, leave_summary)
+    
+    if matched.any():
+        has_unpaid_leave = employee_summary['含事病假'].to_numpy()
+        
+        # 根据休假类型更新考勤情况
+        if '考勤情况' in result_df.columns:
+            result_df['考勤情况'] = result_df['考勤情况'].astype(object)
+            result_df.loc[matched, '考勤情况'] = np.where(has_unpaid_leave, '非全勤', '全勤')
+        if '全勤' in result_df.columns:
+            unpaid_rows = matched.copy()
+            unpaid_rows[matched] = has_unpaid_leave
+            result_df.loc[unpaid_rows, '全勤'] = 0
+        
+        # 在备注列中记录详细的休假信息，每条记录分行显示
+        append_notes(result_df, matched, employee_summary['备注'].tolist())
+    
+    return result_df
+
+def process_leave_data(result_df, leave_data, diagnostics=None, employee_index=None, progress=None, leave_intervals=None, payroll_month=None):
+    """
+    处理休假数据并更新到工资表现有列中
+    diagnostics 为 DiagnosticsCollector 时，时长无法解析等逐条信息记录到收集器中
+    employee_index 为由工资表建立的 EmployeeIndex，未传入时按 result_df 建立
+    progress 为 JobProgress 时报告已处理的员工数
+    leave_intervals 为预先解析的起止时间（见 parse_leave_intervals），未传入时按 leave_data 解析
+    payroll_month 为工资月份（'YYYY-MM'）时按起止时间只计入该月的工作日天数，否则按时长列计算
+    """
+    if leave_data is not None:
+        # 检查必要的列是否存在
+        required_leave_columns = ['创建人', '请假类型', '时长']
+        missing_columns = [col for col in required_leave_columns if col not in leave_data.columns]
+        
+        if missing_columns:
+            notify('error', f"休假数据文件缺少必要的列: {', '.join(missing_columns)}")
+            notify('error', f"当前文件包含的列: {', '.join(leave_data.columns.tolist())}")
+            notify('error', "请确保休假数据文件包含以下列：创建人、请假类型、时长")
+            return result_df
+        
+        # 不再过滤审批结果，处理所有休假数据
+        notify('info', f"将处理所有 {len(leave_data)} 条休假记录（不考虑审批状态）")
+        
+        # 处理时长数据，统一转换为天数
+        invalid_durations = add_leave_days(leave_data)
+        report_invalid_durations(diagnostics, leave_data, invalid_durations, '休假')
+        
+        # 按起止时间计算工作日天数，与声明的时长核对；指定工资月份时只计入该月的天数
+        if leave_intervals is None:
+            leave_intervals = parse_leave_intervals(leave_data)
+        else:
+            leave_intervals = leave_intervals.loc[leave_data.index]
+        report_duration_mismatches(diagnostics, leave_data, leave_intervals, invalid_durations)
+        if payroll_month is not None:
+            leave_data = select_payroll_month(leave_data, leave_intervals, payroll_month)
+        
+        # 一次性将所有记录对应到工资表中的员工，没有对应上的按创建人汇总提示
+        if employee_index is None:
+            employee_index = EmployeeIndex(result_df)
+        positions = employee_index.resolve(leave_data)
+        report_unresolved_employees(diagnostics, employee_index.unresolved_summary(leave_data, positions), '休假')
+        
+        # 按员工分块汇总所有休假记录（与一次汇总的结果相同），再按员工整体回填到工资表
+        matched_records = positions >= 0
+        matched_data = leave_data[matched_records]
+        matched_positions = pd.Series(positions[matched_records], index=matched_data.index)
+        employee_count = matched_positions.nunique()
+        aggregator = LeaveAggregator()
+        for rows, employees_done in employee_chunks(matched_positions.to_numpy()):
+            aggregator.add(matched_data.iloc[rows], matched_positions.iloc[rows])
+            report_progress(progress, '休假合并', employees_done, employee_count, '名员工')
+        result_df = apply_leave_summary(result_df, aggregator.summary())
+        
+        # 统计有休假记录的员工数量
+        employees_with_leave = len(aggregator.positions)
+        notify('success', f"已处理 {employees_with_leave} 名员工的休假数据，更新到现有列中")
+    
+    return result_df
+
+@lru_cache(maxsize=CLOCK_FORMAT_CACHE_SIZE)
+def format_clock_value(value):
+    """提取单个时间值的时分（HH:MM），无法解析的为空字符串，结果会被缓存，分块处理时相同的值只解析一次"""
+    try:
+        return pd.to_datetime(value).strftime('%H:%M')
+    except Exception:
+        return ''
+
+def format_clock_column(values):
+    """整列提取时分（HH:MM），无法解析的为空字符串"""
+    values = object_values(values)
+    clock_values = {value: format_clock_value(value) for value in values.dropna().unique()}
+    return values.map(clock_values).fillna('').astype(object)
+
+def classify_day_types(dates):
+    """整列判断日期类型，无法解析的日期按工作日处理"""
+    return pd.Series(get_holiday_calendar().classify(dates), index=dates.index, dtype=object)
+
+def parse_overtime_dates(overtime_data, date_formats=None):
+    """
+    从多个可能的日期列中获取加班日期，前一列无法解析时再尝试后一列
+    返回与加班数据同索引的DataFrame，列为 加班日期、原始日期
+    date_formats 为列表时追加各列推断出的日期格式（见 parse_date_column）
+    """
+    index = overtime_data.index
+    overtime_dates = pd.Series(pd.NaT, index=index, dtype='datetime64[ns]')
+    original_dates = pd.Series(None, index=index, dtype=object)
+    for col in OVERTIME_DATE_COLUMNS:
+        if col not in overtime_data.columns:
+            continue
+        values = overtime_data[col]
+        pending = overtime_dates.isna() & values.notna()
+        if not pending.any():
+            continue
+        original_dates[pending] = values[pending]
+        overtime_dates[pending] = parse_date_column(values[pending], date_formats)
+    return pd.DataFrame({'加班日期': overtime_dates, '原始日期': original_dates}, index=index)
+
+def classify_overtime_records(overtime_data, overtime_dates=None):
+    """
+    逐列处理加班记录：解析加班日期、判断日期类型、提取加班原因并生成明细
+    overtime_dates 为预先解析的日期（见 parse_overtime_dates），可以来自包含这些记录的整个加班表，
+    因为日期格式按整列抽样推断，只处理部分记录时传入整表的解析结果才能与处理整表时一致
+    返回与加班数据同索引的DataFrame
+    """
+    index = overtime_data.index
+    
+    if overtime_dates is None:
+        overtime_dates = parse_overtime_dates(overtime_data)
+    overtime_dates = overtime_dates.loc[index]
+    original_dates = overtime_dates['原始日期']
+    overtime_dates = overtime_dates['加班日期']
+    
+    day_types = classify_day_types(overtime_dates)
+    
+    # 尝试获取工作内容/加班原因
+    work_content = pd.Series('', index=index, dtype=object)
+    content_source = pd.Series(None, index=index, dtype=object)
+    for col in OVERTIME_CONTENT_COLUMNS:
+        if col not in overtime_data.columns:
+            continue
+        values = text_column(overtime_data, col).str.strip()
+        found = (work_content == '') & (values != '')
+        work_content[found] = values[found]
+        content_source[found] = col
+    
+    # 构建时间段字符串
+    start_time = format_clock_column(overtime_data['开始时间']) if '开始时间' in overtime_data.columns else pd.Series('', index=index, dtype=object)
+    end_time = format_clock_column(overtime_data['结束时间']) if '结束时间' in overtime_data.columns else pd.Series('', index=index, dtype=object)
+    has_start = start_time != ''
+    time_range = pd.Series(np.select(
+        [has_start & (end_time != ''), has_start],
+        [start_time + '-' + end_time, start_time + '开始'],
+        ''
+    ), index=index, dtype=object)
+    
+    # 组装最终格式：月日时间段(时长)工作内容
+    hours_text = overtime_data['加班时间'].astype(str)
+    month_day = (
+        overtime_dates.dt.month.astype('Int64').astype(str) + '月'
+        + overtime_dates.dt.day.astype('Int64').astype(str) + '日'
+    )
+    dated_detail = month_day + time_range + '(' + hours_text + '小时)'
+    dated_detail = dated_detail.where(work_content == '', dated_detail + ' ' + work_content)
+    undated_detail = '日期未知(' + hours_text + '小时)'
+    undated_detail = undated_detail.where(original_dates.isna(), undated_detail + ' [原始值: ' + original_dates.astype(str) + ']')
+    details = dated_detail.where(overtime_dates.notna(), undated_detail)
+    
+    return pd.DataFrame({
+        '加班日期': overtime_dates,
+        '日期类型': day_types,
+        '原始日期': original_dates,
+        '工作内容': work_content,
+        '内容来源列': content_source,
+        '明细': details.astype(object),
+    }, index=index)
+
+# 加班时间列及对应的日期类型
+OVERTIME_HOUR_COLUMNS = {
+    '平日累计时间': '工作日',
+    '双休日累计时间': '休息日',
+    '法定节日累计时间': '法定节假日',
+}
+
+class OvertimeAggregator:
+    """
+    按员工累计加班记录，记录可以分批加入
+    员工默认为创建人，也可以传入工资表中的行位置等其他标识
+    汇总结果包含平日、双休日、法定节日的累计时间以及备注文本
+    """
+    
+    def __init__(self):
+        self.positions = {}
+        self.category_hours = {column: np.zeros(0, dtype=float) for column in OVERTIME_HOUR_COLUMNS}
+        self.detail_lines = []
+        self.detail_bytes = 0
+        self.record_count = 0
+        self.date_parsed_count = 0
+        self.years = set()
+    
+    def add(self, overtime_data, employees=None, overtime_dates=None):
+        """
+        加入一批加班记录，记录需已包含'加班时间'列，employees 为每条记录对应的员工标识
+        overtime_dates 为预先解析的日期（见 classify_overtime_records）
+        返回这批记录的分类结果（见 classify_overtime_records）
+        """
+        # 整列解析日期、判断日期类型并生成每条记录的明细
+        overtime_records = classify_overtime_records(overtime_data, overtime_dates)
+        
+        codes = encode_employees(self.positions, overtime_data['创建人'] if employees is None else employees)
+        self.detail_lines.extend([] for _ in range(len(self.positions) - len(self.detail_lines)))
+        
+        # 按员工累计不同类型的加班时间，无法解析日期的记录默认为平日加班
+        day_types = overtime_records['日期类型'].to_numpy()
+        hours = overtime_data['加班时间'].to_numpy(dtype=float)
+        for column, day_type in OVERTIME_HOUR_COLUMNS.items():
+            totals = grow_array(self.category_hours[column], len(self.positions))
+            np.add.at(totals, codes, np.where(day_types == day_type, hours, 0.0))
+            self.category_hours[column] = totals
+        
+        chunk_lines = (' • ' + overtime_records['明细']).groupby(codes, sort=False).agg('\n'.join)
+        for code, lines in chunk_lines.items():
+            self.detail_lines[code].append(lines)
+            self.detail_bytes += sys.getsizeof(lines)
+        
+        # 日期解析情况与分类在同一次解析中统计
+        parsed_dates = overtime_records['加班日期'].dropna()
+        self.record_count += len(overtime_data)
+        self.date_parsed_count += len(parsed_dates)
+        self.years.update(parsed_dates.dt.year.unique().tolist())
+        return overtime_records
+    
+    def summary(self):
+        """返回以员工标识为索引的汇总结果"""
+        overtime_notes = []
+        for position in range(len(self.positions)):
+            weekday_hours = self.category_hours['平日累计时间'][position]
+            weekend_hours = self.category_hours['双休日累计时间'][position]
+            holiday_hours = self.category_hours['法定节日累计时间'][position]
+            total_hours = weekday_hours + weekend_hours + holiday_hours
+            overtime_summary = []
+            if weekday_hours > 0:
+                overtime_summary.append(f"平日{weekday_hours}小时")
+            if weekend_hours > 0:
+                overtime_summary.append(f"双休日{weekend_hours}小时")
+            if holiday_hours > 0:
+                overtime_summary.append(f"法定节假日{holiday_hours}小时")
+            
+            summary_text = "、".join(overtime_summary)
+            overtime_notes.append(f"加班共{total_hours}小时({summary_text}): \n" + "\n".join(self.detail_lines[position]))
+        
+        summary = pd.DataFrame(self.category_hours, index=pd.Index(list(self.positions), name='员工', dtype=object))
+        summary['备注'] = overtime_notes
+        return summary
+    
+    def memory_usage(self):
+        """估算累计结果占用的内存字节数"""
+        return sum(hours.nbytes for hours in self.category_hours.values()) + self.detail_bytes
+    
+    def uncovered_years(self):
+        """返回加班日期中缺少节假日数据的年份"""
+        return sorted(year for year in self.years if not get_holiday_calendar().covers(year))
+
+def report_unresolved_employees(diagnostics, unresolved, kind):
+    """按创建人提示没有计入工资表的记录，unresolved 为 EmployeeIndex.unresolved_summary 的结果"""
+    for reason, records in unresolved.groupby('原因', sort=False):
+        if reason == '同名员工无法区分':
+            explanation = "工资表中有同名员工，且记录中没有可区分的工号"
+        else:
+            explanation = "工资表中找不到该员工"
+        record_issues(
+            diagnostics, 'warning', reason, records['创建人'].tolist(),
+            [f"创建人'{name}'的 {count} 条{kind}记录未计入工资表：{explanation}" for name, count in zip(records['创建人'], records['记录数'])]
+        )
+
+def add_overtime_hours(overtime_data):
+    """根据时长列计算每条加班记录的小时数，返回时长无法解析的记录掩码"""
+    overtime_data['加班时间'], invalid = parse_duration_column(overtime_data['时长'], unit='hours')
+    return invalid
+
+def apply_overtime_summary(result_df, overtime_summary):
+    """将按工资表行位置汇总的加班结果整体回填到工资表"""
+    matched, employee_summary = summary_rows(result_df, overtime_summary)
+    
+    if matched.any():
+        
+        # 更新不同类型的加班时间到对应列
+        for column in OVERTIME_HOUR_COLUMNS:
+            if column not in result_df.columns:
+                continue
+            employee_hours = pd.Series(0.0, index=result_df.index)
+            employee_hours[matched] = employee_summary[column].to_numpy()
+            has_hours = employee_hours > 0
+            current_hours = result_df.loc[has_hours, column].fillna(0).astype(float)
+            result_df.loc[has_hours, column] = current_hours + employee_hours[has_hours]
+        
+        # 在备注列中记录详细的加班信息，每条记录分行显示
+        append_notes(result_df, matched, employee_summary['备注'].tolist())
+    
+    return result_df
+
+def process_overtime_data(result_df, overtime_data, diagnostics=None, employee_index=None, overtime_dates=None, progress=None):
+    """
+    处理加班数据并更新到工资表现有列中，根据日期类型填入不同列
+    diagnostics 为 DiagnosticsCollector 时，逐条记录的加班原因、日期解析等信息记录到收集器中，不再逐条显示
+    employee_index 为由工资表建立的 EmployeeIndex，未传入时按 result_df 建立
+    overtime_dates 为预先解析的日期（见 classify_overtime_records），未传入时按对应上员工的记录解析
+    progress 为 JobProgress 时报告已处理的员工数
+    """
+    if overtime_data is not None:
+        # 添加调试信息：显示工资表模板的列名
+        record_issue(diagnostics, 'info', '调试信息', f"工资表模板包含的列: {', '.join(result_df.columns.tolist())}")
+        
+        # 添加调试信息：显示加班数据的列名和前几行数据
+        record_issue(diagnostics, 'info', '调试信息', f"加班数据包含的列: {', '.join(overtime_data.columns.tolist())}")
+        if diagnostics is not None:
+            diagnostics.add('info', '调试信息', f"加班数据前3行内容:\n{overtime_data.head(3).to_string()}")
+        elif in_streamlit():
+            import streamlit as st
+            
+            st.info(f"加班数据前3行内容:")
+            st.dataframe(overtime_data.head(3))
+        
+        # 检查加班时间相关列是否存在
+        missing_overtime_cols = [col for col in OVERTIME_HOUR_COLUMNS if col not in result_df.columns]
+        if missing_overtime_cols:
+            notify('warning', f"工资表模板缺少以下加班时间列: {', '.join(missing_overtime_cols)}")
+        
+        # 检查必要的列是否存在
+        required_overtime_columns = ['创建人', '时长']
+        missing_columns = [col for col in required_overtime_columns if col not in overtime_data.columns]
+        
+        if missing_columns:
+            notify('error', f"加班数据文件缺少必要的列: {', '.join(missing_columns)}")
+            notify('error', f"当前文件包含的列: {', '.join(overtime_data.columns.tolist())}")
+            notify('error', "请确保加班数据文件包含以下列：创建人、时长")
+            return result_df
+        
+        # 显示所有加班记录，不再过滤审批结果
+        notify('info', f"正在处理 {len(overtime_data)} 条加班记录")
+        
+        # 处理时长数据，统一转换为小时数
+        invalid_durations = add_overtime_hours(overtime_data)
+        report_invalid_durations(diagnostics, overtime_data, invalid_durations, '加班')
+        
+        # 一次性将所有记录对应到工资表中的员工，没有对应上的按创建人汇总提示
+        if employee_index is None:
+            employee_index = EmployeeIndex(result_df)
+        positions = employee_index.resolve(overtime_data)
+        report_unresolved_employees(diagnostics, employee_index.unresolved_summary(overtime_data, positions), '加班')
+        
+        # 按员工分块汇总所有对应上员工的加班记录，日期格式按整列推断，先整列解析日期，分块结果与一次汇总相同
+        matched_records = positions >= 0
+        matched_data = overtime_data[matched_records]
+        matched_positions = pd.Series(positions[matched_records], index=matched_data.index)
+        if overtime_dates is None:
+            overtime_dates = parse_overtime_dates(matched_data)
+        employee_count = matched_positions.nunique()
+        aggregator = OvertimeAggregator()
+        chunk_rows, chunk_records = [], []
+        for rows, employees_done in employee_chunks(matched_positions.to_numpy()):
+            chunk_rows.append(rows)
+            chunk_records.append(aggregator.add(matched_data.iloc[rows], matched_positions.iloc[rows], overtime_dates))
+            report_progress(progress, '加班合并', employees_done, employee_count, '名员工')
+        # 分类结果恢复为记录原有的顺序
+        overtime_records = pd.concat(chunk_records).iloc[np.argsort(np.concatenate(chunk_rows), kind='stable')]
+        
+        # 节假日数据未覆盖的年份只能按周末判断，需要提示
+        uncovered_years = aggregator.uncovered_years()
+        if uncovered_years:
+            notify('warning', f"缺少 {', '.join(map(str, uncovered_years))} 年的节假日数据，这些年份的加班仅按周末判断是否为休息日")
+        
+        # 添加调试信息：显示加班原因获取情况
+        available_content_cols = [col for col in OVERTIME_CONTENT_COLUMNS if col in matched_data.columns]
+        dated_records = overtime_records['加班日期'].notna().to_numpy()
+        has_content = (overtime_records['工作内容'] != '').to_numpy()
+        found_positions = np.flatnonzero(dated_records & has_content)
+        record_issues(
+            diagnostics, 'info', '找到加班原因', matched_data['创建人'].iloc[found_positions].tolist(),
+            [
+                f"员工{employee_name}的加班原因: '{work_content}' (来源列: {source_column})"
+                for employee_name, work_content, source_column in zip(
+                    matched_data['创建人'].iloc[found_positions],
+                    overtime_records['工作内容'].iloc[found_positions],
+                    overtime_records['内容来源列'].iloc[found_positions]
+                )
+            ]
+        )
+        missing_positions = np.flatnonzero(dated_records & ~has_content)
+        record_issues(
+            diagnostics, 'warning', '未找到加班原因', matched_data['创建人'].iloc[missing_positions].tolist(),
+            [
+                f"员工{matched_data['创建人'].iat[position]}未找到加班原因，可用列: {available_content_cols}，值: {[str(matched_data[col].iat[position]) for col in available_content_cols]}"
+                for position in missing_positions
+            ]
+        )
+        
+        # 如果有日期解析失败的情况，显示警告
+        failed_records = overtime_records['加班日期'].isna().to_numpy() & overtime_records['原始日期'].notna().to_numpy()
+        failed_positions = np.flatnonzero(failed_records)
+        record_issues(
+            diagnostics, 'warning', '日期无法解析', matched_data['创建人'].iloc[failed_positions].tolist(),
+            [
+                f"员工{employee_name}: 无法解析日期'{original_date}'"
+                for employee_name, original_date in zip(
+                    matched_data['创建人'].iloc[failed_positions],
+                    overtime_records['原始日期'].iloc[failed_positions]
+                )
+            ]
+        )
+        
+        # 按员工整体回填加班时间和备注
+        result_df = apply_overtime_summary(result_df, aggregator.summary())
+        
+        # 统计有加班记录的员工数量和日期解析情况
+        employees_with_overtime = len(aggregator.positions)
+        
+        notify('success', f"已处理 {employees_with_overtime} 名员工的加班数据，按日期类型分类填入对应列")
+        if aggregator.date_parsed_count < aggregator.record_count:
+            notify('warning', f"有 {aggregator.record_count - aggregator.date_parsed_count} 条记录无法解析日期，已按平日加班处理")
+    
+    return result_df
+
+def merge_to_salary_sheet(salary_df, leave_df=None, overtime_df=None, profiler=None, diagnostics=None, overtime_dates=None, progress=None,
+                          leave_intervals=None, payroll_month=None):
+    """
+    将休假和加班数据更新到工资表现有列中，保持原始格式不变
+    profiler 为 PipelineProfiler 时分别记录休假合并和加班合并两个阶段
+    diagnostics 为 DiagnosticsCollector 时收集逐条记录的处理信息
+    overtime_dates 为预先解析的加班日期（见 classify_overtime_records）
+    progress 为 JobProgress 时报告各阶段已处理的员工数
+    leave_intervals 为预先解析的休假起止时间（见 parse_leave_intervals）
+    payroll_month 为工资月份（'YYYY-MM'）时休假只计入该月的工作日天数（见 process_leave_data）
+    """
+    result_df = salary_df.copy()
+    
+    # 员工索引只建立一次，休假和加班记录共用
+    employee_index = EmployeeIndex(result_df)
+    
+    # 处理休假数据
+    if leave_df is not None and not leave_df.empty:
+        notify('info', "正在处理休假数据...")
+        with profile_stage(profiler, '休假合并', len(leave_df)):
+            result_df = process_leave_data(result_df, leave_df, diagnostics, employee_index, progress, leave_intervals, payroll_month)
+    
+    # 处理加班数据
+    if overtime_df is not None and not overtime_df.empty:
+        notify('info', "正在处理加班数据...")
+        with profile_stage(profiler, '加班合并', len(overtime_df)):
+            result_df = process_overtime_data(result_df, overtime_df, diagnostics, employee_index, overtime_dates, progress)
+    
+    return result_df
+
+# 写入工资表时每批处理的行数
+WRITE_BATCH_ROWS = 1000
+
+# 员工数达到该行数时改为按模板样式流式写出（见 streaming_writer.py），可以用环境变量修改
+STREAMING_WRITE_ROWS = int(os.environ.get('SALARY_STREAMING_WRITE_ROWS', 5000))
+
+# 工资表模板第5行是标题行，数据从第6行开始
+SHEET_HEADER_ROW = 5
+SHEET_START_ROW = 6
+
+@lru_cache(maxsize=1)
+def formula_types():
+    """openpyxl 中数组公式、模拟运算表公式的类型，保存工资表时才导入 openpyxl"""
+    from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+    
+    return ArrayFormula, DataTableFormula
+
+def is_formula_value(value):
+    """判断单元格的值是否为公式"""
+    return (isinstance(value, str) and value.startswith('=')) or isinstance(value, formula_types())
+
+def build_formula_mask(ws, min_row, max_row, columns):
+    """预先计算数据区域内哪些单元格是公式，返回 (行数, 列数) 的布尔数组"""
+    mask = np.zeros((max_row - min_row + 1, len(columns)), dtype=bool)
+    for col_pos, col_idx in enumerate(columns):
+        column_values = next(ws.iter_cols(
+            min_col=col_idx, max_col=col_idx, min_row=min_row, max_row=max_row, values_only=True
+        ))
+        mask[:, col_pos] = [is_formula_value(value) for value in column_values]
+    return mask
+
+def prepare_cell_values(result_df, columns):
+    """
+    整列转换待写入的值，空值、'nan'和空白字符串写为空单元格
+    返回 (行数, 列数) 的对象数组
+    """
+    values = []
+    for col_name in columns:
+        column = result_df[col_name].astype(object)
+        is_blank = column.isna() | column.map(lambda value: isinstance(value, str) and (value == 'nan' or value.strip() == ''))
+        values.append(column.where(~is_blank, None).to_numpy(dtype=object))
+    return np.column_stack(values) if values else np.empty((len(result_df), 0), dtype=object)
+
+def sheet_layout(ws):
+    """模板标题行的列布局，返回 {列名: 列号}"""
+    col_mapping = {}
+    for col_idx, cell in enumerate(ws[SHEET_HEADER_ROW], 1):
+        if cell.value:
+            col_mapping[str(cell.value).strip()] = col_idx
+    return col_mapping
+
+def sheet_data_columns(ws, result_df):
+    """按标题行找出工资表和模板都有的列，返回 (列名列表, 对应的模板列号列表)"""
+    col_mapping = sheet_layout(ws)
+    data_columns = [col_name for col_name in result_df.columns if col_name in col_mapping]
+    return data_columns, [col_mapping[col_name] for col_name in data_columns]
+
+def save_salary_sheet_with_format(result_df, template_path, progress=None):
+    """
+    保存工资表，完整保留模板格式、标题行和公式
+    员工数达到 STREAMING_WRITE_ROWS 时按模板样式流式写出，模板不支持流式写出时仍按原方式保存
+    progress 为 JobProgress 时每写完一批报告已写入的单元格数
+    """
+    from openpyxl import load_workbook
+    
+    try:
+        if len(result_df) >= STREAMING_WRITE_ROWS:
+            from streaming_writer import save_salary_sheet_streaming
+            
+            excel_data = save_salary_sheet_streaming(result_df, template_path, progress)
+            if excel_data is not None:
+                return excel_data
+        
+        # 加载原始模板工作簿
+        wb = load_workbook(template_path)
+        ws = wb.active
+        
+        # 数据从第6行开始（第5行是标题行）
+        start_row = SHEET_START_ROW
+        
+        # 只处理工资表和模板都有的列
+        data_columns, excel_columns = sheet_data_columns(ws, result_df)
+        if not excel_columns:
+            output = io.BytesIO()
+            wb.save(output)
+            return output.getvalue()
+        
+        # 需要清除或填入的行范围：原有数据行和新数据行
+        end_row = max(ws.max_row, start_row + len(result_df) - 1)
+        min_col, max_col = min(excel_columns), max(excel_columns)
+        col_offsets = [col_idx - min_col for col_idx in excel_columns]
+        
+        # 预先计算公式单元格，保护现有公式
+        formula_mask = build_formula_mask(ws, start_row, end_row, excel_columns)
+        cell_values = prepare_cell_values(result_df, data_columns)
+        empty_row = [None] * len(excel_columns)
+        total_cells = (end_row - start_row + 1) * len(excel_columns)
+        
+        # 按批次逐行填入新数据，超出数据行数的旧数据行清空（保留格式和公式）
+        for batch_start in range(start_row, end_row + 1, WRITE_BATCH_ROWS):
+            batch_end = min(batch_start + WRITE_BATCH_ROWS - 1, end_row)
+            rows = ws.iter_rows(min_row=batch_start, max_row=batch_end, min_col=min_col, max_col=max_col)
+            for row_offset, row_cells in enumerate(rows, batch_start - start_row):
+                row_values = cell_values[row_offset] if row_offset < len(cell_values) else empty_row
+                row_is_formula = formula_mask[row_offset]
+                for col_pos, col_offset in enumerate(col_offsets):
+                    if not row_is_formula[col_pos]:
+                        row_cells[col_offset].value = row_values[col_pos]
+            report_progress(progress, '保存工资表', (batch_end - start_row + 1) * len(excel_columns), total_cells, '个单元格')
+        
+        # 保存到内存
+        output = io.BytesIO()
+        wb.save(output)
+        output.seek(0)
+        
+        return output.getvalue()
+        
+    except JobCancelled:
+        raise
+    except Exception as e:
+        notify('error', f"保存工资表时出错: {str(e)}")
+        return None
+
+def patch_salary_sheet(excel_data, result_df, positions, progress=None):
+    """
+    在已保存的工资表文件中只改写 positions（result_df 中的行位置）对应的行，其余单元格保持不变
+    与 save_salary_sheet_with_format 相同，公式单元格不会被覆盖
+    progress 为 JobProgress 时报告已写入的单元格数
+    """
+    from openpyxl import load_workbook
+    
+    try:
+        wb = load_workbook(io.BytesIO(excel_data))
+        ws = wb.active
+        
+        data_columns, excel_columns = sheet_data_columns(ws, result_df)
+        cell_values = prepare_cell_values(result_df.iloc[positions], data_columns)
+        total_cells = len(positions) * len(excel_columns)
+        for row_count, (position, row_values) in enumerate(zip(positions, cell_values), 1):
+            row = SHEET_START_ROW + int(position)
+            for col_idx, value in zip(excel_columns, row_values):
+                cell = ws.cell(row=row, column=col_idx)
+                if not is_formula_value(cell.value):
+                    cell.value = value
+            report_progress(progress, '保存工资表', row_count * len(excel_columns), total_cells, '个单元格')
+        
+        output = io.BytesIO()
+        wb.save(output)
+        return output.getvalue()
+        
+    except JobCancelled:
+        raise
+    except Exception as e:
+        notify('error', f"更新工资表时出错: {str(e)}")
+        return None
+
+def merge_column(previous, recomputed, positions):
+    """将重新计算的行换入上一次结果的一列，其余行保持不变"""
+    values = previous.to_numpy(dtype=object).copy()
+    values[positions] = recomputed.to_numpy(dtype=object)[positions]
+    return pd.Series(values, index=previous.index, dtype=object).infer_objects()
+
+def merge_incrementally(previous_state, salary_df, template_path, leave_df=None, overtime_df=None, profiler=None, diagnostics=None, progress=None,
+                        payroll_month=None):
+    """
+    增量生成工资表，previous_state 为上一次生成返回的 MergeState（没有时为 None）
+    只重新计算记录有变化的员工，并只改写上一次保存的工资表文件中这些员工的行；
+    模板、工资月份、记录包含的列或整列推断出的日期格式有变化时完整生成。结果与完整生成相同，但逐条记录的处理信息只包含重新计算的记录
+    progress 为 JobProgress 时报告已处理的员工数和已写入的单元格数
+    payroll_month 为工资月份（见 process_leave_data）
+    返回 (工资表DataFrame, 工资表文件内容, 本次的 MergeState, 重新计算的员工数；完整生成时为 None)
+    """
+    with open(template_path, 'rb') as f:
+        template_digest = file_digest(f.read())
+    employee_index = EmployeeIndex(salary_df)
+    leave = RecordSignatures(leave_df, LEAVE_COLUMNS, employee_index)
+    overtime = RecordSignatures(overtime_df, OVERTIME_COLUMNS, employee_index)
+    
+    # 日期格式按整列推断，先按完整生成时的范围解析日期（整个休假表、对应上员工的加班记录），
+    # 沿用的行是按上一次推断出的格式解析的，格式不同时需要完整生成
+    leave_formats, overtime_formats = [], []
+    leave_intervals = overtime_dates = None
+    if leave_df is not None and not leave_df.empty:
+        leave_intervals = parse_leave_intervals(leave_df, leave_formats)
+    if overtime_df is not None and not overtime_df.empty and overtime.positions is not None:
+        overtime_dates = parse_overtime_dates(overtime_df[overtime.positions >= 0], overtime_formats)
+    
+    state = MergeState(template_digest, leave, overtime, payroll_month, (tuple(leave_formats), tuple(overtime_formats)))
+    changed = state.changed_positions(previous_state)
+    
+    if changed is None:
+        result_df = merge_to_salary_sheet(
+            salary_df, leave_df, overtime_df, profiler, diagnostics, overtime_dates, progress, leave_intervals, payroll_month
+        )
+        with profile_stage(profiler, '保存工资表', len(result_df)):
+            excel_data = save_salary_sheet_with_format(result_df, template_path, progress)
+        return result_df, excel_data, state.release(result_df, excel_data), None
+    
+    result_df = previous_state.result_df.copy()
+    excel_data = previous_state.excel_data
+    if len(changed):
+        notify('info', f"与上一次生成相比有 {len(changed)} 名员工的记录发生变化，只重新计算这些员工")
+        
+        # 在完整的模板上只合并变化员工的记录，姓名匹配结果与完整生成相同
+        recomputed = merge_to_salary_sheet(
+            salary_df,
+            None if leave_df is None else state.leave.select(leave_df, changed),
+            None if overtime_df is None else state.overtime.select(overtime_df, changed),
+            profiler,
+            diagnostics,
+            overtime_dates,
+            progress,
+            leave_intervals,
+            payroll_month
+        )
+        for column in result_df.columns:
+            result_df[column] = merge_column(result_df[column], recomputed[column], changed)
+        
+        with profile_stage(profiler, '保存工资表', len(changed)):
+            excel_data = patch_salary_sheet(excel_data, result_df, changed, progress)
+    else:
+        notify('info', "上传的记录与上一次生成时相同，直接使用上一次的结果")
+    
+    return result_df, excel_data, state.release(result_df, excel_data), len(changed)
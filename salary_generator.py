@@ -1,634 +1,419 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
-from datetime import datetime, date
 import os
-from openpyxl import load_workbook
-from copy import copy
-import calendar
+import json
+import tempfile
+from datetime import datetime
+from leave_calendar import split_by_month
+from pipeline_profiler import PipelineProfiler
+from diagnostics import DiagnosticsCollector
+from result_cache import cache_key, open_result_cache
+from background_job import BackgroundJob
+from staging import open_staging_area
+from split_workbooks import partition_keys, write_split_zip
+from template_snapshot import load_snapshot
+from salary_core import (
+    file_digest, load_salary_template, load_staged_leave_data, load_staged_overtime_data, load_staged_salary_template,
+    OVERTIME_HOUR_COLUMNS, merge_incrementally, notify, parse_leave_intervals, read_salary_template
+)
 
-def get_chinese_holidays_2024():
-    """获取2024年中国法定节假日列表"""
-    holidays = [
-        # 元旦
-        date(2024, 1, 1),
-        # 春节
-        date(2024, 2, 10), date(2024, 2, 11), date(2024, 2, 12), 
-        date(2024, 2, 13), date(2024, 2, 14), date(2024, 2, 15), date(2024, 2, 16), date(2024, 2, 17),
-        # 清明节
-        date(2024, 4, 4), date(2024, 4, 5), date(2024, 4, 6),
-        # 劳动节
-        date(2024, 5, 1), date(2024, 5, 2), date(2024, 5, 3), date(2024, 5, 4), date(2024, 5, 5),
-        # 端午节
-        date(2024, 6, 10),
-        # 中秋节
-        date(2024, 9, 15), date(2024, 9, 16), date(2024, 9, 17),
-        # 国庆节
-        date(2024, 10, 1), date(2024, 10, 2), date(2024, 10, 3), 
-        date(2024, 10, 4), date(2024, 10, 5), date(2024, 10, 6), date(2024, 10, 7)
-    ]
-    return holidays
+# 解析结果缓存的条目上限，超过后淘汰最早的条目
+PARSE_CACHE_MAX_ENTRIES = 16
 
-def get_chinese_holidays_2025():
-    """获取2025年中国法定节假日列表"""
-    holidays = [
-        # 元旦
-        date(2025, 1, 1),
-        # 春节
-        date(2025, 1, 28), date(2025, 1, 29), date(2025, 1, 30), 
-        date(2025, 1, 31), date(2025, 2, 1), date(2025, 2, 2), date(2025, 2, 3),
-        # 清明节
-        date(2025, 4, 5), date(2025, 4, 6), date(2025, 4, 7),
-        # 劳动节
-        date(2025, 5, 1), date(2025, 5, 2), date(2025, 5, 3), date(2025, 5, 4), date(2025, 5, 5),
-        # 端午节
-        date(2025, 5, 31), date(2025, 6, 1), date(2025, 6, 2),
-        # 中秋节
-        date(2025, 10, 6),
-        # 国庆节
-        date(2025, 10, 1), date(2025, 10, 2), date(2025, 10, 3), 
-        date(2025, 10, 4), date(2025, 10, 5), date(2025, 10, 7), date(2025, 10, 8)
-    ]
-    return holidays
+@st.cache_data(max_entries=PARSE_CACHE_MAX_ENTRIES, show_spinner=False)
+def read_cached_salary_template(template_path, modified_time):
+    """读取工资表模板，按文件路径和修改时间缓存，模板文件更新后自动重新读取；有模板快照时直接使用快照"""
+    snapshot = load_snapshot(template_path)
+    if snapshot is not None:
+        return snapshot.salary
+    with open(template_path, 'rb') as f:
+        return load_staged_salary_template(f.read())
 
-def is_holiday_or_weekend(date_obj):
-    """判断日期是否为法定节假日或周末"""
-    if not isinstance(date_obj, date):
-        return False, "工作日"
-    
-    # 获取对应年份的节假日
-    if date_obj.year == 2024:
-        holidays = get_chinese_holidays_2024()
-    elif date_obj.year == 2025:
-        holidays = get_chinese_holidays_2025()
-    else:
-        holidays = []
-    
-    # 判断是否为法定节假日
-    if date_obj in holidays:
-        return True, "法定节假日"
-    
-    # 判断是否为周末
-    if date_obj.weekday() >= 5:  # 5=周六, 6=周日
-        return True, "休息日"
+def read_current_salary_template(template_path):
+    return read_cached_salary_template(template_path, os.path.getmtime(template_path))
+
+def staged_preview(kind, uploaded_file):
+    """上传文件已暂存时返回其类型化预览列，否则返回 None"""
+    staging_area = open_staging_area()
+    if staging_area is None or uploaded_file is None:
+        return None
+    return staging_area.load_typed(kind, uploaded_file.getvalue())
+
+@st.cache_data(max_entries=PARSE_CACHE_MAX_ENTRIES, show_spinner=False)
+def parse_leave_file(digest, _file_bytes):
+    """解析休假表，按文件内容哈希缓存，进程重启后从暂存文件读取"""
+    return load_staged_leave_data(_file_bytes)
+
+@st.cache_data(max_entries=PARSE_CACHE_MAX_ENTRIES, show_spinner=False)
+def parse_overtime_file(digest, _file_bytes):
+    """解析加班表，按文件内容哈希缓存，进程重启后从暂存文件读取"""
+    return load_staged_overtime_data(_file_bytes)
+
+def load_cached_leave_data(uploaded_file):
+    """加载上传的休假表，内容相同的文件在多次重新运行之间只解析一次"""
+    if uploaded_file is None:
+        return None
+    file_bytes = uploaded_file.getvalue()
+    return parse_leave_file(file_digest(file_bytes), file_bytes)
+
+@st.cache_data(max_entries=PARSE_CACHE_MAX_ENTRIES, show_spinner=False)
+def parse_leave_months(digest, _file_bytes):
+    """休假表中请假跨越的月份（'YYYY-MM'），按时间先后排列，按文件内容哈希缓存"""
+    leave_data = parse_leave_file(digest, _file_bytes)
+    if leave_data is None:
+        return []
+    intervals = parse_leave_intervals(leave_data)
+    segments = split_by_month(
+        intervals['开始日期'], intervals['结束日期'], intervals['开始半天'].to_numpy(), intervals['结束半天'].to_numpy()
+    )
+    return [str(month) for month in np.unique(segments['月份'].to_numpy().astype('datetime64[M]'))]
+
+def load_leave_months(uploaded_file):
+    """上传的休假表中请假跨越的月份，用于选择工资月份"""
+    if uploaded_file is None:
+        return []
+    file_bytes = uploaded_file.getvalue()
+    return parse_leave_months(file_digest(file_bytes), file_bytes)
+
+def load_cached_overtime_data(uploaded_file):
+    """加载上传的加班表，内容相同的文件在多次重新运行之间只解析一次"""
+    if uploaded_file is None:
+        return None
+    file_bytes = uploaded_file.getvalue()
+    return parse_overtime_file(file_digest(file_bytes), file_bytes)
+
+def render_profiler_report(report):
+    """在可展开的面板中显示各阶段耗时、内存和热点函数，并提供JSON下载"""
+    with st.expander(f"🩺 性能诊断（总耗时 {report['total_seconds']:.2f} 秒）", expanded=False):
+        stages = pd.DataFrame(report['stages']).rename(columns={
+            'name': '阶段', 'seconds': '耗时(秒)', 'rows': '处理行数', 'peak_mb': '峰值内存(MB)'
+        })
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+        if not report['trace_memory']:
+            st.caption("未记录内存，可在侧边栏开启“记录各阶段峰值内存”后重新生成")
+        
+        if report['profile']:
+            st.markdown("**热点函数（按累计耗时排序）**")
+            profile = pd.DataFrame(report['profile']).rename(columns={
+                'function': '函数', 'location': '位置', 'calls': '调用次数',
+                'own_seconds': '自身耗时(秒)', 'cumulative_seconds': '累计耗时(秒)'
+            })
+            st.dataframe(profile, use_container_width=True, hide_index=True)
+        
+        st.download_button(
+            label="📥 下载诊断结果 (JSON)",
+            data=json.dumps(report, ensure_ascii=False, indent=2),
+            file_name=f"性能诊断_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
+
+DIAGNOSTICS_PAGE_SIZES = [50, 200, 1000]
+
+def render_diagnostics(diagnostics):
+    """将处理过程中收集的信息汇总为一个可筛选、分页的表格"""
+    if not len(diagnostics):
+        return
+    
+    events = diagnostics.to_frame()
+    warning_count = int((events['级别'] != '提示').sum())
+    with st.expander(f"🔎 处理详情（{len(events)} 条，其中警告/错误 {warning_count} 条）", expanded=False):
+        col_issue, col_employee = st.columns(2)
+        with col_issue:
+            st.markdown("**按问题类型统计**")
+            st.dataframe(diagnostics.counts_by_issue(), use_container_width=True, hide_index=True)
+        with col_employee:
+            st.markdown("**按员工统计**")
+            st.dataframe(diagnostics.counts_by_employee(), use_container_width=True, hide_index=True, height=250)
+        
+        # 筛选条件
+        col_level, col_type, col_name = st.columns(3)
+        with col_level:
+            levels = st.multiselect("级别", events['级别'].unique().tolist(), key="diagnostics_levels")
+        with col_type:
+            issues = st.multiselect("问题类型", events['问题类型'].unique().tolist(), key="diagnostics_issues")
+        with col_name:
+            employee = st.text_input("员工姓名", key="diagnostics_employee").strip()
+        
+        filtered = events
+        if levels:
+            filtered = filtered[filtered['级别'].isin(levels)]
+        if issues:
+            filtered = filtered[filtered['问题类型'].isin(issues)]
+        if employee:
+            filtered = filtered[filtered['员工'].fillna('').str.contains(employee, regex=False)]
+        
+        # 分页显示，只把当前页发送到页面
+        col_size, col_page = st.columns(2)
+        with col_size:
+            page_size = st.selectbox("每页条数", DIAGNOSTICS_PAGE_SIZES, key="diagnostics_page_size")
+        page_count = max(1, -(-len(filtered) // page_size))
+        with col_page:
+            page = st.number_input(f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, value=1, key="diagnostics_page")
+        page = min(page, page_count)
+        st.dataframe(
+            filtered.iloc[(page - 1) * page_size:page * page_size],
+            use_container_width=True, hide_index=True
+        )
+        st.caption(f"筛选后共 {len(filtered)} 条")
+
+# 工资表预览每页的员工数
+PREVIEW_PAGE_SIZES = [50, 200, 1000]
+
+# 工资表模板没有部门列，按模板中的岗位筛选
+PREVIEW_DEPARTMENT_COLUMN = '岗位'
+
+PREVIEW_OVERTIME_FILTERS = ['全部', '有加班', '无加班']
+
+def filter_salary_sheet(salary_df, departments, attendance, overtime):
+    """按岗位、考勤情况和是否有加班（PREVIEW_OVERTIME_FILTERS 之一）筛选工资表"""
+    filtered = salary_df
+    if departments:
+        filtered = filtered[filtered[PREVIEW_DEPARTMENT_COLUMN].isin(departments)]
+    if attendance:
+        filtered = filtered[filtered['考勤情况'].isin(attendance)]
+    if overtime != '全部':
+        hour_columns = [col for col in OVERTIME_HOUR_COLUMNS if col in filtered.columns]
+        hours = filtered[hour_columns].apply(pd.to_numeric, errors='coerce')
+        has_overtime = hours.gt(0).any(axis=1)
+        filtered = filtered[has_overtime if overtime == '有加班' else ~has_overtime]
+    return filtered
+
+def summarize_remarks(remarks):
+    """多行备注只保留第一行，完整备注在选中员工时再显示"""
+    lines = remarks.fillna('').astype(str).str.split('\n', n=1)
+    return lines.str[0] + np.where(lines.str.len() > 1, ' …', '')
+
+def render_salary_preview(salary_df):
+    """工资表分页预览：筛选和分页在服务端完成，只把当前页（备注只含第一行）发送到页面"""
+    col_department, col_attendance, col_overtime = st.columns(3)
+    with col_department:
+        departments = []
+        if PREVIEW_DEPARTMENT_COLUMN in salary_df.columns:
+            departments = st.multiselect(
+                "岗位", sorted(salary_df[PREVIEW_DEPARTMENT_COLUMN].dropna().astype(str).unique()), key="preview_departments"
+            )
+    with col_attendance:
+        attendance = []
+        if '考勤情况' in salary_df.columns:
+            attendance = st.multiselect(
+                "考勤情况", sorted(salary_df['考勤情况'].dropna().astype(str).unique()), key="preview_attendance"
+            )
+    with col_overtime:
+        overtime = st.selectbox("加班", PREVIEW_OVERTIME_FILTERS, key="preview_overtime")
+    
+    filtered = filter_salary_sheet(salary_df, departments, attendance, overtime)
+    
+    # 分页显示，只把当前页发送到页面
+    col_size, col_page = st.columns(2)
+    with col_size:
+        page_size = st.selectbox("每页人数", PREVIEW_PAGE_SIZES, key="preview_page_size")
+    page_count = max(1, -(-len(filtered) // page_size))
+    with col_page:
+        page = st.number_input(f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, value=1, key="preview_page")
+    page = min(page, page_count)
+    page_df = filtered.iloc[(page - 1) * page_size:page * page_size]
+    
+    display_df = page_df
+    if '备注' in page_df.columns:
+        display_df = page_df.assign(备注=summarize_remarks(page_df['备注']))
+    st.dataframe(display_df, use_container_width=True, hide_index=True, height=500)
+    st.caption(f"筛选后共 {len(filtered)} 名员工，共 {len(salary_df)} 名员工")
+    
+    # 完整备注只在选中员工时读取
+    if '备注' in page_df.columns and not page_df.empty:
+        names = page_df['姓名'] if '姓名' in page_df.columns else pd.Series(page_df.index.astype(str), index=page_df.index)
+        selected = st.selectbox(
+            "查看完整备注", [None] + page_df.index.tolist(),
+            format_func=lambda row: "（选择本页的员工）" if row is None else str(names[row]),
+            key="preview_remark"
+        )
+        if selected is not None:
+            remark = page_df.at[selected, '备注']
+            st.text(remark if isinstance(remark, str) and remark else "（无备注）")
+
+def render_generation_result(generation_result):
+    """显示生成结果：工资表预览、下载按钮、性能诊断和处理详情"""
+    # 显示最终工资表
+    st.markdown("### 📋 最终工资表预览")
+    if generation_result['from_cache']:
+        st.caption("模板和上传的文件与之前某次生成时完全相同，直接使用了缓存的工资表，未重新处理记录")
+    elif generation_result['changed_employees'] is not None:
+        st.caption(f"与上一次生成相比只重新计算了 {generation_result['changed_employees']} 名员工，处理详情只包含这些员工的记录")
+    
+    with st.expander("📊 查看完整工资表", expanded=True):
+        render_salary_preview(generation_result['salary_sheet'])
+    
+    # 下载按钮
+    st.markdown("### 📥 下载文件")
+    
+    col_download1, col_download2, col_download3 = st.columns([1, 2, 1])
+    with col_download2:
+        st.download_button(
+            label="📥 下载完整工资表",
+            data=generation_result['excel_data'],
+            file_name=generation_result['file_name'],
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
     
-    return False, "工作日"
+    render_split_download(generation_result)
+    render_profiler_report(generation_result['profile'])
+    render_diagnostics(generation_result['diagnostics'])
 
-def parse_date_from_string(date_str):
+def run_generation_job(progress, previous_state, salary_df, template_path, leave_data, overtime_data, profiler, diagnostics, result_cache, result_key,
+                       payroll_month=None):
     """
-    从字符串中解析日期
+    在 BackgroundJob 的工作线程中合并并保存工资表，不调用任何页面元素
+    返回工资表、文件内容、增量生成状态和重新计算的员工数
     """
-    if pd.isna(date_str) or date_str == '':
-        return None
-    
-    # 如果已经是 pandas.Timestamp 或 datetime 对象，直接返回
-    if isinstance(date_str, (pd.Timestamp, datetime)):
-        return date_str
-    
-    # 转换为字符串并清理
-    date_str = str(date_str).strip()
-    
-    # 处理包含"上午"、"下午"的日期格式
-    if '上午' in date_str or '下午' in date_str:
-        # 移除时间段标识，只保留日期部分
-        date_str = date_str.replace('上午', '').replace('下午', '').strip()
-    
-    # 定义多种日期格式
-    date_formats = [
-        '%Y-%m-%d',
-        '%Y/%m/%d',
-        '%Y年%m月%d日',
-        '%m/%d/%Y',
-        '%d/%m/%Y',
-        '%Y-%m-%d %H:%M:%S',
-        '%Y/%m/%d %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-        '%Y/%m/%d %H:%M',
-        '%m-%d',
-        '%m/%d'
-    ]
-    
-    # 尝试使用预定义格式解析
-    for fmt in date_formats:
+    # 重新上传只改动了部分记录时，只重新计算并写回变化的员工
+    salary_sheet, excel_data, merge_state, changed_count = merge_incrementally(
+        previous_state, salary_df, template_path, leave_data, overtime_data, profiler, diagnostics, progress, payroll_month
+    )
+    if excel_data is not None and result_cache is not None:
         try:
-            parsed_date = datetime.strptime(date_str, fmt)
-            # 如果只有月日，补充当前年份
-            if fmt in ['%m-%d', '%m/%d']:
-                current_year = datetime.now().year
-                parsed_date = parsed_date.replace(year=current_year)
-            return parsed_date
-        except ValueError:
-            continue
-    
-    # 尝试使用 pandas 的更灵活的解析
-    try:
-        return pd.to_datetime(date_str, errors='raise')
-    except:
-        return None
+            result_cache.put(result_key, excel_data)
+        except OSError as e:
+            notify('warning', f"保存结果缓存失败: {str(e)}")
+    return {
+        'salary_sheet': salary_sheet,
+        'excel_data': excel_data,
+        'merge_state': merge_state,
+        'changed_employees': changed_count,
+        'template_path': template_path,
+        'profile': profiler.report(),
+        'diagnostics': diagnostics,
+    }
 
-def load_salary_template():
-    """加载工资表模板"""
-    try:
-        template_path = "工资表模板.xlsx"
-        if os.path.exists(template_path):
-            # 工资表模板第五行为标题，数据从第六行开始，所以使用header=4
-            df = pd.read_excel(template_path, header=4)
-            
-            # 过滤掉空行和无用列
-            df = df.dropna(subset=['姓名'])
-            
-            # 清理列名，移除无用的Unnamed列
-            df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-            
-            st.success(f"成功加载工资表模板，找到 {len(df)} 名员工")
-            return df, template_path
+def finish_generation_job(job):
+    """后台生成结束后保存结果或错误提示，以及处理过程中的提示信息，并移除任务"""
+    del st.session_state['generation_job']
+    st.session_state['generation_messages'] = list(job.progress.messages)
+    has_errors = any(level == 'error' for level, _ in job.progress.messages)
+    if job.status == 'cancelled':
+        st.session_state['generation_notice'] = ('warning', "⏹ 已取消生成工资表")
+    elif job.status == 'failed':
+        st.session_state['generation_notice'] = ('error', f"❌ 生成过程中出现错误: {str(job.error)}")
+    elif job.result['excel_data'] is None:
+        st.session_state['generation_notice'] = ('error', "❌ 生成Excel文件失败，请检查模板格式")
+    else:
+        result = job.result
+        st.session_state['merge_state'] = result['merge_state']
+        # 生成结果保存在 session_state 中，筛选处理详情等操作触发页面重新运行后仍然保留
+        st.session_state['generation_result'] = {
+            'salary_sheet': result['salary_sheet'],
+            'excel_data': result['excel_data'],
+            'file_name': f"工资表_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            'profile': result['profile'],
+            'diagnostics': result['diagnostics'],
+            'changed_employees': result['changed_employees'],
+            'template_path': result['template_path'],
+            'from_cache': False,
+        }
+        if has_errors:
+            st.session_state['generation_notice'] = ('warning', "⚠️ 工资表已生成，但处理过程中出现错误，请查看上方提示")
         else:
-            st.error(f"找不到工资表模板文件: {template_path}")
-            return None, None
-    except Exception as e:
-        st.error(f"加载工资表模板时出错: {str(e)}")
-        return None, None
+            st.session_state['generation_notice'] = ('success', None)
 
-def load_leave_data(uploaded_file):
-    """加载休假数据"""
-    if uploaded_file is not None:
-        try:
-            # 尝试不同的header位置来找到正确的数据行
-            for header_row in [0, 1, 2, 3, 4]:
-                try:
-                    df = pd.read_excel(uploaded_file, header=header_row)
-                    # 检查是否包含必要的列
-                    if '创建人' in df.columns and ('请假类型' in df.columns or '时长' in df.columns):
-                        # 过滤掉空行
-                        df = df.dropna(subset=['创建人'])
-                        st.info(f"成功读取休假数据，找到 {len(df)} 条记录")
-                        return df
-                except:
-                    continue
-            
-            # 如果没有找到合适的格式，尝试手动解析
-            df = pd.read_excel(uploaded_file, header=None)
-            # 查找包含'创建人'的行
-            for i, row in df.iterrows():
-                if '创建人' in row.values:
-                    # 使用这一行作为列名
-                    df.columns = df.iloc[i]
-                    df = df.iloc[i+1:].reset_index(drop=True)
-                    df = df.dropna(subset=['创建人'])
-                    st.info(f"成功解析休假数据，找到 {len(df)} 条记录")
-                    return df
-            
-            st.error("无法在休假表中找到'创建人'列，请检查文件格式")
-            return None
-        except Exception as e:
-            st.error(f"读取休假数据时出错: {str(e)}")
-            return None
+# 生成过程中刷新进度的间隔秒数
+JOB_POLL_SECONDS = 0.5
 
-def load_overtime_data(uploaded_file):
-    """加载加班数据"""
-    if uploaded_file is not None:
-        try:
-            # 加班表模板的数据从第三行开始，第二行是列标题
-            df = pd.read_excel(uploaded_file, header=1)  # 第二行作为列标题
-            
-            # 检查是否包含必要的列
-            if '创建人' in df.columns and '时长' in df.columns:
-                # 过滤掉空行和标题行
-                df = df.dropna(subset=['创建人'])
-                # 进一步过滤掉可能的标题行（创建人列包含"创建人"文字的行）
-                df = df[df['创建人'] != '创建人']
-                st.info(f"成功读取加班数据，找到 {len(df)} 条记录")
-                return df
-            else:
-                # 如果第二行不是正确的列标题，尝试其他行
-                for header_row in [0, 2, 3, 4]:
-                    try:
-                        df = pd.read_excel(uploaded_file, header=header_row)
-                        if '创建人' in df.columns and '时长' in df.columns:
-                            df = df.dropna(subset=['创建人'])
-                            df = df[df['创建人'] != '创建人']
-                            st.info(f"成功读取加班数据（header={header_row}），找到 {len(df)} 条记录")
-                            return df
-                    except:
-                        continue
-            
-            # 如果没有找到合适的格式，尝试手动解析
-            df = pd.read_excel(uploaded_file, header=None)
-            # 查找包含'创建人'的行
-            for i, row in df.iterrows():
-                if '创建人' in row.values:
-                    # 使用这一行作为列名
-                    df.columns = df.iloc[i]
-                    df = df.iloc[i+1:].reset_index(drop=True)
-                    df = df.dropna(subset=['创建人'])
-                    df = df[df['创建人'] != '创建人']
-                    st.info(f"成功解析加班数据，找到 {len(df)} 条记录")
-                    return df
-            
-            st.error("无法在加班表中找到'创建人'列，请检查文件格式")
-            return None
-        except Exception as e:
-            st.error(f"读取加班数据时出错: {str(e)}")
-            return None
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_generation_job():
+    """显示后台生成的实际进度（已处理的员工数、已写入的单元格数）和取消按钮，只刷新这一部分页面"""
+    job = st.session_state.get('generation_job')
+    if job is None:
+        return
+    if job.finished:
+        finish_generation_job(job)
+        st.rerun()
+    
+    if job.progress.cancelled:
+        st.info(f"⏹ 正在取消...（已用时 {job.elapsed():.0f} 秒）")
+    else:
+        st.info(f"⏳ 正在生成工资表，可以继续查看页面（已用时 {job.elapsed():.0f} 秒）")
+    for stage, done, total, unit in job.progress.snapshot():
+        st.progress(min(done / total, 1.0) if total else 1.0, text=f"{stage}：{done:,} / {total:,} {unit}")
+    if st.button("⏹ 取消生成", disabled=job.progress.cancelled):
+        job.cancel()
+        st.rerun(scope='fragment')
 
-def process_leave_data(result_df, leave_data):
-    """处理休假数据并更新到工资表现有列中"""
-    if leave_data is not None:
-        # 检查必要的列是否存在
-        required_leave_columns = ['创建人', '请假类型', '时长']
-        missing_columns = [col for col in required_leave_columns if col not in leave_data.columns]
-        
-        if missing_columns:
-            st.error(f"休假数据文件缺少必要的列: {', '.join(missing_columns)}")
-            st.error(f"当前文件包含的列: {', '.join(leave_data.columns.tolist())}")
-            st.error("请确保休假数据文件包含以下列：创建人、请假类型、时长")
-            return result_df
-        
-        # 不再过滤审批结果，处理所有休假数据
-        st.info(f"将处理所有 {len(leave_data)} 条休假记录（不考虑审批状态）")
-        
-        # 处理时长数据，统一转换为天数
-        def parse_duration(duration_str):
-            if pd.isna(duration_str):
-                return 0
-            duration_str = str(duration_str).strip()
-            if '天' in duration_str:
-                return float(duration_str.replace('天', ''))
-            elif '小时' in duration_str or 'h' in duration_str.lower():
-                hours = float(duration_str.replace('小时', '').replace('h', '').replace('H', ''))
-                return hours / 8  # 按8小时工作日计算
-            else:
-                try:
-                    return float(duration_str)
-                except:
-                    return 0
-        
-        leave_data['休假天数'] = leave_data['时长'].apply(parse_duration)
-        
-        # 为每个员工收集详细的休假记录
-        for index, row in result_df.iterrows():
-            employee_name = row['姓名']
-            employee_leaves = leave_data[leave_data['创建人'] == employee_name]
-            
-            if not employee_leaves.empty:
-                leave_details = []
-                total_days = 0
-                has_unpaid_leave = False
-                
-                # 遍历该员工的所有休假记录
-                for _, leave_record in employee_leaves.iterrows():
-                    leave_type = str(leave_record['请假类型']) if pd.notna(leave_record['请假类型']) else '未知类型'
-                    start_time = str(leave_record['开始时间']) if pd.notna(leave_record['开始时间']) and '开始时间' in leave_record else ''
-                    end_time = str(leave_record['结束时间']) if pd.notna(leave_record['结束时间']) and '结束时间' in leave_record else ''
-                    duration = str(leave_record['时长']) if pd.notna(leave_record['时长']) else ''
-                    approval_status = str(leave_record['审批结果']) if pd.notna(leave_record['审批结果']) and '审批结果' in leave_record else ''
-                    days = leave_record['休假天数']
-                    
-                    # 构建详细记录，只包含必要信息
-                    detail_parts = [leave_type]
-                    if start_time and start_time != 'nan':
-                        detail_parts.append(f"开始:{start_time}")
-                    if end_time and end_time != 'nan':
-                        detail_parts.append(f"结束:{end_time}")
-                    if duration and duration != 'nan':
-                        detail_parts.append(f"时长:{duration}")
-                    
-                    # 将每条记录作为单独的行
-                    leave_details.append(" ".join(detail_parts))
-                    total_days += days
-                    
-                    # 检查是否有影响全勤的休假类型
-                    if '事假' in leave_type or '病假' in leave_type:
-                        has_unpaid_leave = True
-                
-                # 根据休假类型更新考勤情况
-                if has_unpaid_leave:
-                    if '考勤情况' in result_df.columns:
-                        result_df.at[index, '考勤情况'] = '非全勤'
-                    if '全勤' in result_df.columns:
-                        result_df.at[index, '全勤'] = 0
-                else:
-                    if '考勤情况' in result_df.columns:
-                        result_df.at[index, '考勤情况'] = '全勤'
-                
-                # 在备注列中记录详细的休假信息，每条记录分行显示
-                if '备注' in result_df.columns:
-                    current_note = str(result_df.at[index, '备注']) if pd.notna(result_df.at[index, '备注']) else ''
-                    # 使用换行符分隔每条休假记录
-                    leave_note = f"休假共{total_days}天:\n" + "\n".join([f"• {detail}" for detail in leave_details])
-                    if current_note and current_note != 'nan':
-                        result_df.at[index, '备注'] = f"{current_note}\n{leave_note}"
-                    else:
-                        result_df.at[index, '备注'] = leave_note
-        
-        # 统计有休假记录的员工数量
-        employees_with_leave = leave_data['创建人'].nunique()
-        st.success(f"已处理 {employees_with_leave} 名员工的休假数据，更新到现有列中")
-    
-    return result_df
+def run_split_job(progress, salary_df, column, template_path):
+    """在 BackgroundJob 的工作线程中按列拆分工资表，各组的工资表写入临时 ZIP 文件，不调用任何页面元素"""
+    fd, zip_path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    try:
+        entries = write_split_zip(salary_df, column, template_path, zip_path, progress=progress)
+    except BaseException:
+        os.remove(zip_path)
+        raise
+    return {'path': zip_path, 'column': column, 'entries': entries}
 
-def process_overtime_data(result_df, overtime_data):
-    """处理加班数据并更新到工资表现有列中，根据日期类型填入不同列"""
-    if overtime_data is not None:
-        # 添加调试信息：显示工资表模板的列名
-        st.info(f"工资表模板包含的列: {', '.join(result_df.columns.tolist())}")
-        
-        # 添加调试信息：显示加班数据的列名和前几行数据
-        st.info(f"加班数据包含的列: {', '.join(overtime_data.columns.tolist())}")
-        st.info(f"加班数据前3行内容:")
-        st.dataframe(overtime_data.head(3))
-        
-        # 检查加班时间相关列是否存在
-        overtime_columns = ['平日累计时间', '双休日累计时间', '法定节日累计时间']
-        missing_overtime_cols = [col for col in overtime_columns if col not in result_df.columns]
-        if missing_overtime_cols:
-            st.warning(f"工资表模板缺少以下加班时间列: {', '.join(missing_overtime_cols)}")
-        
-        # 检查必要的列是否存在
-        required_overtime_columns = ['创建人', '时长']
-        missing_columns = [col for col in required_overtime_columns if col not in overtime_data.columns]
-        
-        if missing_columns:
-            st.error(f"加班数据文件缺少必要的列: {', '.join(missing_columns)}")
-            st.error(f"当前文件包含的列: {', '.join(overtime_data.columns.tolist())}")
-            st.error("请确保加班数据文件包含以下列：创建人、时长")
-            return result_df
-        
-        # 显示所有加班记录，不再过滤审批结果
-        st.info(f"正在处理 {len(overtime_data)} 条加班记录")
-        
-        # 处理时长数据，统一转换为小时数
-        def parse_overtime_duration(duration):
-            if pd.isna(duration):
-                return 0
-            if isinstance(duration, (int, float)):
-                return float(duration)
-            duration_str = str(duration).strip()
-            if '小时' in duration_str or 'h' in duration_str.lower():
-                return float(duration_str.replace('小时', '').replace('h', '').replace('H', ''))
-            elif '天' in duration_str:
-                days = float(duration_str.replace('天', ''))
-                return days * 8  # 按8小时工作日计算
-            else:
-                try:
-                    return float(duration_str)
-                except:
-                    return 0
-        
-        overtime_data['加班时间'] = overtime_data['时长'].apply(parse_overtime_duration)
-        
-        # 按员工姓名分组，收集详细的加班记录
-        for index, row in result_df.iterrows():
-            employee_name = row['姓名']
-            employee_overtime = overtime_data[overtime_data['创建人'] == employee_name]
-            
-            if not employee_overtime.empty:
-                # 分类统计不同类型的加班时间
-                weekday_hours = 0  # 平日加班
-                weekend_hours = 0  # 休息日加班
-                holiday_hours = 0  # 法定节假日加班
-                
-                # 收集详细的加班记录
-                overtime_details = []
-                date_parse_failures = []  # 记录日期解析失败的情况
-                
-                for _, overtime_row in employee_overtime.iterrows():
-                    overtime_hours = overtime_row['加班时间']
-                    
-                    # 尝试解析加班日期
-                    overtime_date = None
-                    date_type = "工作日"  # 默认为工作日
-                    original_date_value = None
-                    
-                    # 从多个可能的日期列中获取日期
-                    date_columns = ['开始时间', '日期', '加班日期', '申请日期']
-                    for col in date_columns:
-                        if col in overtime_row and pd.notna(overtime_row[col]):
-                            original_date_value = overtime_row[col]
-                            overtime_date = parse_date_from_string(overtime_row[col])
-                            if overtime_date:
-                                break
-                    
-                    # 判断日期类型并分类统计
-                    if overtime_date:
-                        # 如果是datetime对象，转换为date对象
-                        if hasattr(overtime_date, 'date'):
-                            overtime_date = overtime_date.date()
-                        is_special, date_type = is_holiday_or_weekend(overtime_date)
-                        if date_type == "法定节假日":
-                            holiday_hours += overtime_hours
-                        elif date_type == "休息日":
-                            weekend_hours += overtime_hours
-                        else:
-                            weekday_hours += overtime_hours
-                    else:
-                        # 如果无法解析日期，默认为平日加班
-                        weekday_hours += overtime_hours
-                        if original_date_value is not None:
-                            date_parse_failures.append(f"员工{employee_name}: 无法解析日期'{original_date_value}'")
-                    
-                    # 构建详细记录，按照用户要求的格式
-                    if overtime_date:
-                        # 格式：月日时间段(时长)工作内容
-                        # 如果是datetime对象，转换为date对象
-                        if hasattr(overtime_date, 'date'):
-                            overtime_date_obj = overtime_date.date()
-                        else:
-                            overtime_date_obj = overtime_date
-                        date_str = f"{overtime_date_obj.month}月{overtime_date_obj.day}日"
-                        
-                        # 尝试获取开始和结束时间
-                        start_time = ""
-                        end_time = ""
-                        work_content = ""
-                        
-                        # 检查是否有开始时间和结束时间列
-                        if '开始时间' in overtime_row and pd.notna(overtime_row['开始时间']):
-                            try:
-                                start_dt = pd.to_datetime(overtime_row['开始时间'])
-                                start_time = start_dt.strftime('%H:%M')
-                            except:
-                                pass
-                        
-                        if '结束时间' in overtime_row and pd.notna(overtime_row['结束时间']):
-                            try:
-                                end_dt = pd.to_datetime(overtime_row['结束时间'])
-                                end_time = end_dt.strftime('%H:%M')
-                            except:
-                                pass
-                        
-                        # 尝试获取工作内容/加班原因
-                        content_columns = ['加班原因.1', '工作内容', '加班内容', '事由', '备注', '说明', '加班原因', '原因']
-                        work_content = ""
-                        found_content_column = None
-                        for col in content_columns:
-                            if col in overtime_row and pd.notna(overtime_row[col]) and str(overtime_row[col]).strip():
-                                work_content = str(overtime_row[col]).strip()
-                                found_content_column = col
-                                break
-                        
-                        # 添加调试信息：显示加班原因获取情况
-                        if work_content:
-                            st.info(f"员工{employee_name}的加班原因: '{work_content}' (来源列: {found_content_column})")
-                        else:
-                            available_content_cols = [col for col in content_columns if col in overtime_row]
-                            st.warning(f"员工{employee_name}未找到加班原因，可用列: {available_content_cols}，值: {[str(overtime_row[col]) if col in overtime_row else 'N/A' for col in available_content_cols]}")
-                        
-                        # 构建时间段字符串
-                        if start_time and end_time:
-                            time_range = f"{start_time}-{end_time}"
-                        elif start_time:
-                            time_range = f"{start_time}开始"
-                        else:
-                            time_range = ""
-                        
-                        # 组装最终格式
-                        if time_range:
-                            detail = f"{date_str}{time_range}({overtime_hours}小时)"
-                        else:
-                            detail = f"{date_str}({overtime_hours}小时)"
-                        
-                        if work_content:
-                            detail += f" {work_content}"
-                    else:
-                        detail = f"日期未知({overtime_hours}小时)"
-                        if original_date_value is not None:
-                            detail += f" [原始值: {original_date_value}]"
-                    
-                    overtime_details.append(detail)
-                
-                # 如果有日期解析失败的情况，显示警告
-                if date_parse_failures:
-                    for failure in date_parse_failures:
-                        st.warning(failure)
-                
-                # 更新不同类型的加班时间到对应列
-                if weekday_hours > 0 and '平日累计时间' in result_df.columns:
-                    current_hours = result_df.at[index, '平日累计时间'] if pd.notna(result_df.at[index, '平日累计时间']) else 0
-                    result_df.at[index, '平日累计时间'] = float(current_hours) + weekday_hours
-                
-                if weekend_hours > 0 and '双休日累计时间' in result_df.columns:
-                    current_hours = result_df.at[index, '双休日累计时间'] if pd.notna(result_df.at[index, '双休日累计时间']) else 0
-                    result_df.at[index, '双休日累计时间'] = float(current_hours) + weekend_hours
-                
-                if holiday_hours > 0 and '法定节日累计时间' in result_df.columns:
-                    current_hours = result_df.at[index, '法定节日累计时间'] if pd.notna(result_df.at[index, '法定节日累计时间']) else 0
-                    result_df.at[index, '法定节日累计时间'] = float(current_hours) + holiday_hours
-                
-                # 在备注列中记录详细的加班信息，每条记录分行显示
-                if '备注' in result_df.columns:
-                    current_note = str(result_df.at[index, '备注']) if pd.notna(result_df.at[index, '备注']) else ''
-                    
-                    # 构建加班统计信息
-                    total_hours = weekday_hours + weekend_hours + holiday_hours
-                    overtime_summary = []
-                    if weekday_hours > 0:
-                        overtime_summary.append(f"平日{weekday_hours}小时")
-                    if weekend_hours > 0:
-                        overtime_summary.append(f"双休日{weekend_hours}小时")
-                    if holiday_hours > 0:
-                        overtime_summary.append(f"法定节假日{holiday_hours}小时")
-                    
-                    summary_text = "、".join(overtime_summary)
-                    overtime_note = f"加班共{total_hours}小时({summary_text}): \n" + "\n".join([f" • {detail}" for detail in overtime_details])
-                    
-                    if current_note and current_note != 'nan':
-                        result_df.at[index, '备注'] = f"{current_note}\n{overtime_note}"
-                    else:
-                        result_df.at[index, '备注'] = overtime_note
-        
-        # 统计有加班记录的员工数量和日期解析情况
-        employees_with_overtime = overtime_data['创建人'].nunique()
-        
-        # 统计日期解析成功率
-        date_parsed_count = 0
-        for _, row in overtime_data.iterrows():
-            date_columns = ['开始时间', '日期', '加班日期', '申请日期']
-            for col in date_columns:
-                if col in row and pd.notna(row[col]):
-                    parsed_date = parse_date_from_string(row[col])
-                    if parsed_date is not None:
-                        date_parsed_count += 1
-                        break
-        
-        st.success(f"已处理 {employees_with_overtime} 名员工的加班数据，按日期类型分类填入对应列")
-        if date_parsed_count < len(overtime_data):
-            st.warning(f"有 {len(overtime_data) - date_parsed_count} 条记录无法解析日期，已按平日加班处理")
-    
-    return result_df
+def finish_split_job(job, source):
+    """拆分结束后保存 ZIP 文件路径或错误提示，并移除任务；source 为拆分的工资表的文件名"""
+    del st.session_state['split_job']
+    if job.status == 'cancelled':
+        st.session_state['split_notice'] = ('warning', "⏹ 已取消拆分工资表")
+    elif job.status == 'failed':
+        st.session_state['split_notice'] = ('error', f"❌ 拆分工资表时出现错误: {str(job.error)}")
+    else:
+        previous = st.session_state.get('split_result')
+        if previous is not None and os.path.exists(previous['path']):
+            os.remove(previous['path'])
+        st.session_state['split_result'] = dict(job.result, source=source)
 
-def merge_to_salary_sheet(salary_df, leave_df=None, overtime_df=None):
-    """将休假和加班数据更新到工资表现有列中，保持原始格式不变"""
-    result_df = salary_df.copy()
-    
-    # 处理休假数据
-    if leave_df is not None and not leave_df.empty:
-        st.info("正在处理休假数据...")
-        result_df = process_leave_data(result_df, leave_df)
-    
-    # 处理加班数据
-    if overtime_df is not None and not overtime_df.empty:
-        st.info("正在处理加班数据...")
-        result_df = process_overtime_data(result_df, overtime_df)
-    
-    return result_df
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_split_job(source):
+    """显示拆分工资表的进度和取消按钮，只刷新这一部分页面"""
+    job = st.session_state.get('split_job')
+    if job is None:
+        return
+    if job.finished:
+        finish_split_job(job, source)
+        st.rerun()
+    
+    for stage, done, total, unit in job.progress.snapshot():
+        st.progress(min(done / total, 1.0) if total else 1.0, text=f"{stage}：{done:,} / {total:,} {unit}")
+    if st.button("⏹ 取消拆分", disabled=job.progress.cancelled):
+        job.cancel()
 
-def save_salary_sheet_with_format(result_df, template_path):
-    """保存工资表，完整保留模板格式、标题行和公式"""
-    try:
-        # 加载原始模板工作簿
-        wb = load_workbook(template_path)
-        ws = wb.active
-        
-        # 数据从第6行开始（第5行是标题行）
-        start_row = 6
-        
-        # 获取列名映射（第5行是标题行）
-        header_row = 5
-        col_mapping = {}
-        for col_idx, cell in enumerate(ws[header_row], 1):
-            if cell.value:
-                col_mapping[str(cell.value).strip()] = col_idx
-        
-        # 清除现有数据行（保留格式和公式）
-        max_row = ws.max_row
-        for row_idx in range(start_row, max_row + 1):
-            for col_idx in range(1, ws.max_column + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                # 只清除非公式单元格的值，保留所有公式
-                if cell.data_type != 'f':  # 'f' 表示公式类型
-                    cell.value = None
-        
-        # 填入新数据
-        for df_row_idx, (_, row_data) in enumerate(result_df.iterrows()):
-            excel_row = start_row + df_row_idx
-            
-            # 为每一列填入数据
-            for col_name, value in row_data.items():
-                if col_name in col_mapping:
-                    col_idx = col_mapping[col_name]
-                    cell = ws.cell(row=excel_row, column=col_idx)
-                    
-                    # 只填入非公式单元格，保护现有公式
-                    if cell.data_type != 'f':  # 不覆盖公式单元格
-                        # 处理不同类型的值
-                        if pd.isna(value) or value == 'nan':
-                            cell.value = None
-                        elif isinstance(value, str) and value.strip() == '':
-                            cell.value = None
-                        else:
-                            cell.value = value
-        
-        # 保存到内存
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return output.getvalue()
-        
-    except Exception as e:
-        st.error(f"保存工资表时出错: {str(e)}")
-        return None
+def read_file_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def render_split_download(generation_result):
+    """按选择的列拆分工资表，每组按模板格式生成一个工资表，打包为 ZIP 下载"""
+    salary_df = generation_result['salary_sheet']
+    source = generation_result['file_name']
+    with st.expander("🗂️ 按列拆分为多个工资表（ZIP）", expanded=False):
+        columns = [col for col in salary_df.columns if col not in ('序号', '姓名', '备注')]
+        default = columns.index(PREVIEW_DEPARTMENT_COLUMN) if PREVIEW_DEPARTMENT_COLUMN in columns else 0
+        column = st.selectbox("拆分依据的列", columns, index=default, key="split_column")
+        group_count = partition_keys(salary_df[column]).nunique()
+        st.caption(f"按“{column}”拆分为 {group_count} 个工资表，每个工资表的序号从 1 重新编号")
+        
+        generating = st.session_state.get('split_job') is not None
+        if st.button("🗂️ 生成拆分的工资表", disabled=generating):
+            st.session_state.pop('split_notice', None)
+            st.session_state['split_job'] = BackgroundJob(
+                run_split_job, salary_df, column, generation_result['template_path']
+            )
+            st.rerun()
+        render_split_job(source)
+        
+        notice = st.session_state.get('split_notice')
+        if notice is not None:
+            getattr(st, notice[0])(notice[1])
+        split_result = st.session_state.get('split_result')
+        if split_result is not None and split_result['source'] == source and os.path.exists(split_result['path']):
+            st.download_button(
+                label=f"📥 下载按“{split_result['column']}”拆分的工资表（{len(split_result['entries'])} 个）",
+                data=lambda: read_file_bytes(split_result['path']),
+                file_name=f"{os.path.splitext(source)[0]}_按{split_result['column']}拆分.zip",
+                mime="application/zip"
+            )
 
 def main():
     st.set_page_config(
@@ -901,7 +686,7 @@ def main():
         
         # 加载工资表模板
         st.markdown("#### 📊 工资表模板")
-        salary_template, template_path = load_salary_template()
+        salary_template, template_path = load_salary_template(read_template=read_current_salary_template)
         
         if salary_template is not None:
             st.markdown('<div class="status-indicator status-success">✅ 模板加载成功</div>', unsafe_allow_html=True)
@@ -932,6 +717,25 @@ def main():
             key="overtime_file",
             help="可选上传，包含员工加班信息的Excel文件"
         )
+        
+        st.markdown("---")
+        
+        # 工资月份，指定后休假按起止时间只计入该月的工作日天数，跨月的请假按月拆分
+        st.markdown("#### 📅 工资月份")
+        payroll_month = st.selectbox(
+            "休假天数计入的月份",
+            [None] + load_leave_months(leave_file),
+            format_func=lambda month: "不限（按时长列计算）" if month is None else month,
+            key="payroll_month",
+            help="选择月份后，休假天数按开始、结束时间计算该月内的工作日（扣除节假日和周末，上午/下午按半天），不在该月的记录不计入"
+        )
+        
+        st.markdown("---")
+        
+        # 性能诊断选项，开启后生成过程会变慢
+        st.markdown("#### 🩺 性能诊断")
+        trace_memory = st.checkbox("记录各阶段峰值内存", value=False, help="使用 tracemalloc 统计内存，生成过程会明显变慢")
+        use_cprofile = st.checkbox("记录热点函数 (cProfile)", value=False, help="对生成过程进行函数级采样，生成过程会变慢")
     
     # 主内容区域
     # 系统功能简介
@@ -968,11 +772,11 @@ def main():
         st.metric("员工总数", len(salary_template))
     
     with col2:
-        leave_count = len(load_leave_data(leave_file)) if leave_file else 0
+        leave_count = len(load_cached_leave_data(leave_file)) if leave_file else 0
         st.metric("请假记录", leave_count)
     
     with col3:
-        overtime_count = len(load_overtime_data(overtime_file)) if overtime_file else 0
+        overtime_count = len(load_cached_overtime_data(overtime_file)) if overtime_file else 0
         st.metric("加班记录", overtime_count)
     
     # 数据预览（简化）
@@ -980,15 +784,23 @@ def main():
         with st.expander("📋 数据预览", expanded=False):
             if leave_file:
                 st.write("**请假数据：**")
-                leave_preview = load_leave_data(leave_file)
+                leave_preview = load_cached_leave_data(leave_file)
                 if leave_preview is not None and not leave_preview.empty:
                     st.dataframe(leave_preview.head(3), use_container_width=True)
+                leave_typed = staged_preview('leave', leave_file)
+                if leave_typed is not None and not leave_typed.empty:
+                    st.caption("解析后的日期和天数：")
+                    st.dataframe(leave_typed.head(3), use_container_width=True)
             
             if overtime_file:
                 st.write("**加班数据：**")
-                overtime_preview = load_overtime_data(overtime_file)
+                overtime_preview = load_cached_overtime_data(overtime_file)
                 if overtime_preview is not None and not overtime_preview.empty:
                     st.dataframe(overtime_preview.head(3), use_container_width=True)
+                overtime_typed = staged_preview('overtime', overtime_file)
+                if overtime_typed is not None and not overtime_typed.empty:
+                    st.caption("解析后的日期、日期类型和小时数：")
+                    st.dataframe(overtime_typed.head(3), use_container_width=True)
     
     # 生成工资表按钮
     st.markdown('<hr class="custom-divider">', unsafe_allow_html=True)
@@ -1017,75 +829,87 @@ def main():
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col2:
-        if st.button("🚀 开始生成工资表", type="primary", use_container_width=True, disabled=not can_generate):
-            # 创建进度条
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+        generating = st.session_state.get('generation_job') is not None
+        if st.button("🚀 开始生成工资表", type="primary", use_container_width=True, disabled=not can_generate or generating):
+            profiler = PipelineProfiler(trace_memory=trace_memory, use_cprofile=use_cprofile)
+            diagnostics = DiagnosticsCollector()
             
             try:
-                # 步骤1: 加载数据
-                status_text.text("📂 正在加载数据文件...")
-                progress_bar.progress(20)
-                
-                leave_data = load_leave_data(leave_file) if leave_file else None
-                overtime_data = load_overtime_data(overtime_file) if overtime_file else None
-                
-                # 步骤2: 处理数据
-                status_text.text("⚙️ 正在处理员工数据...")
-                progress_bar.progress(50)
-                
-                final_salary_sheet = merge_to_salary_sheet(
-                    salary_template, 
-                    leave_data, 
-                    overtime_data
-                )
-                
-                # 步骤3: 生成Excel文件
-                status_text.text("📊 正在生成Excel文件...")
-                progress_bar.progress(80)
+                # 模板和上传文件与之前某次生成完全相同时，直接使用磁盘缓存中的结果
+                result_cache = open_result_cache()
+                with profiler.stage('查找缓存'):
+                    with open(template_path, 'rb') as f:
+                        result_key = cache_key(
+                            f.read(),
+                            leave_file.getvalue() if leave_file else None,
+                            overtime_file.getvalue() if overtime_file else None,
+                            payroll_month
+                        )
+                    excel_data = result_cache.get(result_key) if result_cache is not None else None
                 
-                excel_data = save_salary_sheet_with_format(final_salary_sheet, template_path)
-                
-                if excel_data is None:
-                    st.error("❌ 生成Excel文件失败，请检查模板格式")
-                    st.stop()
-                
-                # 步骤4: 完成
-                status_text.text("✅ 工资表生成完成！")
-                progress_bar.progress(100)
-                
-                # 成功提示
-                st.balloons()
-                st.markdown("""
-                <div class="custom-card" style="text-align: center; background: linear-gradient(135deg, rgba(76, 175, 80, 0.1), rgba(69, 160, 73, 0.1)); border: 2px solid #4CAF50;">
-                    <h3 style="color: #4CAF50; margin-bottom: 1rem;">🎉 生成成功！</h3>
-                    <p style="margin-bottom: 1rem;">工资表已成功生成，包含所有员工的考勤和加班信息</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # 显示最终工资表
-                st.markdown("### 📋 最终工资表预览")
-                
-                with st.expander("📊 查看完整工资表", expanded=True):
-                    st.dataframe(final_salary_sheet, use_container_width=True, height=500)
-                
-                # 下载按钮
-                st.markdown("### 📥 下载文件")
-                
-                col_download1, col_download2, col_download3 = st.columns([1, 2, 1])
-                with col_download2:
-                    st.download_button(
-                        label="📥 下载完整工资表",
-                        data=excel_data,
-                        file_name=f"工资表_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
+                if excel_data is not None:
+                    # 生成结果保存在 session_state 中，筛选处理详情等操作触发页面重新运行后仍然保留
+                    st.session_state['generation_result'] = {
+                        'salary_sheet': read_salary_template(io.BytesIO(excel_data)),
+                        'excel_data': excel_data,
+                        'file_name': f"工资表_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                        'profile': profiler.report(),
+                        'diagnostics': diagnostics,
+                        'changed_employees': None,
+                        'template_path': template_path,
+                        'from_cache': True,
+                    }
+                    st.session_state['generation_notice'] = ('success', None)
+                else:
+                    # 上传文件的解析结果已缓存，在页面中加载；合并和保存在后台线程中执行，页面上的操作不会中断生成
+                    with profiler.stage('文件加载') as load_stage:
+                        leave_data = load_cached_leave_data(leave_file)
+                        overtime_data = load_cached_overtime_data(overtime_file)
+                        load_stage['rows'] = sum(len(df) for df in (leave_data, overtime_data) if df is not None)
+                    
+                    st.session_state['generation_job'] = BackgroundJob(
+                        run_generation_job,
+                        st.session_state.get('merge_state'),
+                        salary_template,
+                        template_path,
+                        leave_data,
+                        overtime_data,
+                        profiler,
+                        diagnostics,
+                        result_cache,
+                        result_key,
+                        payroll_month
                     )
+                st.rerun()
                 
             except Exception as e:
                 st.error(f"❌ 生成过程中出现错误: {str(e)}")
-                progress_bar.empty()
-                status_text.empty()
+    
+    # 后台生成的进度和取消按钮，生成结束后显示结果
+    if st.session_state.get('generation_job') is not None:
+        render_generation_job()
+    
+    # 后台生成过程中的提示信息（缺少列、日期无法解析等）
+    for level, message in st.session_state.pop('generation_messages', []):
+        getattr(st, level)(message)
+    
+    notice = st.session_state.pop('generation_notice', None)
+    if notice is not None:
+        level, message = notice
+        if level == 'success':
+            st.balloons()
+            st.markdown("""
+            <div class="custom-card" style="text-align: center; background: linear-gradient(135deg, rgba(76, 175, 80, 0.1), rgba(69, 160, 73, 0.1)); border: 2px solid #4CAF50;">
+                <h3 style="color: #4CAF50; margin-bottom: 1rem;">🎉 生成成功！</h3>
+                <p style="margin-bottom: 1rem;">工资表已成功生成，包含所有员工的考勤和加班信息</p>
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            getattr(st, level)(message)
+    
+    generation_result = st.session_state.get('generation_result')
+    if generation_result is not None:
+        render_generation_result(generation_result)
     
     # 页脚信息
     st.markdown('<hr class="custom-divider">', unsafe_allow_html=True)
@@ -1145,4 +969,4 @@ def main():
     """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,265 @@
+"""
+按某一列（如岗位、部门、成本中心）拆分工资表，每组分别按模板格式生成一个工资表，打包为 ZIP
+
+各组的工资表在进程池中并行生成（与 save_salary_sheet_with_format 相同，完整保留模板格式和公式），
+每生成完一个就写入 ZIP 文件，同时在处理中的工作簿不超过工作进程数的两倍，不会把所有工作簿同时保存在内存中。
+工作簿本身已经是压缩文件，ZIP 中不再压缩。
+
+模板的数据区列出了全部员工，生成每组的工资表前先把模板的数据区删减到该组的人数：删除多余的数据行，
+合计行等表尾上移，表尾公式、合并单元格、数据有效性、打印区域等引用的行号按 Excel 删除行的方式调整
+（区域的末行在删除的行中时收缩到保留的最后一行）。
+
+用法：
+    from split_workbooks import write_split_zip
+    entries = write_split_zip(final_salary_sheet, '岗位', template_path, '工资表_按岗位.zip')
+"""
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from background_job import report_progress
+from salary_core import SHEET_START_ROW, is_formula_value, save_salary_sheet_with_format, sheet_layout
+
+# 并行生成拆分工资表的进程数，可以用环境变量修改；为 1 时在当前进程中逐个生成
+SPLIT_WORKERS = int(os.environ.get('SALARY_SPLIT_WORKERS', os.cpu_count() or 1))
+
+# 员工数少于该值时在当前进程中逐个生成，启动工作进程的开销比生成本身还大
+SPLIT_PARALLEL_MIN_ROWS = int(os.environ.get('SALARY_SPLIT_PARALLEL_MIN_ROWS', 2000))
+
+# 拆分列没有值的员工归入该组
+UNGROUPED_NAME = '未分组'
+
+# 文件名中不能使用的字符
+INVALID_FILE_NAME_CHARS = re.compile(r'[\\/:*?"<>|\r\n\t]')
+
+# 区域引用中的一端：列和行（如 $F$6）或只有行（整行引用）
+CELL_REFERENCE = re.compile(r'(\$?[A-Za-z]{1,3})?(\$?)(\d+)')
+
+def partition_keys(values):
+    """各行所属的组名：拆分列的值去掉首尾空白，没有值时为 UNGROUPED_NAME"""
+    keys = values.astype(object).where(values.notna(), '').astype(str).str.strip()
+    return keys.where(keys != '', UNGROUPED_NAME)
+
+def split_salary_sheet(salary_df, column):
+    """
+    按 column 的值拆分工资表，按各组首次出现的顺序返回 [(组名, 工资表), ...]
+    每组的序号从 1 重新编号
+    """
+    groups = []
+    for name, partition in salary_df.groupby(partition_keys(salary_df[column]), sort=False):
+        if '序号' in partition.columns:
+            partition = partition.assign(序号=range(1, len(partition) + 1))
+        groups.append((name, partition))
+    return groups
+
+def partition_file_name(name, used_names):
+    """组名转换为 ZIP 中不重复的文件名"""
+    base = INVALID_FILE_NAME_CHARS.sub('_', name).strip() or UNGROUPED_NAME
+    file_name = f"工资表_{base}.xlsx"
+    suffix = 2
+    while file_name in used_names:
+        file_name = f"工资表_{base}_{suffix}.xlsx"
+        suffix += 1
+    used_names.add(file_name)
+    return file_name
+
+def template_data_end(ws):
+    """模板数据区的最后一行：第 SHEET_START_ROW 行之后最后一个填有姓名的行，没有时为 SHEET_START_ROW - 1"""
+    name_column = sheet_layout(ws).get('姓名')
+    if name_column is None:
+        return SHEET_START_ROW - 1
+    names = next(ws.iter_cols(min_col=name_column, max_col=name_column, min_row=SHEET_START_ROW, values_only=True), ())
+    filled = [offset for offset, name in enumerate(names) if name is not None and str(name).strip()]
+    return SHEET_START_ROW + filled[-1] if filled else SHEET_START_ROW - 1
+
+def shift_row(row, first, count, is_end):
+    """
+    删除第 first 行起的 count 行后原来第 row 行的行号
+    row 在删除的行中时：区域的末行收缩到删除前一行，首行和单个单元格移到删除后的第一行（单个单元格由调用方处理）
+    """
+    if row < first:
+        return row
+    if row >= first + count:
+        return row - count
+    return first - 1 if is_end else first
+
+def shift_reference(reference, first, count):
+    """
+    调整 A1 形式的单元格或区域引用（如 F6:F86、$A$1:$P$91、1:5）中的行号，其中的单元格都被删除时返回 None
+    整列引用和不是单元格引用的文本（名称等）原样返回
+    """
+    parts = reference.split(':')
+    matches = [CELL_REFERENCE.fullmatch(part) for part in parts]
+    if len(parts) > 2 or None in matches:
+        return reference
+    rows = [int(match.group(3)) for match in matches]
+    if len(rows) == 1:
+        if first <= rows[0] < first + count:
+            return None
+        rows = [shift_row(rows[0], first, count, False)]
+    else:
+        rows = [shift_row(rows[0], first, count, False), shift_row(rows[1], first, count, True)]
+        if rows[1] < rows[0]:
+            return None
+    return ':'.join(f"{match.group(1) or ''}{match.group(2)}{row}" for match, row in zip(matches, rows))
+
+def shift_formula(formula, first, count, sheet_title):
+    """调整公式中本工作表的单元格引用的行号，被删除的引用改为 #REF!"""
+    from openpyxl.formula.tokenizer import Token, Tokenizer
+
+    tokenizer = Tokenizer(formula)
+    changed = False
+    for token in tokenizer.items:
+        if token.type != Token.OPERAND or token.subtype != Token.RANGE:
+            continue
+        sheet, _, reference = token.value.rpartition('!')
+        if sheet and sheet.strip("'") != sheet_title:
+            continue
+        shifted = shift_reference(reference, first, count)
+        value = '#REF!' if shifted is None else (f"{sheet}!{shifted}" if sheet else shifted)
+        if value != token.value:
+            token.value = value
+            changed = True
+    return tokenizer.render() if changed else formula
+
+def shift_ranges(ranges, first, count):
+    """调整一组区域（如数据有效性的 sqref）的行号，去掉已全部删除的区域"""
+    shifted = (shift_reference(str(cell_range), first, count) for cell_range in ranges)
+    return ' '.join(reference for reference in shifted if reference is not None)
+
+def delete_template_rows(ws, first, count):
+    """
+    删除第 first 行起的 count 行，下方的行上移
+    openpyxl 的 delete_rows 只移动单元格，公式、行高、合并单元格、数据有效性、条件格式、打印区域、筛选区域和冻结窗格在这里调整
+    """
+    from openpyxl.formatting.formatting import ConditionalFormattingList
+
+    merged = [str(cell_range) for cell_range in ws.merged_cells.ranges if cell_range.max_row >= first]
+    for cell_range in merged:
+        ws.unmerge_cells(cell_range)
+    ws.delete_rows(first, count)
+    for cell_range in merged:
+        shifted = shift_reference(cell_range, first, count)
+        if shifted is not None:
+            ws.merge_cells(shifted)
+
+    for row in ws.iter_rows():
+        for cell in row:
+            if isinstance(cell.value, str) and is_formula_value(cell.value):
+                cell.value = shift_formula(cell.value, first, count, ws.title)
+
+    dimensions = {index: ws.row_dimensions[index] for index in list(ws.row_dimensions) if index >= first}
+    for index in dimensions:
+        del ws.row_dimensions[index]
+    for index, dimension in sorted(dimensions.items()):
+        if index >= first + count:
+            dimension.index = index - count
+            ws.row_dimensions[index - count] = dimension
+
+    for validation in ws.data_validations.dataValidation:
+        validation.sqref = shift_ranges(validation.sqref.ranges, first, count)
+    ws.data_validations.dataValidation = [validation for validation in ws.data_validations.dataValidation if validation.sqref]
+    formatting = ws.conditional_formatting
+    ws.conditional_formatting = ConditionalFormattingList()
+    for conditional_format in formatting:
+        ranges = shift_ranges(conditional_format.sqref.ranges, first, count)
+        for rule in conditional_format.rules if ranges else ():
+            ws.conditional_formatting.add(ranges, rule)
+
+    if ws.print_area:
+        print_area = shift_ranges(ws._print_area.ranges, first, count)
+        ws.print_area = print_area.split() if print_area else None
+    if ws.auto_filter.ref:
+        ws.auto_filter.ref = shift_reference(ws.auto_filter.ref, first, count)
+    if ws.freeze_panes:
+        column, row = CELL_REFERENCE.fullmatch(ws.freeze_panes).group(1, 3)
+        ws.freeze_panes = f"{column}{shift_row(int(row), first, count, False)}"
+
+def trim_template(template_path, data_rows):
+    """
+    把模板的数据区删减为 data_rows 行，返回删减后的模板文件内容
+    数据区的行数不超过 data_rows 时返回 None，直接使用原模板
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(template_path)
+    ws = wb.active
+    first = SHEET_START_ROW + data_rows
+    count = template_data_end(ws) - first + 1
+    if count <= 0:
+        return None
+    delete_template_rows(ws, first, count)
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def render_partition(partition, template_path):
+    """按删减到该组人数的模板格式生成一组工资表，返回文件内容；在工作进程中执行"""
+    template = trim_template(template_path, len(partition))
+    return save_salary_sheet_with_format(partition, template_path if template is None else io.BytesIO(template))
+
+def render_partitions(groups, template_path, workers):
+    """依次产生 (组名, 工资表, 文件内容)，workers 大于 1 时在进程池中生成，按完成的先后产生"""
+    if workers <= 1:
+        for name, partition in groups:
+            yield name, partition, render_partition(partition, template_path)
+        return
+
+    # Streamlit 等多线程的进程中 fork 可能死锁，工作进程使用 spawn 启动
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pending = {}
+        remaining = iter(groups)
+        for name, partition in remaining:
+            pending[executor.submit(render_partition, partition, template_path)] = (name, partition)
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, partition = pending.pop(future)
+                yield name, partition, future.result()
+                next_group = next(remaining, None)
+                if next_group is not None:
+                    pending[executor.submit(render_partition, next_group[1], template_path)] = next_group
+    finally:
+        # 取消或出错时不再等待排队中的工作簿
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def write_split_zip(salary_df, column, template_path, output_path, workers=None, progress=None):
+    """
+    按 column 拆分工资表，各组分别按模板格式生成工资表，写入 output_path 的 ZIP 文件（先写临时文件再替换）
+    workers 默认为 SPLIT_WORKERS，员工数少于 SPLIT_PARALLEL_MIN_ROWS 时不启动工作进程
+    progress 为 JobProgress 时每写入一个工资表报告一次进度
+    返回 [(组名, 文件名, 员工数), ...]
+    """
+    if column not in salary_df.columns:
+        raise ValueError(f"工资表中没有“{column}”列")
+    groups = split_salary_sheet(salary_df, column)
+    if workers is None:
+        workers = SPLIT_WORKERS if len(salary_df) >= SPLIT_PARALLEL_MIN_ROWS else 1
+    workers = max(1, min(workers, len(groups)))
+
+    entries = []
+    used_names = set()
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_STORED) as archive:
+            report_progress(progress, '生成拆分的工资表', 0, len(groups), '个工资表')
+            for name, partition, excel_data in render_partitions(groups, template_path, workers):
+                if excel_data is None:
+                    raise RuntimeError(f"生成“{name}”的工资表失败，请检查模板格式")
+                file_name = partition_file_name(name, used_names)
+                archive.writestr(file_name, excel_data)
+                entries.append((name, file_name, len(partition)))
+                report_progress(progress, '生成拆分的工资表', len(entries), len(groups), '个工资表')
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return entries
@@ -0,0 +1,309 @@
+"""
+上传文件的列式暂存（Parquet）
+
+解析 .xlsx/.xls 是整个流程中最慢的读取操作。每个休假表、加班表和工资表模板按文件内容只解析一次，
+解析结果连同类型化的预览列（日期、天数或小时数、分类编码的姓名和类型）写入 Parquet 文件，
+之后的预览、重新生成和批处理直接以内存映射方式读取暂存文件，不再重新读取 Excel。
+
+暂存文件按文件内容、处理代码版本和当前年份寻址，任一变化都会重新解析。
+解析结果中同一列混有文本、数字、日期等不同类型的值时，按类型拆分为多列保存，读取时还原为与解析结果完全相同的值。
+没有安装 pyarrow 时不暂存，每次都直接解析。
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, time
+
+import numpy as np
+import pandas as pd
+
+from result_cache import code_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# 默认的暂存目录，可以用环境变量修改
+STAGING_DIR = os.environ.get('SALARY_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'salary_sheet_staging'))
+
+STAGING_SUFFIX = '.parquet'
+
+# 暂存文件格式的版本，修改 encode_frame 的保存方式时加一，使旧格式的暂存文件不再被读取
+STAGING_FORMAT = 2
+
+# 暂存文件的 schema 元数据中记录原始列信息的键
+METADATA_KEY = b'salary_staging'
+
+# 类型化预览列的列名前缀，与解析结果的列区分开
+TYPED_PREFIX = 'typed:'
+
+# 混合类型列中每个值的类型编码
+KIND_NONE, KIND_STR, KIND_INT, KIND_FLOAT, KIND_BOOL, KIND_DATETIME, KIND_TIMESTAMP, KIND_TIME, KIND_NAT = range(9)
+
+class StagingError(Exception):
+    """解析结果中有无法无损暂存的值，这种文件不暂存"""
+
+def staging_available():
+    return pq is not None
+
+def encode_name(name):
+    """列名可能是文本、数字或日期，编码为可序列化为JSON的 [类型, 值]"""
+    if isinstance(name, str):
+        return ['s', name]
+    if isinstance(name, (bool, np.bool_)):
+        return ['b', bool(name)]
+    if isinstance(name, (int, np.integer)):
+        return ['i', int(name)]
+    if isinstance(name, (float, np.floating)):
+        return ['f', None if np.isnan(name) else float(name)]
+    if isinstance(name, pd.Timestamp):
+        return ['T', name.isoformat()]
+    if isinstance(name, datetime):
+        return ['t', name.isoformat()]
+    raise StagingError(f"无法暂存的列名: {name!r}")
+
+def decode_name(encoded):
+    kind, value = encoded
+    if kind == 'f':
+        return np.nan if value is None else value
+    if kind == 'T':
+        return pd.Timestamp(value)
+    if kind == 't':
+        return datetime.fromisoformat(value)
+    return value
+
+def value_kind(value):
+    """混合类型列中单个值的类型编码"""
+    if value is None:
+        return KIND_NONE
+    if value is pd.NaT:
+        return KIND_NAT
+    if isinstance(value, str):
+        return KIND_STR
+    if isinstance(value, (bool, np.bool_)):
+        return KIND_BOOL
+    if isinstance(value, (int, np.integer)):
+        if not -2 ** 63 <= value < 2 ** 63:
+            raise StagingError(f"超出范围的整数: {value}")
+        return KIND_INT
+    if isinstance(value, (float, np.floating)):
+        return KIND_FLOAT
+    if isinstance(value, pd.Timestamp):
+        if value.tzinfo is not None:
+            raise StagingError(f"带时区的时间: {value}")
+        return KIND_TIMESTAMP
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            raise StagingError(f"带时区的时间: {value}")
+        return KIND_DATETIME
+    if isinstance(value, time):
+        return KIND_TIME
+    raise StagingError(f"无法暂存的值: {value!r}")
+
+def is_text_column(values):
+    """object 列中只有文本和 NaN（读取 Excel 时空单元格的值）时按文本列保存"""
+    present = values[values.notna()]
+    missing = values[values.isna()]
+    return (
+        present.map(lambda value: isinstance(value, str)).all()
+        and missing.map(lambda value: isinstance(value, float)).all()
+    )
+
+def encode_mixed(values, name):
+    """把混合类型的列拆分为类型编码列和按类型存放值的几列，返回 {列名: pyarrow 数组}"""
+    objects = values.to_numpy(dtype=object)
+    kinds = np.fromiter((value_kind(value) for value in objects), dtype=np.int8, count=len(objects))
+
+    def part(kind_set, convert, arrow_type):
+        mask = np.isin(kinds, kind_set)
+        items = [convert(value) if selected else None for value, selected in zip(objects, mask)]
+        return pa.array(items, type=arrow_type)
+
+    return {
+        f"{name}:kind": pa.array(kinds, type=pa.int8()),
+        f"{name}:str": part([KIND_STR], str, pa.string()),
+        f"{name}:time": part([KIND_TIME], time.isoformat, pa.string()),
+        f"{name}:int": part([KIND_INT], int, pa.int64()),
+        f"{name}:float": part([KIND_FLOAT], float, pa.float64()),
+        f"{name}:bool": part([KIND_BOOL], bool, pa.bool_()),
+        f"{name}:datetime": part([KIND_DATETIME, KIND_TIMESTAMP], pd.Timestamp, pa.timestamp('ns')),
+    }
+
+def decode_mixed(columns, name):
+    """由 encode_mixed 拆分的几列还原为原始的 object 列"""
+    kinds = columns[f"{name}:kind"].to_numpy()
+    values = np.empty(len(kinds), dtype=object)
+    values[kinds == KIND_NAT] = pd.NaT
+
+    def fill(kind, part, convert):
+        mask = kinds == kind
+        if mask.any():
+            items = columns[f"{name}:{part}"].to_numpy(zero_copy_only=False)[mask]
+            converted = np.empty(mask.sum(), dtype=object)
+            converted[:] = [convert(item) for item in items]
+            values[mask] = converted
+
+    fill(KIND_STR, 'str', str)
+    fill(KIND_TIME, 'time', time.fromisoformat)
+    fill(KIND_INT, 'int', int)
+    fill(KIND_FLOAT, 'float', float)
+    fill(KIND_BOOL, 'bool', bool)
+    fill(KIND_DATETIME, 'datetime', lambda item: pd.Timestamp(item).to_pydatetime())
+    fill(KIND_TIMESTAMP, 'datetime', pd.Timestamp)
+    return values
+
+def encode_category(values):
+    """分类编码的列按编码和类别保存为字典数组，类别只能是文本"""
+    categories = values.cat.categories
+    if categories.dtype != object or not all(isinstance(category, str) for category in categories):
+        raise StagingError("只能暂存文本类别的分类列")
+    codes = pa.array(values.cat.codes.to_numpy(), mask=values.isna().to_numpy(), type=pa.int32())
+    return pa.DictionaryArray.from_arrays(codes, pa.array(list(categories), type=pa.string()))
+
+def decode_category(column):
+    """还原 encode_category 保存的分类列，类别的顺序与保存前相同"""
+    chunks = column.combine_chunks()
+    codes = chunks.indices.fill_null(-1).to_numpy()
+    categories = pd.Index(chunks.dictionary.to_pylist(), dtype=object)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def encode_frame(df, typed=None):
+    """
+    把解析结果转换为 pyarrow 表：数值、日期等类型一致的列直接保存，文本列和分类编码的列按字典编码保存，混合类型的列拆分保存
+    typed 为类型化预览列组成的 DataFrame，列名加上 TYPED_PREFIX 一起保存
+    """
+    arrays = {}
+    layout = []
+    for position in range(df.shape[1]):
+        name = f"c{position}"
+        values = df.iloc[:, position]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[name] = encode_category(values)
+            kind = 'category'
+        elif values.dtype != object:
+            arrays[name] = pa.Array.from_pandas(values)
+            kind = 'native'
+        elif is_text_column(values):
+            arrays[name] = pa.array(values.where(values.notna(), None), type=pa.string()).dictionary_encode()
+            kind = 'text'
+        else:
+            arrays.update(encode_mixed(values, name))
+            kind = 'mixed'
+        layout.append({'name': encode_name(df.columns[position]), 'kind': kind, 'dtype': str(values.dtype)})
+
+    index = df.index
+    if not pd.api.types.is_integer_dtype(index.dtype):
+        raise StagingError("只能暂存整数索引")
+    arrays['index'] = pa.array(index.to_numpy(dtype=np.int64))
+
+    if typed is not None:
+        for column in typed.columns:
+            arrays[TYPED_PREFIX + column] = pa.Array.from_pandas(typed[column])
+
+    table = pa.table(arrays)
+    metadata = {METADATA_KEY: json.dumps({'columns': layout, 'index_name': index.name}, ensure_ascii=False).encode()}
+    return table.replace_schema_metadata(metadata)
+
+def decode_frame(table):
+    """由 encode_frame 的结果还原解析结果，与暂存前的 DataFrame 相同"""
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    columns = {name: table.column(name) for name in table.column_names}
+    data = {}
+    for position, column in enumerate(metadata['columns']):
+        name = f"c{position}"
+        if column['kind'] == 'category':
+            data[position] = decode_category(columns[name])
+        elif column['kind'] == 'native':
+            values = columns[name].to_pandas()
+            if values.dtype != np.dtype(column['dtype']):
+                values = values.astype(column['dtype'])
+            data[position] = values.to_numpy()
+        elif column['kind'] == 'text':
+            text = columns[name].to_pandas().astype(object)
+            data[position] = text.where(text.notna(), np.nan).to_numpy(dtype=object)
+        else:
+            data[position] = decode_mixed(columns, name)
+    index = pd.Index(columns['index'].to_numpy(), name=metadata['index_name'])
+    df = pd.DataFrame(data, index=index)
+    df.columns = [decode_name(column['name']) for column in metadata['columns']]
+    return df
+
+def file_key(kind, file_bytes):
+    """文件内容、文件类型、处理代码版本和当前年份（只有月日的日期按当前年份补全）对应的暂存键"""
+    digest = hashlib.sha256()
+    for part in (kind, str(STAGING_FORMAT), code_version(), str(datetime.now().year)):
+        digest.update(part.encode() + b'\0')
+    digest.update(file_bytes)
+    return digest.hexdigest()
+
+class StagingArea:
+    """
+    暂存目录，每个文件的解析结果保存为以暂存键命名的 Parquet 文件
+    写入使用临时文件再替换，多个进程可以共用同一个目录
+    """
+
+    def __init__(self, directory=STAGING_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, kind, file_bytes):
+        """文件对应的暂存文件路径"""
+        return os.path.join(self.directory, file_key(kind, file_bytes) + STAGING_SUFFIX)
+
+    def write(self, path, df, typed=None):
+        table = encode_frame(df, typed)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def load(self, kind, file_bytes, parse, typed_columns=None):
+        """
+        返回文件的解析结果：已暂存时以内存映射方式读取，否则用 parse(文件对象) 解析后暂存
+        typed_columns(解析结果) 返回一同暂存的类型化预览列；解析失败（返回 None）时不暂存
+        """
+        path = self.path(kind, file_bytes)
+        if os.path.exists(path):
+            table = pq.read_table(path, memory_map=True, columns=self.record_columns(path))
+            return decode_frame(table)
+
+        df = parse(io.BytesIO(file_bytes))
+        if df is not None:
+            try:
+                self.write(path, df, typed_columns(df) if typed_columns is not None else None)
+            except (StagingError, OSError, pa.ArrowException):
+                pass
+        return df
+
+    def load_typed(self, kind, file_bytes):
+        """读取已暂存文件的类型化预览列，文件尚未暂存时返回 None"""
+        path = self.path(kind, file_bytes)
+        if not os.path.exists(path):
+            return None
+        columns = [name for name in pq.read_schema(path).names if name.startswith(TYPED_PREFIX)]
+        table = pq.read_table(path, memory_map=True, columns=columns)
+        return table.to_pandas().rename(columns=lambda name: name[len(TYPED_PREFIX):])
+
+    @staticmethod
+    def record_columns(path):
+        """暂存文件中属于解析结果的列（不含类型化预览列）"""
+        return [name for name in pq.read_schema(path).names if not name.startswith(TYPED_PREFIX)]
+
+def open_staging_area(directory=STAGING_DIR):
+    """没有安装 pyarrow 或目录无法创建时返回 None，直接解析文件"""
+    if not staging_available():
+        return None
+    try:
+        return StagingArea(directory)
+    except OSError:
+        return None
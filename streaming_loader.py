@@ -0,0 +1,210 @@
+"""
+流式读取休假表、加班表（.xlsx）
+
+以只读模式逐行读取工作表，只保留参与合并的列，每积累一块记录就汇总到按员工累计的结果中，
+不会把整个文件读取为 DataFrame。累计结果中每条记录仍保留一行备注说明（LeaveAggregator.detail_lines 等），
+因此内存占用仍随记录行数增长，只是远小于完整读取；max_memory_mb 限制的是当前块与累计结果的估算内存。
+汇总逻辑与 process_leave_data / process_overtime_data 相同，结果可直接回填到工资表。
+"""
+import pandas as pd
+from openpyxl import load_workbook
+
+from employee_index import EmployeeIndex
+from salary_core import (
+    HEADER_SNIFF_ROWS, LEAVE_COLUMNS, OVERTIME_COLUMNS,
+    LeaveAggregator, OvertimeAggregator,
+    add_leave_days, add_overtime_hours, apply_leave_summary, apply_overtime_summary, report_invalid_durations,
+    report_unresolved_employees,
+    find_header_row, is_leave_header, is_overtime_header, notify
+)
+
+# 每块汇总的记录行数
+STREAM_CHUNK_ROWS = 5000
+
+# 与 pandas.read_excel 默认一致，视为空值的文本
+NA_TEXT_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+class StreamLimitError(Exception):
+    """读取的记录行数或估算内存超过设定上限"""
+
+def convert_cell_value(value):
+    """按 pandas.read_excel 的规则转换单元格值：整数值的浮点数转为整数，空文本视为空值"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in NA_TEXT_VALUES:
+        return None
+    return value
+
+def header_names(row):
+    """按 pandas 的规则生成列名：空标题为'Unnamed: 序号'，重复的列名依次加'.1'、'.2'"""
+    names = []
+    seen = {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+            while name in seen:
+                name = f"{name}.1"
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+def iter_sheet_rows(source):
+    """以只读模式逐行读取第一个工作表，返回单元格值组成的元组"""
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        # 部分导出工具写入的表格尺寸不准确，重新计算后才能读到全部单元格
+        worksheet.reset_dimensions()
+        yield from worksheet.iter_rows(min_row=1, values_only=True)
+    finally:
+        workbook.close()
+
+def iter_record_chunks(source, candidate_rows, is_header, columns, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    查找标题行后逐块返回记录，每块最多 chunk_rows 行，只包含 columns 中存在的列
+    第一个返回值是表格的全部列名，之后依次返回各块DataFrame
+    找不到标题行时抛出 ValueError
+    """
+    rows = iter_sheet_rows(source)
+    preview = []
+    for row in rows:
+        preview.append(row)
+        if len(preview) >= HEADER_SNIFF_ROWS:
+            break
+
+    # 与完整读取一样，先检查候选行，预读范围内没找到时在后续行中继续查找
+    header_row, _ = find_header_row(preview, candidate_rows, is_header)
+    pending = preview[header_row + 1:] if header_row is not None else []
+    if header_row is None:
+        for row in rows:
+            if '创建人' in row:
+                header = row
+                break
+        else:
+            raise ValueError("无法找到'创建人'列，请检查文件格式")
+    else:
+        header = preview[header_row]
+
+    names = header_names(header)
+    yield names
+
+    # 只保留参与合并的列
+    selected = [i for i, name in enumerate(names) if name in columns]
+    selected_names = [names[i] for i in selected]
+
+    def project(row):
+        return tuple(convert_cell_value(row[i]) if i < len(row) else None for i in selected)
+
+    chunk = []
+    for source_rows in (pending, rows):
+        for row in source_rows:
+            chunk.append(project(row))
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=selected_names)
+                chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=selected_names)
+
+def check_limits(aggregator, chunk, rows_read, max_rows, max_memory_mb):
+    """检查已读取的行数和估算内存是否超过上限"""
+    if max_rows is not None and rows_read > max_rows:
+        raise StreamLimitError(f"记录行数超过上限 {max_rows} 行")
+    if max_memory_mb is not None:
+        used_mb = (chunk.memory_usage(deep=True).sum() + aggregator.memory_usage()) / 1024 / 1024
+        if used_mb > max_memory_mb:
+            raise StreamLimitError(f"估算内存 {used_mb:.1f}MB 超过上限 {max_memory_mb}MB")
+
+def stream_records(source, employee_index, aggregator, candidate_rows, is_header, columns, required_columns,
+                   prepare, kind, chunk_rows=STREAM_CHUNK_ROWS, max_rows=None, max_memory_mb=None, diagnostics=None):
+    """
+    逐块读取记录，按 employee_index 对应到工资表中的员工后加入汇总，缺少必要的列时抛出 ValueError
+    prepare 计算每块记录的时长并返回无法解析的记录掩码，kind 为提示信息中的记录类型
+    返回 (汇总结果, 读取的记录数)
+    """
+    chunks = iter_record_chunks(source, candidate_rows, is_header, columns, chunk_rows)
+    names = next(chunks)
+    missing_columns = [col for col in required_columns if col not in names]
+    if missing_columns:
+        raise ValueError(f"缺少必要的列: {', '.join(missing_columns)}")
+
+    unresolved = []
+    rows_read = 0
+    for chunk in chunks:
+        # 过滤掉空行和重复的标题行
+        chunk = chunk.dropna(subset=['创建人'])
+        chunk = chunk[chunk['创建人'] != '创建人']
+        if chunk.empty:
+            continue
+        rows_read += len(chunk)
+        invalid_durations = prepare(chunk)
+        report_invalid_durations(diagnostics, chunk, invalid_durations, kind)
+
+        positions = employee_index.resolve(chunk)
+        unresolved.append(employee_index.unresolved_summary(chunk, positions))
+        matched_records = positions >= 0
+        aggregator.add(chunk[matched_records], pd.Series(positions[matched_records], index=chunk.index[matched_records]))
+        check_limits(aggregator, chunk, rows_read, max_rows, max_memory_mb)
+
+    # 没有对应到员工的记录在所有块读完后按创建人汇总提示一次
+    if unresolved:
+        unresolved = pd.concat(unresolved).groupby(['创建人', '原因'], sort=False)['记录数'].sum().reset_index()
+        report_unresolved_employees(diagnostics, unresolved, kind)
+    return aggregator, rows_read
+
+def stream_leave_summary(source, employee_index, chunk_rows=STREAM_CHUNK_ROWS, max_rows=None, max_memory_mb=None,
+                         diagnostics=None):
+    """流式汇总休假表，返回 (按工资表行位置累计的 LeaveAggregator, 读取的记录数)"""
+    return stream_records(
+        source, employee_index, LeaveAggregator(), [0, 1, 2, 3, 4], is_leave_header, LEAVE_COLUMNS,
+        ['创建人', '请假类型', '时长'], add_leave_days, '休假', chunk_rows, max_rows, max_memory_mb, diagnostics
+    )
+
+def stream_overtime_summary(source, employee_index, chunk_rows=STREAM_CHUNK_ROWS, max_rows=None, max_memory_mb=None,
+                            diagnostics=None):
+    """流式汇总加班表，返回 (按工资表行位置累计的 OvertimeAggregator, 读取的记录数)"""
+    return stream_records(
+        source, employee_index, OvertimeAggregator(), [1, 0, 2, 3, 4], is_overtime_header, OVERTIME_COLUMNS,
+        ['创建人', '时长'], add_overtime_hours, '加班', chunk_rows, max_rows, max_memory_mb, diagnostics
+    )
+
+def stream_to_salary_sheet(salary_df, leave_source=None, overtime_source=None,
+                           chunk_rows=STREAM_CHUNK_ROWS, max_rows=None, max_memory_mb=None, diagnostics=None):
+    """
+    流式读取休假表和加班表并更新到工资表，结果与 merge_to_salary_sheet 一致
+    max_rows、max_memory_mb 分别限制每个文件的记录行数和估算内存（MB），超过时抛出 StreamLimitError
+    diagnostics 为 DiagnosticsCollector 时，时长无法解析等逐条信息记录到收集器中
+    返回 (工资表DataFrame, 休假记录数, 加班记录数)
+    """
+    result_df = salary_df.copy()
+    employee_index = EmployeeIndex(result_df)
+    leave_count = overtime_count = 0
+
+    if leave_source is not None:
+        notify('info', "正在流式处理休假数据...")
+        aggregator, leave_count = stream_leave_summary(
+            leave_source, employee_index, chunk_rows, max_rows, max_memory_mb, diagnostics
+        )
+        if aggregator.record_count:
+            result_df = apply_leave_summary(result_df, aggregator.summary())
+        notify('success', f"已处理 {len(aggregator.positions)} 名员工的 {leave_count} 条休假记录")
+
+    if overtime_source is not None:
+        notify('info', "正在流式处理加班数据...")
+        aggregator, overtime_count = stream_overtime_summary(
+            overtime_source, employee_index, chunk_rows, max_rows, max_memory_mb, diagnostics
+        )
+        if aggregator.record_count:
+            uncovered_years = aggregator.uncovered_years()
+            if uncovered_years:
+                notify('warning', f"缺少 {', '.join(map(str, uncovered_years))} 年的节假日数据，这些年份的加班仅按周末判断是否为休息日")
+            result_df = apply_overtime_summary(result_df, aggregator.summary())
+        notify('success', f"已处理 {len(aggregator.positions)} 名员工的 {overtime_count} 条加班记录")
+        if aggregator.date_parsed_count < aggregator.record_count:
+            notify('warning', f"有 {aggregator.record_count - aggregator.date_parsed_count} 条记录无法解析日期，已按平日加班处理")
+
+    return result_df, leave_count, overtime_count
@@ -0,0 +1,265 @@
+"""
+按模板样式流式写出工资表（.xlsx），用于员工数很多的输出
+
+openpyxl 的普通模式把整个工作簿作为单元格对象保存在内存中，输出行数很多时保存又慢又占内存。
+模板列出了全部员工，行数与输出相当，因此模板也不用普通模式读取：以只读模式打开模板，逐行解析工作表，
+把各行的值和样式索引整理为紧凑的样式表（样式相同的行共用一个样式元组，写出时会被工资表覆盖或清空的值不保存），
+列宽、行高、合并单元格、打印设置等工作表设置按 load_workbook 的方式读取。然后用 openpyxl 的只写模式逐行写出。
+输出工作簿与模板共用同一套样式表（字体、边框、数字格式等），样式直接按模板中的索引引用，不为每个单元格重新登记。
+
+写出的内容与 save_salary_sheet_with_format 相同，只是写出方式不同：第 SHEET_START_ROW 行起的每一行（包括合计行、签字行等表尾）
+按顺序写入一名员工，工资表和模板都有的列中，非公式单元格写入员工的值，员工之后的模板行清空这些单元格，公式单元格保持不变；
+其他列的值、所有样式、行高和工作表设置与模板相同。员工数超过模板行数时，多出的行没有样式。
+"""
+import io
+from copy import copy
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
+from openpyxl.worksheet._reader import WorksheetReader
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.worksheet import Worksheet
+
+from salary_core import (
+    SHEET_HEADER_ROW, SHEET_START_ROW, WRITE_BATCH_ROWS,
+    is_formula_value, notify, prepare_cell_values, report_progress
+)
+
+# 工作簿中共用的样式表，输出工作簿直接使用模板的样式表
+STYLE_TABLES = [
+    '_fonts', '_alignments', '_borders', '_fills', '_number_formats', '_date_formats', '_timedelta_formats',
+    '_protections', '_colors', '_cell_styles', '_named_styles', '_table_styles', '_differential_styles',
+]
+
+# openpyxl 读取模板时本来就不保留的工作表关联文件（打印机设置），其他关联文件（图片、批注、表格等）不支持流式写出
+IGNORED_SHEET_RELATIONSHIPS = {
+    'http://schemas.openxmlformats.org/officeDocument/2006/relationships/printerSettings',
+}
+
+class TemplateSheetReader(WorksheetReader):
+    """
+    按 load_workbook 的方式读取模板工作表：列宽、行高、合并单元格、数据有效性、条件格式、打印和页面设置等绑定到 ws 上，
+    单元格不创建单元格对象，只把每行的值和样式（模板样式表中的 StyleArray，不复制）整理到 rows 中
+    第 SHEET_START_ROW 行起 skip_columns 各列的非公式值写出时会被工资表的值覆盖或清空，不保存
+    """
+
+    def __init__(self, ws, xml_source, shared_strings, skip_columns):
+        super().__init__(ws, xml_source, shared_strings, False, False)
+        self.skip_columns = skip_columns
+        self.rows = {}
+        self.layout = {}
+        self.max_row = self.max_column = 0
+
+    def bind_cells(self):
+        cell_styles = self.ws.parent._cell_styles
+        shared_styles = {}
+        skip_positions = []
+        for row, cells in self.parser.parse():
+            if not cells:
+                continue
+            width = max(cell['column'] for cell in cells)
+            values = [None] * width
+            style_ids = [None] * width
+            for cell in cells:
+                values[cell['column'] - 1] = cell['value']
+                style_ids[cell['column'] - 1] = cell['style_id']
+
+            if row == SHEET_HEADER_ROW:
+                self.layout = {str(value).strip(): col for col, value in enumerate(values, 1) if value}
+                skip_positions = [self.layout[col_name] - 1 for col_name in self.skip_columns if col_name in self.layout]
+            elif row >= SHEET_START_ROW:
+                for col_pos in skip_positions:
+                    if col_pos < width and not is_formula_value(values[col_pos]):
+                        values[col_pos] = None
+
+            # 相同样式的行共用一个样式元组
+            style_ids = tuple(style_ids)
+            styles = shared_styles.get(style_ids)
+            if styles is None:
+                styles = shared_styles[style_ids] = tuple(
+                    None if style_id is None else cell_styles[style_id] for style_id in style_ids
+                )
+            self.rows[row] = (tuple(values), styles)
+            self.max_row = max(self.max_row, row)
+            self.max_column = max(self.max_column, width)
+
+    def bind_all(self):
+        # 超链接、表格等与单元格或其他文件关联的内容不读取，模板包含这些内容时不使用流式写出
+        self.bind_cells()
+        self.bind_merged_cells()
+        self.bind_formatting()
+        self.bind_col_dimensions()
+        self.bind_row_dimensions()
+        self.bind_properties()
+
+class SheetStyleTable:
+    """
+    模板工作表的样式表，cells(row) 返回模板第 row 行的 [(值, StyleArray), ...]，超出模板的行为空单元格
+    max_row 与 load_workbook 读取的工作表的 max_row 相同（包括合并单元格所在的行）
+    """
+
+    def __init__(self, reader):
+        self.rows = reader.rows
+        self.layout = reader.layout
+        self.max_row = max(reader.max_row, reader.ws.max_row if reader.ws._cells else 0)
+        self.max_column = reader.max_column
+        self.row_dimensions = reader.ws.row_dimensions
+
+    def cells(self, row):
+        values, styles = self.rows.get(row, ((), ()))
+        padding = [(None, None)] * (self.max_column - len(values))
+        return list(zip(values, styles)) + padding
+
+def make_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value)
+    if style is not None:
+        cell._style = copy(style)
+    return cell
+
+def copy_row_dimension(ws, dimension, row):
+    """把模板的行高等设置复制到输出工作表的第 row 行"""
+    dimension = copy(dimension)
+    dimension.index = row
+    ws.row_dimensions[row] = dimension
+
+def copy_sheet_settings(ws, template_ws):
+    """复制列宽、视图、打印和页面设置、合并单元格、数据有效性和条件格式"""
+    ws.sheet_properties = copy(template_ws.sheet_properties)
+    ws.sheet_format = copy(template_ws.sheet_format)
+    ws.views = copy(template_ws.views)
+    for key, dimension in template_ws.column_dimensions.items():
+        dimension = copy(dimension)
+        dimension.parent = ws
+        ws.column_dimensions[key] = dimension
+
+    ws.print_options = copy(template_ws.print_options)
+    ws.page_margins = copy(template_ws.page_margins)
+    ws.page_setup = copy(template_ws.page_setup)
+    ws.page_setup._parent = ws
+    ws.HeaderFooter = copy(template_ws.HeaderFooter)
+    ws.protection = copy(template_ws.protection)
+    ws.row_breaks = copy(template_ws.row_breaks)
+    ws.col_breaks = copy(template_ws.col_breaks)
+    if template_ws.print_title_rows:
+        ws.print_title_rows = template_ws.print_title_rows
+    if template_ws.print_title_cols:
+        ws.print_title_cols = template_ws.print_title_cols
+    if template_ws.print_area:
+        ws.print_area = template_ws.print_area.split(',')
+    if template_ws.auto_filter.ref:
+        ws.auto_filter = copy(template_ws.auto_filter)
+
+    for merged in template_ws.merged_cells.ranges:
+        ws.merged_cells.add(CellRange(merged.coord))
+    for validation in template_ws.data_validations.dataValidation:
+        ws.data_validations.append(copy(validation))
+    for formatting in template_ws.conditional_formatting:
+        for rule in formatting.rules:
+            ws.conditional_formatting.add(str(formatting.sqref), rule)
+
+def read_template_sheet(template_wb, skip_columns):
+    """
+    读取只读模式打开的模板中的工作表，返回 (绑定了工作表设置、没有单元格的 Worksheet, SheetStyleTable)
+    模板包含多个工作表，或工作表包含图片、批注、表格、超链接等内容时不支持流式写出，返回 None
+    """
+    if len(template_wb.worksheets) != 1 or template_wb.chartsheets:
+        notify('info', "模板包含多个工作表，不使用流式写出")
+        return None
+    source = template_wb.worksheets[0]
+    rels_path = get_rels_path(source._worksheet_path)
+    if rels_path in template_wb._archive.namelist():
+        rels = get_dependents(template_wb._archive, rels_path)
+        if any(rel.Type not in IGNORED_SHEET_RELATIONSHIPS for rel in rels):
+            notify('info', "模板包含图片、批注或表格等内容，不使用流式写出")
+            return None
+
+    ws = Worksheet(template_wb, source.title)
+    # 标题与只读模式的工作表相同时会自动加上序号，这里保持模板的标题
+    ws._WorkbookChild__title = source.title
+    for name in ('_print_rows', '_print_cols', '_print_area'):
+        if getattr(source, name, None) is not None:
+            setattr(ws, name, getattr(source, name))
+    ws.defined_names = source.defined_names
+    with source._get_source() as xml_source:
+        reader = TemplateSheetReader(ws, xml_source, source._shared_strings, skip_columns)
+        reader.bind_all()
+    if reader.parser.hyperlinks.hyperlink:
+        notify('info', "模板包含超链接，不使用流式写出")
+        return None
+    return ws, SheetStyleTable(reader)
+
+def save_salary_sheet_streaming(result_df, template_path, progress=None):
+    """
+    按模板样式流式写出工资表，返回文件内容
+    模板不支持流式写出（见 read_template_sheet）时返回 None
+    progress 为 JobProgress 时每写完一批报告已写入的单元格数
+    """
+    template_wb = load_workbook(template_path, read_only=True)
+    try:
+        template = read_template_sheet(template_wb, set(result_df.columns))
+        if template is None:
+            return None
+        template_ws, table = template
+        return write_salary_sheet(result_df, template_wb, template_ws, table, progress)
+    finally:
+        template_wb.close()
+
+def write_salary_sheet(result_df, template_wb, template_ws, table, progress=None):
+    """按样式表逐行写出工资表，返回文件内容"""
+    # 输出工作簿与模板共用样式表和主题
+    wb = Workbook(write_only=True)
+    for name in STYLE_TABLES:
+        setattr(wb, name, getattr(template_wb, name))
+    wb.loaded_theme = template_wb.loaded_theme
+    wb.calculation = template_wb.calculation
+    wb.properties = template_wb.properties
+    wb.epoch = template_wb.epoch
+    for name, defined_name in template_wb.defined_names.items():
+        wb.defined_names[name] = defined_name
+    ws = wb.create_sheet(template_ws.title)
+    for name, defined_name in template_ws.defined_names.items():
+        ws.defined_names[name] = defined_name
+
+    copy_sheet_settings(ws, template_ws)
+    for row in range(1, SHEET_START_ROW):
+        if row in table.row_dimensions:
+            copy_row_dimension(ws, table.row_dimensions[row], row)
+        ws.append([make_cell(ws, value, style) for value, style in table.cells(row)])
+
+    # 与 save_salary_sheet_with_format 相同：写到模板最后一行和最后一名员工中靠后的一行，
+    # 工资表和模板都有的列中，非公式单元格写入员工的值，员工之后的行清空
+    data_count = len(result_df)
+    end_row = max(table.max_row, SHEET_START_ROW + data_count - 1)
+    data_columns = [col_name for col_name in result_df.columns if col_name in table.layout]
+    col_positions = [table.layout[col_name] - 1 for col_name in data_columns]
+    empty_row = [None] * len(data_columns)
+    total_cells = (end_row - SHEET_START_ROW + 1) * len(data_columns)
+    for batch_start in range(SHEET_START_ROW, end_row + 1, WRITE_BATCH_ROWS):
+        batch_end = min(batch_start + WRITE_BATCH_ROWS - 1, end_row)
+        offset = batch_start - SHEET_START_ROW
+        cell_values = prepare_cell_values(result_df.iloc[offset:offset + batch_end - batch_start + 1], data_columns)
+        for row in range(batch_start, batch_end + 1):
+            row_offset = row - batch_start
+            row_values = cell_values[row_offset] if row_offset < len(cell_values) else empty_row
+            template_cells = table.cells(row)
+            values = [value for value, _ in template_cells]
+            for col_pos, value in zip(col_positions, row_values):
+                if not is_formula_value(values[col_pos]):
+                    values[col_pos] = value
+            # 只写模式下行高必须在写出该行之前设置，写出后删除，不在内存中保留所有行的设置
+            if row in table.row_dimensions:
+                copy_row_dimension(ws, table.row_dimensions[row], row)
+            ws.append([make_cell(ws, value, style) for value, (_, style) in zip(values, template_cells)])
+            ws.row_dimensions.pop(row, None)
+        report_progress(progress, '保存工资表', (batch_end - SHEET_START_ROW + 1) * len(data_columns), total_cells, '个单元格')
+
+    # 模板末尾只设置了行高的空行
+    for row in range(end_row + 1, max(table.row_dimensions, default=0) + 1):
+        if row in table.row_dimensions:
+            copy_row_dimension(ws, table.row_dimensions[row], row)
+        ws.append([])
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
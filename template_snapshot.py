@@ -0,0 +1,137 @@
+"""
+工资表模板的预先解析快照
+
+部署构建时运行 python template_snapshot.py（Vercel 上由 vercel.json 的 buildCommand 执行），把模板中的员工数据（DataFrame）和标题行的列布局序列化到模板旁边的
+快照文件（工资表模板.snapshot）中。冷启动时直接反序列化快照，只需几毫秒，不再用 pandas 和 openpyxl 读取 Excel。
+快照记录模板内容的哈希值和处理代码的版本，模板或代码更新后快照自动失效，回退为读取 Excel。
+
+快照使用 pickle 保存，只加载部署时自己生成的快照文件。
+
+用法：
+    python template_snapshot.py
+    python template_snapshot.py 其他模板.xlsx --output 其他模板.snapshot
+"""
+import argparse
+import hashlib
+import io
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+from result_cache import code_version
+
+logger = logging.getLogger(__name__)
+
+# 快照文件格式版本，快照内容有变化时递增，旧快照自动失效
+SNAPSHOT_FORMAT = 1
+
+SNAPSHOT_SUFFIX = '.snapshot'
+
+class TemplateSnapshot:
+    """
+    预先解析的工资表模板
+    salary 为模板中的员工数据（与 read_salary_template 的结果相同），layout 为标题行的 {列名: 列号}
+    """
+
+    def __init__(self, template_digest, version, layout, salary):
+        self.template_digest = template_digest
+        self.version = version
+        self.layout = layout
+        self.salary = salary
+
+    def to_dict(self):
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'template_digest': self.template_digest,
+            'code_version': self.version,
+            'layout': self.layout,
+            'salary': self.salary,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['template_digest'], data['code_version'], data['layout'], data['salary'])
+
+def snapshot_path(template_path):
+    """模板对应的快照文件路径：与模板同目录、同名，扩展名为 .snapshot"""
+    return os.path.splitext(template_path)[0] + SNAPSHOT_SUFFIX
+
+def template_digest(template_bytes):
+    return hashlib.sha256(template_bytes).hexdigest()
+
+def load_snapshot(template_path, path=None):
+    """
+    读取模板的快照，没有快照、快照与模板内容或处理代码版本不一致、无法读取时返回 None
+    path 默认为 snapshot_path(template_path)
+    """
+    path = path or snapshot_path(template_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(template_path, 'rb') as f:
+            digest = template_digest(f.read())
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        logger.warning("无法读取模板快照 %s: %s", path, e)
+        return None
+
+    if (not isinstance(data, dict) or data.get('format') != SNAPSHOT_FORMAT
+            or data.get('template_digest') != digest or data.get('code_version') != code_version()):
+        logger.info("模板快照 %s 已过期，读取模板文件", path)
+        return None
+    return TemplateSnapshot.from_dict(data)
+
+def build_snapshot(template_path, path=None):
+    """解析模板并写入快照文件（先写临时文件再替换），返回 TemplateSnapshot"""
+    from openpyxl import load_workbook
+
+    from salary_core import read_salary_template, sheet_layout
+
+    with open(template_path, 'rb') as f:
+        template_bytes = f.read()
+    layout = sheet_layout(load_workbook(io.BytesIO(template_bytes)).active)
+    snapshot = TemplateSnapshot(
+        template_digest(template_bytes), code_version(), layout, read_salary_template(io.BytesIO(template_bytes))
+    )
+
+    path = path or snapshot_path(template_path)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(snapshot.to_dict(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return snapshot
+
+def main(argv=None):
+    from salary_core import TEMPLATE_PATH, read_salary_template
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="生成工资表模板的预先解析快照，供冷启动时快速加载")
+    parser.add_argument('template', nargs='?', default=os.path.join(base_dir, TEMPLATE_PATH), help="工资表模板路径")
+    parser.add_argument('--output', help="快照文件路径，默认与模板同名、扩展名为 .snapshot")
+    args = parser.parse_args(argv)
+
+    snapshot = build_snapshot(args.template, args.output)
+    path = args.output or snapshot_path(args.template)
+    print(f"已生成模板快照 {path}：{len(snapshot.salary)} 名员工，{len(snapshot.layout)} 列")
+
+    # 对比从快照和从 Excel 读取模板的耗时
+    started = time.perf_counter()
+    load_snapshot(args.template, args.output)
+    snapshot_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    read_salary_template(args.template)
+    excel_seconds = time.perf_counter() - started
+    print(f"读取模板：快照 {snapshot_seconds * 1000:.1f} ms，Excel {excel_seconds * 1000:.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""后台任务的测试"""
+import pandas as pd
+
+from background_job import BackgroundJob, current_progress
+from salary_core import load_salary_template, merge_to_salary_sheet, notify
+
+def test_notify_in_job_is_recorded_on_progress():
+    def target(progress):
+        notify('warning', "缺少节假日数据")
+        notify('error', "保存失败")
+        return current_progress() is progress
+
+    job = BackgroundJob(target)
+    assert job.wait(5)
+    assert job.status == 'done'
+    assert job.result is True
+    assert job.progress.messages == [('warning', "缺少节假日数据"), ('error', "保存失败")]
+    assert current_progress() is None
+
+def test_missing_leave_columns_are_reported_to_the_job():
+    salary_df, _ = load_salary_template()
+    leave_df = pd.DataFrame({'创建人': [salary_df['姓名'].iloc[0]], '请假类型': ['年假']})
+
+    job = BackgroundJob(lambda progress: merge_to_salary_sheet(salary_df, leave_df, progress=progress))
+    assert job.wait(5)
+    assert job.status == 'done'
+    errors = [message for level, message in job.progress.messages if level == 'error']
+    assert errors and '时长' in errors[0]
+
+def test_cancelled_job_stops_at_next_progress_report():
+    def target(progress):
+        progress.cancel()
+        progress.update('合并', 1, 2, '名员工')
+
+    job = BackgroundJob(target)
+    assert job.wait(5)
+    assert job.status == 'cancelled'
@@ -0,0 +1,42 @@
+"""时长解析的测试"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from duration_parser import parse_duration_column
+
+def test_hours_from_numbers_and_texts():
+    values = pd.Series([3, 2.5, '3', '3小时', '2.5h', '2.5 H', '0.5天', '1天4小时', '30分钟', '.5hours', '３小时'], dtype=object)
+    hours, invalid = parse_duration_column(values)
+    assert hours.tolist() == [3, 2.5, 3, 3, 2.5, 2.5, 4, 12, 0.5, 0.5, 3]
+    assert not invalid.any()
+
+def test_days_use_eight_hour_workdays():
+    values = pd.Series(['1天', '8天', '4小时', '1.5', 2, '0.5d', '1天4小时'], dtype=object)
+    days, invalid = parse_duration_column(values, unit='days')
+    assert days.tolist() == [1, 8, 0.5, 1.5, 2, 0.5, 1.5]
+    assert not invalid.any()
+
+def test_blank_and_invalid_values():
+    values = pd.Series([None, np.nan, '', '   ', '约3小时', '三天', '3小时左右'], dtype=object)
+    hours, invalid = parse_duration_column(values)
+    assert hours.tolist() == [0, 0, 0, 0, 0, 0, 0]
+    assert invalid.tolist() == [False, False, False, False, True, True, True]
+
+def test_categorical_column_matches_object_column():
+    texts = ['1天', '4小时', None, '1天', '错误']
+    expected = parse_duration_column(pd.Series(texts, dtype=object), unit='days')
+    result = parse_duration_column(pd.Series(texts, dtype='category'), unit='days')
+    pd.testing.assert_series_equal(result[0], expected[0])
+    pd.testing.assert_series_equal(result[1], expected[1])
+
+def test_keeps_index():
+    values = pd.Series(['1小时', 2], index=[10, 20], dtype=object)
+    hours, invalid = parse_duration_column(values)
+    assert hours.index.tolist() == [10, 20]
+    assert hours.tolist() == [1, 2]
+    assert invalid.index.tolist() == [10, 20]
+
+def test_unknown_unit_raises():
+    with pytest.raises(ValueError):
+        parse_duration_column(pd.Series(['1小时']), unit='minutes')
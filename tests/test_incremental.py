@@ -0,0 +1,41 @@
+"""增量生成的测试"""
+import pandas as pd
+
+from salary_core import TEMPLATE_PATH, load_salary_template, merge_incrementally, merge_to_salary_sheet
+
+def overtime_records(names, dates):
+    return pd.DataFrame({
+        '创建人': names,
+        '开始时间': dates,
+        '时长': ['3'] * len(names),
+        '加班原因': ['值班'] * len(names),
+    })
+
+def assert_same_as_full_merge(salary_df, overtime_df, result_df):
+    expected = merge_to_salary_sheet(salary_df, None, overtime_df.copy())
+    pd.testing.assert_frame_equal(result_df.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+def test_unchanged_records_reuse_previous_rows():
+    salary_df, _ = load_salary_template()
+    names = salary_df['姓名'].iloc[:3].tolist()
+    first = overtime_records(names, ['2025-07-05', '2025-07-07', '2025-07-08'])
+    _, _, state, changed_count = merge_incrementally(None, salary_df, TEMPLATE_PATH, None, first.copy())
+    assert changed_count is None
+
+    second = overtime_records(names, ['2025-07-05', '2025-07-07', '2025-07-12'])
+    result_df, excel_data, _, changed_count = merge_incrementally(state, salary_df, TEMPLATE_PATH, None, second.copy())
+    assert changed_count == 1
+    assert excel_data is not None
+    assert_same_as_full_merge(salary_df, second, result_df)
+
+def test_changed_date_format_inference_regenerates_everything():
+    salary_df, _ = load_salary_template()
+    names = salary_df['姓名'].iloc[:2].tolist()
+    # 07/05/2025 先按 %m/%d/%Y 解析为 7月5日（周六），另一条记录改为 13/06/2025 后整列改按 %d/%m/%Y 解析为 5月7日（周三）
+    first = overtime_records(names, ['07/05/2025', '07/06/2025'])
+    _, _, state, _ = merge_incrementally(None, salary_df, TEMPLATE_PATH, None, first.copy())
+
+    second = overtime_records(names, ['07/05/2025', '13/06/2025'])
+    result_df, _, _, changed_count = merge_incrementally(state, salary_df, TEMPLATE_PATH, None, second.copy())
+    assert changed_count is None
+    assert_same_as_full_merge(salary_df, second, result_df)
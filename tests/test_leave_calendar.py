@@ -0,0 +1,112 @@
+"""请假工作日天数的测试，向量化结果与逐日累加的结果比较"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from holiday_calendar import WORKDAY, get_holiday_calendar
+from leave_calendar import AFTERNOON, FULL_DAY, MORNING, half_day_marks, leave_workdays, normalize_month, split_by_month
+
+def reference_days(start, end, start_mark, end_mark, is_workday):
+    """
+    逐日累加区间内的工作日，start、end 为自 1970-01-01 起的天编号（无法识别时为 None）
+    返回 {月份第一天: 天数}，区间无效时返回 None
+    """
+    if start is None or end is None or end < start:
+        return None
+    if start == end and start_mark == AFTERNOON and end_mark == MORNING:
+        return None
+    months = {}
+    for day in range(start, end + 1):
+        if not is_workday(day):
+            continue
+        weight = 1.0
+        if day == start and start_mark == AFTERNOON:
+            weight -= 0.5
+        if day == end and end_mark == MORNING:
+            weight -= 0.5
+        month = np.datetime64(day, 'D').astype('datetime64[M]')
+        months[month] = months.get(month, 0.0) + weight
+    return months
+
+def intervals(*rows):
+    """由 (开始日期, 结束日期, 开始半天, 结束半天) 组成的数组参数"""
+    starts, ends, start_marks, end_marks = zip(*rows)
+    return (
+        pd.to_datetime(list(starts)).to_numpy(), pd.to_datetime(list(ends)).to_numpy(),
+        np.array(start_marks, dtype=np.int8), np.array(end_marks, dtype=np.int8),
+    )
+
+def test_half_days_and_holidays():
+    days = leave_workdays(*intervals(
+        ('2025-07-28', '2025-07-28', MORNING, AFTERNOON),     # 同一天上午到下午
+        ('2025-07-25', '2025-07-28', AFTERNOON, MORNING),     # 周五下午到周一上午
+        ('2025-07-26', '2025-07-28', AFTERNOON, AFTERNOON),   # 从周六下午开始，周六不计也不扣减
+        ('2025-07-28', '2025-07-28', MORNING, MORNING),       # 半天
+        ('2025-09-28', '2025-09-28', FULL_DAY, FULL_DAY),     # 国庆节前周日调休上班
+        ('2025-09-29', '2025-10-11', FULL_DAY, FULL_DAY),     # 跨国庆节，10月11日周六调休上班
+        ('2025-07-28', '2025-07-28', AFTERNOON, MORNING),     # 同一天下午开始上午结束
+        ('2025-07-28', '2025-07-27', FULL_DAY, FULL_DAY),     # 结束早于开始
+        ('2025-07-28', None, FULL_DAY, FULL_DAY),             # 结束日期无法识别
+    ))
+    assert days[:6].tolist() == [1.0, 1.0, 1.0, 0.5, 1.0, 5.0]
+    assert np.isnan(days[6:]).all()
+
+def test_month_and_year_boundaries():
+    split = split_by_month(*intervals(
+        ('2025-09-29', '2025-10-11', FULL_DAY, FULL_DAY),
+        ('2025-12-31', '2026-01-05', AFTERNOON, MORNING),     # 元旦放假，1月4日周日调休上班
+        ('2025-07-28', '2025-07-27', FULL_DAY, FULL_DAY),
+    ))
+    assert split['记录'].tolist() == [0, 0, 1, 1]
+    assert split['月份'].tolist() == pd.to_datetime(['2025-09-01', '2025-10-01', '2025-12-01', '2026-01-01']).tolist()
+    assert split['天数'].tolist() == [2.0, 3.0, 0.5, 1.5]
+
+def test_half_day_marks_and_month_names():
+    marks = half_day_marks(pd.Series(['2025-07-28 上午', '2025-07-28 下午', '2025-07-28', None, pd.Timestamp('2025-07-28')]))
+    assert marks.tolist() == [MORNING, AFTERNOON, FULL_DAY, FULL_DAY, FULL_DAY]
+    assert [normalize_month(value) for value in ('2025-7', '2025/07', '2025年7月', '2025-07')] == ['2025-07'] * 4
+    with pytest.raises(ValueError):
+        normalize_month('七月')
+
+def test_random_intervals_match_per_day_loop():
+    rng = np.random.default_rng(20)
+    count = 20000
+    first = np.datetime64('2019-01-01')
+    starts = first + rng.integers(0, 8 * 365, count).astype('timedelta64[D]')
+    ends = starts + rng.integers(-3, 45, count).astype('timedelta64[D]')
+    starts[rng.random(count) < 0.01] = np.datetime64('NaT')
+    start_marks = rng.choice([FULL_DAY, MORNING, AFTERNOON], count).astype(np.int8)
+    end_marks = rng.choice([FULL_DAY, MORNING, AFTERNOON], count).astype(np.int8)
+    start_dates = starts.astype('datetime64[ns]')
+    end_dates = ends.astype('datetime64[ns]')
+
+    all_days = np.arange(np.datetime64('2018-12-01'), np.datetime64('2027-03-01'))
+    workday_flags = get_holiday_calendar().classify_codes(all_days) == WORKDAY
+    first_day = int(all_days[0].astype(np.int64))
+
+    def is_workday(day):
+        return workday_flags[day - first_day]
+
+    def day_number(value):
+        return None if np.isnat(value) else int(value.astype('datetime64[D]').astype(np.int64))
+
+    days = leave_workdays(start_dates, end_dates, start_marks, end_marks)
+    split = split_by_month(start_dates, end_dates, start_marks, end_marks)
+    months = split['月份'].to_numpy().astype('datetime64[M]')
+    split_records = set(split['记录'].tolist())
+    split_by_record = {}
+    for record, month, value in zip(split['记录'].tolist(), months, split['天数'].tolist()):
+        if value:
+            split_by_record.setdefault(record, {})[month] = value
+
+    for position in range(count):
+        expected = reference_days(
+            day_number(start_dates[position]), day_number(end_dates[position]),
+            start_marks[position], end_marks[position], is_workday
+        )
+        if expected is None:
+            assert np.isnan(days[position])
+            assert position not in split_records
+            continue
+        assert days[position] == sum(expected.values())
+        assert split_by_record.get(position, {}) == {month: value for month, value in expected.items() if value}
@@ -0,0 +1,31 @@
+"""休假数据合并的回归测试"""
+import pandas as pd
+
+from salary_core import load_leave_data, load_salary_template, merge_to_salary_sheet
+from streaming_loader import stream_to_salary_sheet
+
+def write_datetime_leave_sheet(path):
+    """把休假表模板的开始时间、结束时间改为 Excel 日期（读取后为 datetime64 列）"""
+    leave_df = pd.read_excel('请假表模板.xlsx')
+    for column in ('开始时间', '结束时间'):
+        texts = leave_df[column].astype(str).str.replace(r'\s*[上下]午', '', regex=True)
+        leave_df[column] = pd.to_datetime(texts)
+    leave_df.to_excel(path, index=False)
+
+def test_datetime_leave_columns_are_formatted_as_text(tmp_path):
+    leave_path = tmp_path / '休假表.xlsx'
+    write_datetime_leave_sheet(leave_path)
+    salary_df, _ = load_salary_template()
+    leave_df = load_leave_data(str(leave_path))
+    assert pd.api.types.is_datetime64_any_dtype(leave_df['开始时间'])
+
+    result_df = merge_to_salary_sheet(salary_df, leave_df)
+    row = result_df.loc[result_df['姓名'] == '郑泽宇'].iloc[0]
+    assert row['考勤情况'] == '全勤'
+    assert row['全勤'] == 200
+    assert row['备注'] == '休假共1.0天:\n• 丧假 开始:2025-07-23 00:00:00 结束:2025-07-23 00:00:00 时长:1天'
+
+    streamed_df, leave_count, _ = stream_to_salary_sheet(salary_df, str(leave_path))
+    assert leave_count == len(leave_df)
+    columns = ['考勤情况', '全勤', '备注']
+    pd.testing.assert_frame_equal(streamed_df[columns], result_df[columns])
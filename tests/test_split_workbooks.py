@@ -0,0 +1,43 @@
+"""按列拆分工资表的测试"""
+import io
+import zipfile
+
+from openpyxl import load_workbook
+
+from salary_core import SHEET_START_ROW, TEMPLATE_PATH, load_salary_template
+from split_workbooks import shift_formula, shift_reference, write_split_zip
+
+def test_shift_reference_follows_excel_row_deletion():
+    # 删除第 7 行起的 81 行（第 7–87 行）
+    assert shift_reference('F6:F86', 7, 81) == 'F6:F6'
+    assert shift_reference('$A$1:$P$91', 7, 81) == '$A$1:$P$10'
+    assert shift_reference('F88', 7, 81) == 'F7'
+    assert shift_reference('F10', 7, 81) is None
+    assert shift_reference('F8:F20', 7, 81) is None
+    assert shift_reference('1:5', 7, 81) == '1:5'
+    assert shift_reference('A:A', 7, 81) == 'A:A'
+    assert shift_formula('=SUM(F6:F86)+F88+F10+其他!F88', 7, 81, '工资表') == '=SUM(F6:F6)+F7+#REF!+其他!F88'
+
+def test_each_group_has_its_own_rows_and_footer(tmp_path):
+    salary_df, _ = load_salary_template()
+    template = load_workbook(TEMPLATE_PATH).active
+    footer_row = next(row for row in range(SHEET_START_ROW, template.max_row + 1) if template.cell(row, 6).value == '=SUM(F6:F86)')
+    trailing_rows = template.max_row - footer_row
+
+    entries = write_split_zip(salary_df, '岗位', TEMPLATE_PATH, str(tmp_path / '拆分.zip'), workers=1)
+    assert sum(count for _, _, count in entries) == len(salary_df)
+
+    with zipfile.ZipFile(tmp_path / '拆分.zip') as archive:
+        for name, file_name, count in entries:
+            ws = load_workbook(io.BytesIO(archive.read(file_name))).active
+            last_row = SHEET_START_ROW + count - 1
+            expected = salary_df.loc[salary_df['岗位'] == name, '姓名'].tolist()
+            assert [ws.cell(row, 2).value for row in range(SHEET_START_ROW, last_row + 1)] == expected
+            assert [ws.cell(row, 1).value for row in range(SHEET_START_ROW, last_row + 1)] == list(range(1, count + 1))
+
+            # 数据行之后紧接着合计行，合计只包含该组的行
+            assert ws.max_row == last_row + 1 + trailing_rows
+            assert ws.cell(last_row + 1, 6).value == f'=SUM(F6:F{last_row})'
+            assert ws.cell(last_row + 1, 15).value == f'=SUM(O6:O{last_row})'
+            assert ws.row_dimensions[last_row + 1].height == template.row_dimensions[footer_row].height
+            assert [str(validation.sqref) for validation in ws.data_validations.dataValidation] == [f'D6:D{ws.max_row}']
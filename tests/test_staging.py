@@ -0,0 +1,69 @@
+"""解析结果暂存的测试"""
+from datetime import datetime, time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from salary_core import leave_typed_columns, load_leave_data, load_overtime_data, read_salary_template
+from staging import StagingArea, StagingError, decode_frame, encode_frame, staging_available
+
+pytestmark = pytest.mark.skipif(not staging_available(), reason="没有安装 pyarrow")
+
+def assert_same_frame(result, expected):
+    """值和类型都与暂存前相同，object 列逐个比较值的类型"""
+    pd.testing.assert_frame_equal(result, expected)
+    for column in expected.columns:
+        if expected[column].dtype == object:
+            assert [type(value) for value in result[column]] == [type(value) for value in expected[column]]
+
+def test_mixed_columns_round_trip():
+    df = pd.DataFrame({
+        '文本': ['张三', np.nan, '李四', '王五'],
+        '混合': ['1天', 4, 2.5, datetime(2025, 7, 23, 9, 30)],
+        '时间': [time(9, 0), None, pd.Timestamp('2025-07-01'), pd.NaT],
+        '布尔': [True, 'x', False, np.nan],
+        '数值': [1.0, 2.0, np.nan, 4.0],
+        '日期': pd.to_datetime(['2025-07-01', None, '2025-07-03', '2025-07-04']),
+        '分类': pd.Categorical(['年假', '病假', None, '年假']),
+        3: [1, 2, 3, 4],
+    }, index=[2, 5, 7, 9])
+    assert_same_frame(decode_frame(encode_frame(df)), df)
+
+def test_unsupported_values_are_not_staged():
+    with pytest.raises(StagingError):
+        encode_frame(pd.DataFrame({'值': [object()]}))
+    with pytest.raises(StagingError):
+        encode_frame(pd.DataFrame({'值': [1]}, index=['a']))
+
+@pytest.mark.parametrize('path, parse', [
+    ('请假表模板.xlsx', load_leave_data),
+    ('加班表模板.xlsx', load_overtime_data),
+    ('工资表模板.xlsx', read_salary_template),
+])
+def test_uploaded_files_round_trip(tmp_path, path, parse):
+    with open(path, 'rb') as f:
+        file_bytes = f.read()
+    staging_area = StagingArea(str(tmp_path))
+    calls = []
+
+    def counting_parse(file):
+        calls.append(file)
+        return parse(file)
+
+    parsed = staging_area.load('test', file_bytes, counting_parse)
+    staged = staging_area.load('test', file_bytes, counting_parse)
+    assert len(calls) == 1
+    assert_same_frame(staged, parsed)
+
+def test_typed_columns_are_stored_separately(tmp_path):
+    with open('请假表模板.xlsx', 'rb') as f:
+        file_bytes = f.read()
+    staging_area = StagingArea(str(tmp_path))
+    assert staging_area.load_typed('leave', file_bytes) is None
+
+    parsed = staging_area.load('leave', file_bytes, load_leave_data, leave_typed_columns)
+    typed = staging_area.load_typed('leave', file_bytes)
+    expected = leave_typed_columns(parsed)
+    pd.testing.assert_frame_equal(typed, expected)
+    assert list(staging_area.load('leave', file_bytes, load_leave_data).columns) == list(parsed.columns)